@@ -1,5 +1,7 @@
 import numpy as np
+from functools import lru_cache
 from typing import Optional, Tuple
+from agents.connectn import instrument
 from agents.connectn.common import PlayerAction, BoardPiece, SavedState, check_end_state
 
 
@@ -9,6 +11,69 @@ the heuristic functions can be found here
 """
 
 
+WINDOW_WEIGHTS = (1, 10, 1000)  # heuristic_better weights of open 2-, 3- and 4-in-a-row windows
+
+
+@lru_cache(maxsize=None)
+def line_segments(shape: Tuple[int, int] = (6, 7), length: int = 4) -> np.ndarray:
+    """
+    flat board indices of the line segments of the given length that
+    heuristic_basic looks at, one row per segment. segments start at the
+    same cells as the full connect_n windows, so for length == CONNECT_N
+    these are all the winning windows of the board, shape (69, 4) for 6x7
+    """
+    from agents.connectn.common import CONNECT_N
+
+    rows, cols = shape
+    rows_edge = rows - CONNECT_N + 1  # needed row check range
+    cols_edge = cols - CONNECT_N + 1  # needed column check range
+    steps = np.arange(length)
+    segments = []
+
+    for i in range(rows):  # along a row
+        for j in range(cols_edge):
+            segments.append(i * cols + j + steps)
+
+    for i in range(rows_edge):  # along a column
+        for j in range(cols):
+            segments.append((i + steps) * cols + j)
+
+    for i in range(rows_edge):  # both diagonals of the block starting at (i, j)
+        for j in range(cols_edge):
+            segments.append((i + steps) * cols + j + steps)
+            segments.append((i + length - 1 - steps) * cols + j + steps)
+
+    return np.array(segments)
+
+
+def winning_windows(shape: Tuple[int, int] = (6, 7)) -> np.ndarray:
+    """flat indices of every connect_n window of the board, shape (69, 4) for 6x7"""
+    from agents.connectn.common import CONNECT_N
+
+    return line_segments(shape, CONNECT_N)
+
+
+@lru_cache(maxsize=None)
+def _basic_segments(shape: Tuple[int, int]) -> np.ndarray:
+    """
+    the segments of length 2 up to CONNECT_N stacked into one table, the shorter
+    ones padded by repeating their last cell (which does not change np.all)
+    """
+    from agents.connectn.common import CONNECT_N
+
+    tables = []
+    for k in range(CONNECT_N-1):
+        segments = line_segments(shape, CONNECT_N-k)
+        padding = np.repeat(segments[:, -1:], k, axis=1)
+        tables.append(np.concatenate((segments, padding), axis=1))
+    return np.concatenate(tables)
+
+
+def _flat_boards(board: np.ndarray) -> np.ndarray:
+    """view a board (rows, cols) or a stack of boards (n, rows, cols) as (n, rows * cols)"""
+    return board.reshape(-1, board.shape[-2] * board.shape[-1])
+
+
 def heuristic_basic(
         board: np.ndarray, player: BoardPiece
 ) -> np.int:
@@ -22,84 +87,160 @@ def heuristic_basic(
     points that could be made better are that depth is not taken into account,
     which then makes the minimax agent not know that it could be losing if it 
     does not play a certain move, and just sees more adjecent pieces as better
+
+    the segments of 2, 3 and 4 cells are looked up all at once with the
+    precomputed index tables, so a stack of boards (n, 6, 7) can be passed
+    as well, which returns an array of n ratings
     """
     from agents.connectn.common import CONNECT_N
 
-    rows, cols = board.shape
-    rows_edge = rows - CONNECT_N + 1  # needed row check range
-    cols_edge = cols - CONNECT_N + 1  # needed column check range
-    rating = 0  # starting rating (no connecting pieces)
     degree = 5  # weighting for the number connected (exponential)
+    segments = _basic_segments(board.shape[-2:])  # connected_n-k for each k, in one table
+    mine = _flat_boards(board) == player  # compare once per cell, then gather the segments
+    connected = mine[:, segments].all(axis=2).sum(axis=1)
+    rating = connected * CONNECT_N ** degree  # higher rating for more connected
+    if board.ndim == 2:
+        return int(rating[0])  # return an int value for each board state
+    return rating
 
-    for i in range(rows):  # count vertical pieces
-        for j in range(cols_edge):
-            for k in range(CONNECT_N-1):  # count up to a winning board
-                if np.all(board[i, j:j+CONNECT_N-k] == player):  # connected_n-k
-                    rating += CONNECT_N ** degree  # higher rating for more connected
 
-    for i in range(rows_edge):  # count horizontal pieces
-        for j in range(cols):
-            for k in range(CONNECT_N-1):  # count up to a winning board
-                if np.all(board[i:i+CONNECT_N-k, j] == player):  # connected_n-k
-                    rating += CONNECT_N ** degree  # higher rating for more connected
+def _window_pieces(
+        board: np.ndarray, player: BoardPiece
+) -> Tuple[np.ndarray, np.ndarray]:
+    """the number of pieces of the player and of the opponent in every window, each (n, 69)"""
+    from agents.connectn.common import PLAYER1, PLAYER2
 
-    for i in range(rows_edge):  # count diagonal pieces
-        for j in range(cols_edge):
-            for k in range(CONNECT_N-1):  # count up to a winning board
-                block = board[i:i+CONNECT_N-k, j:j+CONNECT_N-k]  # connected_n-k
-                if np.all(np.diag(block) == player):
-                    rating += CONNECT_N ** degree
-                if np.all(np.diag(block[::-1, :]) == player):
-                    rating += CONNECT_N ** degree  # higher rating for more connected
-    return rating  # return an int value for each board state
+    other_player = PLAYER2 if player == PLAYER1 else PLAYER1
+    flat = _flat_boards(board)
+    windows = winning_windows(board.shape[-2:])  # (69, 4)
+    # compare once per cell, then gather the windows
+    return (flat == player)[:, windows].sum(axis=2), (flat == other_player)[:, windows].sum(axis=2)
+
+
+def window_counts(
+        board: np.ndarray, player: BoardPiece
+) -> np.ndarray:
+    """
+    count the open windows (no opponent pieces in them) holding 2, 3 and 4
+    pieces, for the player and the opponent. returns an array of shape
+    (2, 3) for a board, or (n, 2, 3) for a stack of boards, where
+    [..., 0, :] are the counts of the player and [..., 1, :] of the opponent
+    """
+    from agents.connectn.common import CONNECT_N
+
+    mine, theirs = _window_pieces(board, player)
+    counts = np.array([[np.sum((pieces == k) & (others == 0), axis=1) for k in range(2, CONNECT_N + 1)]
+                       for pieces, others in ((mine, theirs), (theirs, mine))])  # (2, 3, n)
+    counts = np.moveaxis(counts, -1, 0)
+    if board.ndim == 2:
+        return counts[0]
+    return counts
 
 
 def heuristic_better(
-        board: np.ndarray, player: BoardPiece,
+        board: np.ndarray, player: BoardPiece, weights: Tuple[int, int, int] = WINDOW_WEIGHTS,
 ) -> np.int:
     """
-    taking our basic heuristic, let's make it a bit better
-    (have not yet thought of a way to improve the basic)
+    taking our basic heuristic, let's make it a bit better:
+    only windows which can still become a connect_n are counted,
+    and the windows of the opponent count against the player.
+    weights are given for the open windows with 2, 3 and 4 pieces,
+    so the rating is the weighted difference of the window_counts
     """
-    from agents.connectn.common import CONNECT_N
+    mine, theirs = _window_pieces(board, player)
+    value = np.concatenate(((0, 0), weights))  # the weight of a window by its number of pieces
+    rating = (value[mine] * (theirs == 0) - value[theirs] * (mine == 0)).sum(axis=1)
+    if board.ndim == 2:
+        return int(rating[0])
+    return rating
 
-    rows, cols = board.shape
-    rows_edge = rows - CONNECT_N + 1
-    cols_edge = cols - CONNECT_N + 1
-    rating = 0  # starting rating (no connecting pieces)
-    degree = 5  # weighting for the number connected (exponential)
 
-    for i in range(rows):  # count vertical pieces
-        for j in range(cols_edge):
-            for k in range(CONNECT_N-1):  # count up to a winning board
-                if np.all(board[i, j:j+CONNECT_N-k] == player):  # connected_n-k
-                    rating += CONNECT_N ** degree
+BATCHED_HEURISTICS = (heuristic_basic, heuristic_better)  # these accept a stack of boards
 
-    for i in range(rows_edge):  # count horizontal pieces
-        for j in range(cols):
-            for k in range(CONNECT_N-1):  # count up to a winning board
-                if np.all(board[i:i+CONNECT_N-k, j] == player):  # connected_n-k
-                    rating += CONNECT_N ** degree
 
-    for i in range(rows_edge):  # count diagonal pieces
-        for j in range(cols_edge):
-            for k in range(CONNECT_N-1):  # count up to a winning board
-                block = board[i:i+CONNECT_N-k, j:j+CONNECT_N-k]  # connected_n-k
-                if np.all(np.diag(block) == player):
-                    rating += CONNECT_N ** degree
-                if np.all(np.diag(block[::-1, :]) == player):
-                    rating += CONNECT_N ** degree
-    # return rating
-    return NotImplemented
+def heuristic_batch(
+        boards: np.ndarray, player: BoardPiece, heuristic=heuristic_basic
+) -> np.ndarray:
+    """
+    score a stack of boards (n, rows, cols) in one call, for the vectorized heuristics
+    this is a single numpy evaluation, any other heuristic is called board by board
+    """
+    if heuristic in BATCHED_HEURISTICS:
+        return np.asarray(heuristic(boards, player))
+    return np.array([heuristic(board, player) for board in boards])
+
+
+def child_boards(
+        board: np.ndarray, player: BoardPiece, actions
+) -> np.ndarray:
+    """
+    the boards after the player makes each of the actions, stacked as (n, rows, cols)
+    like apply_player_action, playing in a full column leaves the board as is
+    """
+    from agents.connectn.common import NO_PLAYER
+
+    actions = np.asarray(actions, dtype=int)
+    empty = board == NO_PLAYER
+    rows = np.argmax(empty, axis=0)[actions]  # lowest empty slot of each column
+    playable = empty.any(axis=0)[actions]
+    boards = np.repeat(board[np.newaxis], len(actions), axis=0)
+    index = np.flatnonzero(playable)
+    boards[index, rows[playable], actions[playable]] = player
+    return boards
+
+
+WIN_VALUE = int(1e8)  # value of a won position, above any heuristic rating
+
+
+def legal_moves(board: np.ndarray) -> np.ndarray:
+    """the columns which are not full yet"""
+    from agents.connectn.common import NO_PLAYER
+
+    return np.flatnonzero(board[-1] == NO_PLAYER)
+
+
+def terminal_value(
+        board: np.ndarray, mover: BoardPiece, action: PlayerAction, max_player: bool, depth: np.int
+) -> Optional[np.int]:
+    """
+    the value of the board after the mover played the action, if the game is over:
+    a win (for the maximizing player) or loss, higher the more depth was left
+    so sooner wins and later losses are preferred, and 0 for a draw
+    returns None if the game goes on
+    """
+    from agents.connectn.common import connected_four, NO_PLAYER
+
+    if connected_four(board, mover, action):
+        return WIN_VALUE + depth if max_player else -(WIN_VALUE + depth)
+    if np.all(board[-1] != NO_PLAYER):  # the board is full
+        return 0
+    return None
+
+
+def choose_action(board: np.ndarray, action_set: np.ndarray) -> PlayerAction:
+    """the legal move with the best value, the most central one if several are equally good"""
+    moves = legal_moves(board)
+    values = np.asarray(action_set)[moves]
+    best = moves[values == np.max(values)]
+    center = (np.shape(board)[1] - 1) / 2
+    return PlayerAction(best[np.argmin(np.abs(best - center))])  # put piece in the center
 
 
 def minimax(
-    board: np.ndarray, player: BoardPiece, depth: np.int, max_player: bool, heuristic
+    board: np.ndarray, player: BoardPiece, depth: np.int, max_player: bool, heuristic, batch: bool = True
 ) -> Tuple[PlayerAction, Optional[SavedState]]:
     """
     implement the minimax move generator (without pruning for now)
     the idea for this generate move function is to minimize the possible loss for a worst-case scenario
     in practice, to do this a tree search algorithm is created
+
+    player is the player the search is for (the heuristic is always from their side),
+    they make the moves on the maximizing levels and the other player on the minimizing ones.
+    only legal moves are searched, full columns keep the worst value for the level,
+    and moves that end the game get their terminal value instead of being searched further
+
+    with batch, the children of a node one above the leaves are
+    gathered into one stack and scored in a single heuristic call
     """
     from agents.connectn.common import apply_player_action
     from agents.connectn.common import pretty_print_board
@@ -110,49 +251,76 @@ def minimax(
     else:
         other_player = 1
 
-    # should define which are columns are free here to reduce computation time
+    recorder = instrument.RECORDER
+    evaluate, evaluate_batch, terminal = heuristic, heuristic_batch, terminal_value
+    moves_of, children_of, play = legal_moves, child_boards, apply_player_action
+    if recorder is not None:  # with the instrumentation on, the phases of the search are timed
+        recorder.nodes += 1
+        evaluate = recorder.timed('eval', heuristic)
+        evaluate_batch = recorder.timed('eval', heuristic_batch)
+        terminal = recorder.timed('win_check', terminal_value)
+        moves_of = recorder.timed('movegen', legal_moves)
+        children_of = recorder.timed('movegen', child_boards)
+        play = recorder.timed('movegen', apply_player_action)
+
     node_num = np.shape(board)[1]  # number of moves initially allowed
+    moves = moves_of(board)  # the columns which are free
 
     # pretty_print_board(board)
 
     if depth == 0:  # if a terminal node, then use the heuristic
-        return heuristic(board, player)
+        if recorder is not None:
+            recorder.leaves += 1
+        return evaluate(board, player)
 
+    mover = player if max_player else other_player
     if max_player:  # maximizing player level
         node_value = np.full(node_num, int(-1e10))  # empty array for node values, negative inf
-        for node in range(node_num):  # for each child node, maximize
-            board_copy = apply_player_action(board, node, player, copy=True)
-            comparison = minimax(board_copy, player, depth-1, False, heuristic)
-            if np.min(comparison) > node_value[node]:
-                node_value[node] = np.min(comparison)
-        return node_value
-
     else:  # minimizing player level
         node_value = np.full(node_num, int(1e10))  # empty array for node values, positive inf
-        for node in range(node_num):  # for each child node, minimize
-            #board_copy = apply_player_action(board, node, player, copy=True)
-            board_copy = apply_player_action(board, node, other_player, copy=True)
-            #comparison = minimax(board_copy, player, depth-1, True, heuristic)
-            comparison = minimax(board_copy, other_player, depth-1, True, heuristic)
-            if np.max(comparison) < node_value[node]:
-                node_value[node] = np.max(comparison)
+
+    if depth == 1 and batch:  # the children are all leaves, score them at once
+        children = children_of(board, mover, moves)
+        if recorder is not None:
+            recorder.leaves += len(children)
+        node_value[moves] = evaluate_batch(children, player, heuristic)
+        for child, node in zip(children, moves):
+            value = terminal(child, mover, node, max_player, depth)
+            if value is not None:
+                node_value[node] = value
         return node_value
 
+    for node in moves:  # for each child node, maximize or minimize
+        board_copy = play(board, node, mover, copy=True)
+        value = terminal(board_copy, mover, node, max_player, depth)
+        if value is None:  # the game goes on
+            comparison = minimax(board_copy, player, depth-1, not max_player, heuristic, batch)
+            value = np.min(comparison) if max_player else np.max(comparison)
+        node_value[node] = value
+    return node_value
 
 
+@instrument.instrumented('minimax')
 def generate_move_minimax(
     board: np.ndarray, player: BoardPiece, saved_state: Optional[SavedState]
 ) -> Tuple[PlayerAction, Optional[SavedState]]:
     """
     generate the move for the agent from the minimax function using our heuristic
+    (or from the opening book, or the endgame solver)
     """
+    from agents.connectn.book import book_move
+    from agents.connectn.solver import endgame_move
+
+    action = book_move(board)
+    if action is None:
+        action = endgame_move(board, player)
+    if action is not None:
+        return action, saved_state
     depth = 4
     heuristic = heuristic_basic  # choose which heuristic to use
     #heuristic = heuristic_better
     action_set = minimax(board, player, depth, True, heuristic=heuristic)
-    print(action_set)
-    if len(set(action_set)) == 1:  # if all are the same
-        action = 3  # put piece in the center
-    else:
-        action = np.argmax(action_set)  # maximize the best move
+    if instrument.RECORDER is not None:
+        instrument.RECORDER.reach(depth)
+    action = choose_action(board, action_set)  # maximize the best move
     return action, saved_state
@@ -0,0 +1,167 @@
+import numpy as np
+from agents.connectn.common import initialize_game_state, apply_player_action
+from agents.connectn.common import PlayerAction, BoardPiece, PLAYER1, PLAYER2, CONNECT_N
+
+
+def heuristic_loops(board: np.ndarray, player: BoardPiece) -> int:
+    """the original window by window version of heuristic_basic, used as a reference"""
+    rows, cols = board.shape
+    rows_edge = rows - CONNECT_N + 1
+    cols_edge = cols - CONNECT_N + 1
+    rating = 0
+    degree = 5
+
+    for i in range(rows):
+        for j in range(cols_edge):
+            for k in range(CONNECT_N-1):
+                if np.all(board[i, j:j+CONNECT_N-k] == player):
+                    rating += CONNECT_N ** degree
+
+    for i in range(rows_edge):
+        for j in range(cols):
+            for k in range(CONNECT_N-1):
+                if np.all(board[i:i+CONNECT_N-k, j] == player):
+                    rating += CONNECT_N ** degree
+
+    for i in range(rows_edge):
+        for j in range(cols_edge):
+            for k in range(CONNECT_N-1):
+                block = board[i:i+CONNECT_N-k, j:j+CONNECT_N-k]
+                if np.all(np.diag(block) == player):
+                    rating += CONNECT_N ** degree
+                if np.all(np.diag(block[::-1, :]) == player):
+                    rating += CONNECT_N ** degree
+    return rating
+
+
+def random_boards(n: int, seed: int = 0) -> np.ndarray:
+    """a stack of boards after a random number of random moves"""
+    from agents.connectn.common import random_board
+
+    rng = np.random.default_rng(seed)
+    return np.array([random_board(rng, rng.integers(42)) for _ in range(n)])
+
+
+def test_winning_windows():
+    """should return the (69, 4) table of all winning windows"""
+    from agents.agent_minimax.minimax import winning_windows
+
+    ret = winning_windows()
+
+    assert ret.shape == (69, 4)
+    assert len(set(map(tuple, np.sort(ret, axis=1)))) == 69  # no window twice
+
+
+def test_heuristic_basic():
+    """should give the same ratings as the window by window loops, for one or many boards"""
+    from agents.agent_minimax.minimax import heuristic_basic
+
+    boards = random_boards(50)
+    for player in (PLAYER1, PLAYER2):
+        expected = [heuristic_loops(board, player) for board in boards]
+
+        assert [heuristic_basic(board, player) for board in boards] == expected
+        assert list(heuristic_basic(boards, player)) == expected
+
+
+def test_window_counts():
+    """should count the open windows with 2, 3 and 4 pieces of each player"""
+    from agents.agent_minimax.minimax import window_counts
+
+    board = initialize_game_state()
+    for action in range(3):  # three in a row on the bottom
+        apply_player_action(board, PlayerAction(action), PLAYER1)
+    apply_player_action(board, PlayerAction(3), PLAYER2)  # closed on the right
+
+    ret = window_counts(board, PLAYER1)
+
+    assert ret.shape == (2, 3)
+    assert list(ret[0]) == [0, 0, 0]  # the only window with player 1 pieces is blocked
+    assert list(ret[1]) == [0, 0, 0]
+    assert window_counts(board[None], PLAYER1).shape == (1, 2, 3)
+
+
+def test_heuristic_better():
+    """should prefer the player's open three over the opponent's, and agree for a stack"""
+    from agents.agent_minimax.minimax import heuristic_better
+
+    board = initialize_game_state()
+    for action in range(1, 4):
+        apply_player_action(board, PlayerAction(action), PLAYER1)
+
+    assert heuristic_better(board, PLAYER1) > 0
+    assert heuristic_better(board, PLAYER2) == -heuristic_better(board, PLAYER1)
+
+    boards = random_boards(20, seed=1)
+    assert list(heuristic_better(boards, PLAYER1)) == [heuristic_better(b, PLAYER1) for b in boards]
+
+
+def test_heuristic_better_weights():
+    """the rating should be the weighted difference of the window counts"""
+    from agents.agent_minimax.minimax import heuristic_better, window_counts
+
+    weights = (2, 30, 500)
+    for board in random_boards(20, seed=2):
+        counts = window_counts(board, PLAYER2)
+
+        assert heuristic_better(board, PLAYER2, weights) == (counts[0] - counts[1]) @ np.array(weights)
+
+
+def test_child_boards():
+    """should stack the board after each action, like apply_player_action"""
+    from agents.agent_minimax.minimax import child_boards
+
+    board = random_boards(1, seed=3)[0]
+    board[:, 0] = PLAYER2  # a full column
+    ret = child_boards(board, PLAYER1, range(7))
+
+    assert ret.shape == (7, 6, 7)
+    for action in range(7):
+        expected = apply_player_action(board, PlayerAction(action), PLAYER1, copy=True)
+        assert np.all(ret[action] == expected)
+
+
+def test_heuristic_batch():
+    """should give the ratings of each board, also for heuristics that take one board only"""
+    from agents.agent_minimax.minimax import heuristic_batch, heuristic_basic
+
+    boards = random_boards(10, seed=4)
+    expected = [heuristic_basic(board, PLAYER1) for board in boards]
+
+    assert list(heuristic_batch(boards, PLAYER1)) == expected
+    assert list(heuristic_batch(boards, PLAYER1, lambda b, p: heuristic_basic(b, p))) == expected
+
+
+def test_minimax_batch():
+    """scoring the leaves in batches should not change the node values"""
+    from agents.agent_minimax.minimax import minimax, heuristic_basic
+
+    for board in random_boards(3, seed=5):
+        for depth in (1, 2):
+            ret = minimax(board, PLAYER1, depth, True, heuristic_basic, batch=True)
+
+            assert np.all(ret == minimax(board, PLAYER1, depth, True, heuristic_basic, batch=False))
+
+
+def test_minimax_legal_terminal():
+    """full columns should never be chosen, wins should be taken and losses blocked"""
+    from agents.agent_minimax.minimax import minimax, heuristic_basic, choose_action, WIN_VALUE
+
+    board = initialize_game_state()
+    board[:, 3] = [1, 2, 1, 2, 1, 2]  # full center column
+    ret = minimax(board, PLAYER1, 2, True, heuristic_basic)
+    assert ret[3] == int(-1e10)
+    assert choose_action(board, ret) != 3
+
+    board = initialize_game_state()
+    for action in range(3):  # player 1 can win in column 3
+        apply_player_action(board, PlayerAction(action), PLAYER1)
+        apply_player_action(board, PlayerAction(action), PLAYER2)
+    for depth in (1, 2, 3):
+        ret = minimax(board, PLAYER1, depth, True, heuristic_basic)
+        assert ret[3] == WIN_VALUE + depth
+        assert choose_action(board, ret) == 3
+
+    ret = minimax(board, PLAYER2, 2, True, heuristic_basic)  # player 2 has to block
+    assert choose_action(board, ret) == 3
+    assert np.all(np.delete(ret, 3) <= -WIN_VALUE)
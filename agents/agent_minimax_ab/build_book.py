@@ -0,0 +1,77 @@
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+from agents.connectn.common import BoardPiece, PLAYER1, PLAYER2, initialize_game_state, apply_player_action
+from agents.connectn.common import connected_four
+from agents.connectn.book import position_key, write_book, DEFAULT_BOOK
+from agents.agent_minimax.minimax import heuristic_basic, choose_action, legal_moves
+from agents.agent_minimax_ab.negamax import pvs
+from agents.agent_minimax_ab.ordering import MoveOrdering
+from agents.agent_minimax_ab.transposition import TranspositionTable
+
+
+"""
+builds the opening book offline: every position up to a ply (that can be reached
+without the game ending, once for a board and its mirror image) is searched to
+a fixed depth with the pvs search, and its best move and value are written to the book
+
+run from the repository root with: python -m agents.agent_minimax_ab.build_book --ply 4 --depth 8
+"""
+
+
+def book_positions(ply: int) -> List[np.ndarray]:
+    """the positions up to the ply, mirrored where that gives the smaller book key"""
+    level = [initialize_game_state()]
+    positions = list(level)
+    for move_num in range(ply):
+        player = PLAYER1 if move_num % 2 == 0 else PLAYER2
+        children = {}
+        for board in level:
+            for action in legal_moves(board):
+                child = apply_player_action(board, action, player, copy=True)
+                if connected_four(child, player, action):  # the game is over
+                    continue
+                key, mirrored = position_key(child)
+                if key not in children:
+                    children[key] = child[:, ::-1].copy() if mirrored else child
+        level = list(children.values())
+        positions.extend(level)
+    return positions
+
+
+def search_position(board: np.ndarray, depth: int, heuristic=heuristic_basic) -> Tuple[int, int, int]:
+    """the (book key, best move, value for the player to move) of a position"""
+    player = PLAYER1 if np.count_nonzero(board) % 2 == 0 else PLAYER2
+    values = pvs(board, int(-1e10), int(1e10), BoardPiece(player), depth, True, heuristic,
+                 tt=TranspositionTable(), ordering=MoveOrdering(np.shape(board)[1]))
+    move = choose_action(board, values)
+    return position_key(board)[0], int(move), int(values[move])
+
+
+def build_book(path: str, ply: int, depth: int, workers: int = 1, heuristic=heuristic_basic) -> int:
+    """search the positions up to the ply and write the book, returns the number of positions"""
+    positions = book_positions(ply)
+    args = (positions, [depth] * len(positions), [heuristic] * len(positions))
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            entries = list(pool.map(search_position, *args, chunksize=16))
+    else:
+        entries = list(map(search_position, *args))
+    write_book(path, entries, np.shape(positions[0]), ply)
+    return len(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='build the opening book')
+    parser.add_argument('--ply', type=int, default=4, help='the last ply in the book')
+    parser.add_argument('--depth', type=int, default=8, help='the search depth of every position')
+    parser.add_argument('--workers', type=int, default=1, help='processes searching the positions')
+    parser.add_argument('--out', default=DEFAULT_BOOK, help='the book file')
+    args = parser.parse_args()
+    count = build_book(args.out, args.ply, args.depth, args.workers)
+    print('{} positions written to {}'.format(count, args.out))
+
+
+if __name__ == '__main__':
+    main()
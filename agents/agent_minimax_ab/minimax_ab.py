@@ -1,7 +1,13 @@
 import numpy as np
-from typing import Optional, Tuple
+import time
+from typing import Optional, Sequence, Tuple
+from agents.connectn import instrument
 from agents.connectn.common import PlayerAction, BoardPiece, SavedState, check_end_state
-from agents.agent_minimax.minimax import heuristic_basic, heuristic_better
+from agents.agent_minimax.minimax import heuristic_basic, heuristic_better, heuristic_batch, child_boards
+from agents.agent_minimax.minimax import terminal_value, choose_action, WIN_VALUE
+from agents.agent_minimax_ab.transposition import TranspositionTable, cutoff_value, bound_flag
+from agents.agent_minimax_ab.ordering import MoveOrdering
+from agents.connectn.solver import ENDGAME_EMPTY
 
 
 """
@@ -11,13 +17,35 @@ beta: best already explored option for the minimizer
 """
 
 
+class SearchTimeout(Exception):
+    """raised inside the search once the deadline of the move has passed"""
+
+
 def minimax_ab(
-    board: np.ndarray, alpha: np.int, beta: np.int, player: BoardPiece, depth: np.int, max_player: bool, heuristic
+    board: np.ndarray, alpha: np.int, beta: np.int, player: BoardPiece, depth: np.int, max_player: bool, heuristic,
+    batch: bool = True, tt: Optional[TranspositionTable] = None, deadline: Optional[float] = None,
+    move_order: Optional[Sequence[int]] = None, ordering: Optional[MoveOrdering] = None, ply: int = 0,
 ) -> np.array:
     """
     implement the minimax move generator with alpha-beta pruning
     the idea for this generate move function is to minimize the possible loss for a worst-case scenario
     in practice, to do this a tree search algorithm is created
+
+    with batch, the leaves below a depth 1 node are scored in a single heuristic call,
+    the node values are then cut off where the loop would have pruned
+
+    with a transposition table, the values of child nodes are looked up before
+    searching them, and stored (with their depth and bound type) afterwards
+
+    as in minimax, the heuristic is always from the side of player, only legal moves
+    are searched and moves which end the game get their terminal value
+
+    deadline is a time.perf_counter() value after which SearchTimeout is raised,
+    move_order is the order the moves of this node are tried in (the node values
+    are still indexed by column), otherwise a move ordering (killer moves, history)
+    gives the order, and records the moves that cause cutoffs at each ply.
+    at the root (ply 0) the moves after the first are searched with the window widened by
+    one, so every move as good as the best one gets its exact value and not a bound equal to it
     """
     from agents.connectn.common import apply_player_action
     from agents.connectn.common import pretty_print_board
@@ -28,23 +56,72 @@ def minimax_ab(
     else:
         other_player = 1
 
-    # should define which are columns are free here to reduce computation time
+    if deadline is not None and time.perf_counter() > deadline:
+        raise SearchTimeout()
+
+    recorder = instrument.RECORDER
+    evaluate, evaluate_batch, terminal = heuristic, heuristic_batch, terminal_value
+    children_of, play = child_boards, apply_player_action
+    if recorder is not None:  # with the instrumentation on, the phases of the search are timed
+        recorder.nodes += 1
+        evaluate = recorder.timed('eval', heuristic)
+        evaluate_batch = recorder.timed('eval', heuristic_batch)
+        terminal = recorder.timed('win_check', terminal_value)
+        children_of = recorder.timed('movegen', child_boards)
+        play = recorder.timed('movegen', apply_player_action)
+    if depth == 0:  # if a terminal node, then use the heuristic
+        if recorder is not None:
+            recorder.leaves += 1
+        return evaluate(board, player)
+
     node_num = np.shape(board)[1]  # number of moves initially allowed
+    mover = player if max_player else other_player  # the player making the moves of this node
+    if move_order is not None:
+        order = np.asarray(move_order)
+    elif ordering is not None:
+        order = np.asarray(ordering.order(ply, mover))
+    else:
+        order = np.arange(node_num)
+    order = order[board[-1, order] == 0]  # only the columns which are free
 
     # pretty_print_board(board)
 
-    if depth == 0:  # if a terminal node, then use the heuristic
-        return heuristic(board, player)
+    if depth == 1 and batch:  # the children are all leaves, score them at once
+        children = children_of(board, mover, order)
+        if recorder is not None:
+            recorder.leaves += len(children)
+        values = evaluate_batch(children, player, heuristic)
+        for i, (child, node) in enumerate(zip(children, order)):
+            value = terminal(child, mover, node, max_player, depth)
+            if value is not None:
+                values[i] = value
+        if max_player:
+            node_value = np.full(node_num, int(-1e10))
+            pruned = np.flatnonzero(values >= beta)  # alpha-beta pruning
+        else:
+            node_value = np.full(node_num, int(1e10))
+            pruned = np.flatnonzero(values <= alpha)  # alpha-beta pruning
+        last = pruned[0] + 1 if len(pruned) else len(order)  # children the loop would have visited
+        node_value[order[:last]] = values[:last]
+        if len(pruned) and ordering is not None:
+            ordering.cutoff(order[pruned[0]], ply, mover, depth)
+        return node_value
 
     if max_player:  # maximizing player level
         node_value = np.full(node_num, int(-1e10))  # empty array for node values, negative inf
-        for node in range(node_num):  # for each child node, maximize
-            board_copy = apply_player_action(board, node, player, copy=True)
-            comparison = np.min(minimax_ab(board_copy, alpha, beta, player, depth-1, False, heuristic))
+        for i, node in enumerate(order):  # for each child node, maximize
+            board_copy = play(board, node, player, copy=True)
+            comparison = terminal(board_copy, player, node, True, depth)
+            if comparison is None:  # the game goes on
+                window = alpha - 1 if ply == 0 and i > 0 else alpha  # ties with the best root move are exact
+                comparison = search_child(board_copy, window, beta, player, depth-1, False, heuristic, batch, tt,
+                                          deadline, ordering, ply+1)
             if comparison > node_value[node]:
                 node_value[node] = comparison
             # alpha-beta pruning:
             if comparison >= beta:
+                if ordering is not None:
+                    ordering.cutoff(node, ply, player, depth)
                 return node_value
             if comparison > alpha:
                 alpha = comparison
@@ -52,33 +129,139 @@ def minimax_ab(
 
     else:  # minimizing player level
         node_value = np.full(node_num, int(1e10))  # empty array for node values, positive inf
-        for node in range(node_num):  # for each child node, minimize
-            board_copy = apply_player_action(board, node, other_player, copy=True)
-            comparison = np.max(minimax_ab(board_copy, alpha, beta, other_player, depth-1, True, heuristic))
+        for i, node in enumerate(order):  # for each child node, minimize
+            board_copy = play(board, node, other_player, copy=True)
+            comparison = terminal(board_copy, other_player, node, False, depth)
+            if comparison is None:  # the game goes on
+                window = beta + 1 if ply == 0 and i > 0 else beta  # ties with the best root move are exact
+                comparison = search_child(board_copy, alpha, window, player, depth-1, True, heuristic, batch, tt,
+                                          deadline, ordering, ply+1)
             if comparison < node_value[node]:
                 node_value[node] = comparison
             # alpha-beta pruning
             if comparison <= alpha:
+                if ordering is not None:
+                    ordering.cutoff(node, ply, other_player, depth)
                 return node_value
             if comparison < beta:
                 beta = comparison
         return node_value
 
 
+def search_child(
+    board: np.ndarray, alpha: int, beta: int, player: BoardPiece, depth: int, max_player: bool, heuristic,
+    batch: bool = True, tt: Optional[TranspositionTable] = None, deadline: Optional[float] = None,
+    ordering: Optional[MoveOrdering] = None, ply: int = 0,
+) -> int:
+    """
+    the value of a child node for its parent: the best of its node values
+    (highest on a maximizing level, lowest on a minimizing level).
+    with a transposition table the value is reused if it was already searched deep enough,
+    otherwise the stored best move is searched first
+    """
+    reduce, best = (np.max, np.argmax) if max_player else (np.min, np.argmin)
+    if tt is None or depth == 0:
+        return reduce(minimax_ab(board, alpha, beta, player, depth, max_player, heuristic, batch, tt, deadline,
+                                 ordering=ordering, ply=ply))
+
+    key = tt.hash(board, player, max_player)
+    entry = tt.probe(key)
+    value = cutoff_value(entry, depth, alpha, beta)
+    if value is not None:
+        return value
+    move_order = None
+    if entry is not None and ordering is not None:  # the best move of the last search goes first
+        mover = player if max_player else (2 if player == 1 else 1)
+        move_order = ordering.order(ply, mover, entry.move)
+    node_value = minimax_ab(board, alpha, beta, player, depth, max_player, heuristic, batch, tt, deadline,
+                            move_order, ordering, ply)
+    value = reduce(node_value)
+    tt.store(key, depth, value, bound_flag(value, alpha, beta), best(node_value))
+    return value
+
+
+def iterative_deepening(
+    board: np.ndarray, player: BoardPiece, heuristic, time_budget: float, max_depth: Optional[int] = None,
+    tt: Optional[TranspositionTable] = None, ordering: Optional[MoveOrdering] = None, search=None,
+) -> Tuple[np.array, int]:
+    """
+    search to depth 1, 2, 3... until the time budget [s] runs out,
+    returns the node values of the last completed depth and that depth.
+    each depth tries the moves in the order of the previous depth's values,
+    so the principal variation is searched first.
+    search is minimax_ab (the default) or a drop-in for it like negamax.pvs
+    """
+    if search is None:
+        search = minimax_ab
+    if ordering is None:
+        ordering = MoveOrdering(np.shape(board)[1])
+    deadline = time.perf_counter() + time_budget
+    if max_depth is None:  # no point in searching past the end of the game
+        max_depth = max(int(np.sum(board == 0)), 1)
+    alpha, beta = int(-1e10), int(1e10)  # starting alpha-beta values
+
+    action_set, completed = None, 0
+    move_order = ordering.static  # center first
+    for depth in range(1, max_depth + 1):
+        try:
+            action_set = search(board, alpha, beta, player, depth, True, heuristic,
+                                tt=tt, deadline=deadline, move_order=move_order, ordering=ordering)
+        except SearchTimeout:  # use the last completed depth
+            break
+        completed = depth
+        move_order = sorted(ordering.static, key=lambda col: -action_set[col])  # best moves first
+        legal = action_set[board[-1] == 0]
+        if np.max(legal) >= WIN_VALUE or np.max(legal) <= -WIN_VALUE:  # forced win or loss found
+            break
+        if time.perf_counter() > deadline:
+            break
+
+    if action_set is None:  # not even depth 1 finished in time
+        action_set = search(board, alpha, beta, player, 1, True, heuristic, tt=tt)
+        completed = 1
+    return action_set, completed
+
+
+@instrument.instrumented('minimax_ab')
 def generate_move_minimax_ab(
-    board: np.ndarray, player: BoardPiece, saved_state: Optional[SavedState]
+    board: np.ndarray, player: BoardPiece, saved_state: Optional[SavedState], time_budget: float = 1.0,
+    max_depth: Optional[int] = None, search: str = 'pvs', workers: int = 1, endgame: int = ENDGAME_EMPTY,
 ) -> Tuple[PlayerAction, Optional[SavedState]]:
-    """generate the move for the agent from the minimax with pruning function using our heuristic"""
-    depth = 4
+    """
+    generate the move for the agent from the minimax with pruning function using our heuristic
+    the search deepens until the time budget [s] for the move is used up,
+    search chooses the engine: 'pvs' (negamax principal variation search) or 'minimax_ab'.
+    with more than one worker the root moves are searched in parallel (with pvs).
+    positions in the opening book are not searched, and with at most endgame
+    empty cells the move is solved exactly
+    """
+    from agents.connectn.book import book_move
+    from agents.connectn.solver import endgame_move
+    from agents.agent_minimax_ab.negamax import pvs
+    from agents.agent_minimax_ab.parallel import parallel_search
+
+    action = book_move(board)
+    if action is None:
+        action = endgame_move(board, player, endgame)
+    if action is not None:
+        return action, saved_state
+
+    engines = {'pvs': pvs, 'minimax_ab': minimax_ab}
     # choose which heuristic to use
     heuristic = heuristic_basic
     # heuristic = heuristic_better
-    alpha, beta = int(-1e10), int(1e10)  # starting alpha-beta values
-    action_set = minimax_ab(board, alpha, beta, player, depth, True, heuristic=heuristic)
-    print(action_set)
-    # if np.all(board) == 0:  # if the board is empty
-    if len(set(action_set)) == 1:  # if all options are the same
-        action = 3  # put piece in the center
-    else:
-        action = np.argmax(action_set)  # maximize the best move
-    return PlayerAction(action), saved_state
+    if saved_state is None:
+        saved_state = SavedState()
+    if getattr(saved_state, 'tt', None) is None:  # the transposition table is kept between moves
+        saved_state.tt = TranspositionTable()
+    engine = parallel_search(workers) if workers > 1 else engines[search]
+    tt = saved_state.tt
+    hits, probes = tt.hits, tt.hits + tt.misses
+    action_set, depth = iterative_deepening(board, player, heuristic, time_budget, max_depth, tt=tt, search=engine)
+    recorder = instrument.RECORDER
+    if recorder is not None:
+        recorder.tt_hits += tt.hits - hits
+        recorder.tt_probes += tt.hits + tt.misses - probes
+        recorder.reach(depth)
+    action = choose_action(board, action_set)  # maximize the best move
+    return action, saved_state
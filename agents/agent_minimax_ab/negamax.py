@@ -0,0 +1,191 @@
+import numpy as np
+import time
+from typing import List, Optional, Sequence
+from agents.connectn import instrument
+from agents.connectn.common import BoardPiece, NO_PLAYER, connected_four
+from agents.agent_minimax.minimax import heuristic_batch, child_boards, terminal_value, WIN_VALUE
+from agents.agent_minimax_ab.minimax_ab import SearchTimeout
+from agents.agent_minimax_ab.transposition import TranspositionTable, cutoff_value, bound_flag
+from agents.agent_minimax_ab.ordering import MoveOrdering
+
+
+"""
+negamax formulation of the alpha-beta search with principal variation search (negascout)
+instead of a maximizing and a minimizing level, every node maximizes the value from the
+side of the player to move, the value of a child is the negative of its own value.
+the first move of a node is searched with the full window, the others only with a null
+window (alpha, alpha + 1) to prove they are not better, and searched again if they are.
+nodes return a single score, only the root builds the array of node values,
+and moves are made and taken back on one board instead of copying it for every child
+"""
+
+
+def pvs(
+    board: np.ndarray, alpha: int, beta: int, player: BoardPiece, depth: int, max_player: bool, heuristic,
+    batch: bool = True, tt: Optional[TranspositionTable] = None, deadline: Optional[float] = None,
+    move_order: Optional[Sequence[int]] = None, ordering: Optional[MoveOrdering] = None, ply: int = 0,
+) -> np.array:
+    """
+    a drop-in for minimax_ab: same arguments, and the same node values (from the side of player,
+    the best move exact and the other moves bounds, full columns at the worst value of the level).
+    moves as good as the best are exact as well, the bounds of the others are strictly worse
+    """
+    other_player = BoardPiece(2) if player == 1 else BoardPiece(1)
+    mover, sign = (player, 1) if max_player else (other_player, -1)  # root player to move, and their side
+    node_num = np.shape(board)[1]
+    node_value = np.full(node_num, int(-1e10) * sign)
+    if depth == 0:
+        return heuristic(board, player)
+
+    board = board.copy()  # moves are made in place
+    heights = [int(np.count_nonzero(board[:, col] != NO_PLAYER)) for col in range(node_num)]
+    search = _Search(board, heights, player, heuristic, batch, tt, deadline, ordering)
+    if move_order is None:
+        move_order = ordering.order(ply, mover) if ordering is not None else range(node_num)
+    moves = [int(move) for move in move_order if heights[move] < board.shape[0]]
+
+    alpha, beta = (alpha, beta) if max_player else (-beta, -alpha)  # window from the side of the mover
+    for i, move in enumerate(moves):
+        # the window starts just below alpha, so moves as good as the best one get their exact value
+        value = search.child(move, mover, depth, alpha if i == 0 else alpha - 1, beta, ply, first=(i == 0))
+        node_value[move] = sign * value
+        if value >= beta:  # pruned, like minimax_ab
+            break
+        alpha = max(alpha, value)
+    return node_value
+
+
+def search_root_move(
+    board: np.ndarray, player: BoardPiece, move: int, depth: int, heuristic, alpha: int, beta: int,
+    batch: bool = True, tt: Optional[TranspositionTable] = None, deadline: Optional[float] = None,
+    ordering: Optional[MoveOrdering] = None, first: bool = True,
+) -> int:
+    """
+    the value (from the side of player, who is to move) of one root move, searched with the
+    (alpha, beta) window (with a null window first unless it is the first move),
+    used to search the root moves separately (e.g. in parallel)
+    """
+    board = board.copy()
+    heights = [int(np.count_nonzero(board[:, col] != NO_PLAYER)) for col in range(np.shape(board)[1])]
+    search = _Search(board, heights, player, heuristic, batch, tt, deadline, ordering)
+    return search.child(move, player, depth, alpha, beta, 0, first=first)
+
+
+class _Search(object):
+
+    """the state shared by all the nodes of one search"""
+
+    def __init__(self, board, heights, player, heuristic, batch, tt, deadline, ordering):
+        self.board = board
+        self.heights = heights
+        self.rows = board.shape[0]
+        self.empty = board.size - sum(heights)  # cells left to play
+        self.player = player
+        self.heuristic = heuristic
+        self.batch = batch
+        self.tt = tt
+        self.deadline = deadline
+        self.ordering = ordering
+        # with the instrumentation on, the phases of the search are timed
+        self.recorder = recorder = instrument.RECORDER
+        self.evaluate, self.heuristic_batch = heuristic, heuristic_batch
+        self.connected_four, self.child_boards, self.terminal_value = connected_four, child_boards, terminal_value
+        if recorder is not None:
+            self.evaluate = recorder.timed('eval', heuristic)
+            self.heuristic_batch = recorder.timed('eval', heuristic_batch)
+            self.connected_four = recorder.timed('win_check', connected_four)
+            self.terminal_value = recorder.timed('win_check', terminal_value)
+            self.child_boards = recorder.timed('movegen', child_boards)
+            self.moves = recorder.timed('movegen', self.moves)
+
+    def child(self, move: int, mover: BoardPiece, depth: int, alpha: int, beta: int, ply: int, first: bool) -> int:
+        """
+        the value (for the mover) of making the move in a node with the (alpha, beta) window,
+        searched with a null window first unless it is the first move of the node
+        """
+        row = self.heights[move]
+        self.board[row, move] = mover
+        self.heights[move] += 1
+        self.empty -= 1
+        try:
+            if self.connected_four(self.board, mover, move):
+                return WIN_VALUE + depth
+            if self.empty == 0:  # the board is full
+                return 0
+            other = BoardPiece(2) if mover == 1 else BoardPiece(1)
+            if first:
+                return -self.negamax(other, depth - 1, -beta, -alpha, ply + 1)
+            value = -self.negamax(other, depth - 1, -alpha - 1, -alpha, ply + 1)
+            if alpha < value < beta:  # better than the principal variation, search it properly
+                value = -self.negamax(other, depth - 1, -beta, -value, ply + 1)
+            return value
+        finally:
+            self.empty += 1
+            self.heights[move] -= 1
+            self.board[row, move] = NO_PLAYER
+
+    def leaf(self, mover: BoardPiece) -> int:
+        if self.recorder is not None:
+            self.recorder.leaves += 1
+        value = self.evaluate(self.board, self.player)
+        return value if mover == self.player else -value
+
+    def negamax(self, mover: BoardPiece, depth: int, alpha: int, beta: int, ply: int) -> int:
+        """the value of the board with the mover to play, from the side of the mover"""
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        if self.recorder is not None:
+            self.recorder.nodes += 1
+        if depth == 0:
+            return self.leaf(mover)
+
+        tt, tt_move, key = self.tt, None, None
+        if tt is not None:
+            key = tt.hash(self.board, mover, mover == self.player)
+            entry = tt.probe(key)
+            value = cutoff_value(entry, depth, alpha, beta)
+            if value is not None:
+                return value
+            tt_move = entry.move if entry is not None else None
+
+        moves = self.moves(mover, ply, tt_move)
+        if depth == 1 and self.batch:
+            best, best_move = self.frontier(mover, moves)
+        else:
+            best, best_move = int(-1e10), moves[0]
+            window = alpha
+            for i, move in enumerate(moves):
+                value = self.child(move, mover, depth, window, beta, ply, first=(i == 0))
+                if value > best:
+                    best, best_move = value, move
+                if value >= beta:
+                    if self.ordering is not None:
+                        self.ordering.cutoff(move, ply, mover, depth)
+                    break
+                window = max(window, value)
+
+        if tt is not None:
+            tt.store(key, depth, best, bound_flag(best, alpha, beta), best_move)
+        return best
+
+    def moves(self, mover: BoardPiece, ply: int, tt_move: Optional[int]) -> List[int]:
+        if self.ordering is not None:
+            order = self.ordering.order(ply, mover, tt_move)
+        else:
+            order = range(len(self.heights))
+        return [move for move in order if self.heights[move] < self.rows]
+
+    def frontier(self, mover: BoardPiece, moves: List[int]):
+        """score all the children of a depth 1 node in one heuristic call, returns the best"""
+        children = self.child_boards(self.board, mover, moves)
+        if self.recorder is not None:
+            self.recorder.leaves += len(children)
+        values = self.heuristic_batch(children, self.player, self.heuristic)
+        if mover != self.player:
+            values = -values
+        for i, (child, move) in enumerate(zip(children, moves)):
+            value = self.terminal_value(child, mover, move, True, 1)
+            if value is not None:
+                values[i] = value
+        best = int(np.argmax(values))
+        return int(values[best]), moves[best]
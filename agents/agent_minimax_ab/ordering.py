@@ -0,0 +1,62 @@
+from typing import List, Optional
+
+
+"""
+move ordering for the alpha-beta search
+alpha-beta prunes the most when the best move of a node is tried first,
+which the following guesses are used for (in this order):
+  transposition table move: the best move the last time the node was searched
+  killer moves: moves that caused a cutoff at the same ply elsewhere in the tree
+  history heuristic: how often (weighted by depth) a move caused a cutoff at all
+  center first: central columns are part of more windows, so are usually better
+"""
+
+
+class MoveOrdering(object):
+
+    """keeps the killer moves and history table of a search and orders the moves of a node"""
+
+    def __init__(
+            self, cols: int = 7, center: bool = True, killers: bool = True, history: bool = True,
+            tt_move: bool = True,
+    ):
+        self.cols = cols
+        self.use_killers = killers
+        self.use_history = history
+        self.use_tt_move = tt_move
+        if center:  # columns sorted by their distance to the center
+            self.static = sorted(range(cols), key=lambda col: abs(2 * col - (cols - 1)))
+        else:
+            self.static = list(range(cols))
+        self.killers = {}  # the two latest killer moves of each ply
+        self.history = [[0] * cols for _ in range(3)]  # cutoff score per player and column
+
+    def order(self, ply: int, player: int, tt_move: Optional[int] = None) -> List[int]:
+        """the columns of a node in the order they should be searched"""
+        if self.use_history:  # stable sort, so ties keep the static order
+            moves = sorted(self.static, key=lambda col: -self.history[player][col])
+        else:
+            moves = list(self.static)
+        first = []
+        if self.use_tt_move and tt_move is not None:
+            first.append(tt_move)
+        if self.use_killers:
+            first.extend(move for move in self.killers.get(ply, ()) if move not in first)
+        if first:
+            moves = first + [move for move in moves if move not in first]
+        return moves
+
+    def cutoff(self, move: int, ply: int, player: int, depth: int):
+        """record a move that caused a beta (or alpha) cutoff"""
+        move = int(move)
+        if self.use_killers:
+            killers = self.killers.setdefault(ply, [])
+            if move not in killers:
+                killers.insert(0, move)
+                del killers[2:]
+        if self.use_history:
+            self.history[player][move] += depth * depth
+
+    def clear(self):
+        self.killers = {}
+        self.history = [[0] * self.cols for _ in range(3)]
@@ -0,0 +1,132 @@
+import numpy as np
+import multiprocessing
+import multiprocessing.util
+from concurrent.futures import ProcessPoolExecutor, wait
+from typing import Dict, Optional, Sequence
+from agents.connectn.common import BoardPiece
+from agents.agent_minimax_ab.negamax import search_root_move
+from agents.agent_minimax_ab.transposition import TranspositionTable, bound_flag
+from agents.agent_minimax_ab.ordering import MoveOrdering
+
+
+"""
+parallel root search: the root moves are split over a pool of worker processes,
+each worker searches one root move at a time with the negamax pvs search.
+the best value found so far is shared through a shared memory value, so moves
+searched later start with a narrower window and prune more.
+with young brothers wait the first (principal variation) move is searched on
+its own before the others are handed out, so they all get its value as alpha.
+a move is searched with the window (alpha - 1, beta), so every move as good as
+the best one gets its exact value and the chosen move is the same as the serial search.
+the pools are shut down with close, or when the process exits (the main process
+or a worker of the arena, where atexit does not run)
+"""
+
+_shared_alpha = None  # the shared alpha of the worker process, set by _init_worker
+_tt = None  # transposition table of the worker process, kept between searches
+_ordering = None  # move ordering of the worker process
+
+
+def _init_worker(shared_alpha, tt: bool, cols: int):
+    global _shared_alpha, _tt, _ordering
+    _shared_alpha = shared_alpha
+    _tt = TranspositionTable() if tt else None
+    _ordering = MoveOrdering(cols)
+
+
+def _search_move(
+    board: np.ndarray, player: BoardPiece, move: int, depth: int, heuristic, beta: int, batch: bool,
+    deadline: Optional[float], first: bool,
+) -> int:
+    """search one root move in a worker, with the best value of the other workers as alpha"""
+    alpha = _shared_alpha.value
+    value = search_root_move(board, player, move, depth, heuristic, alpha - 1, beta, batch,
+                             _tt, deadline, _ordering, first)
+    with _shared_alpha.get_lock():
+        if value > _shared_alpha.value:
+            _shared_alpha.value = value
+    return value
+
+
+class ParallelRootSearch(object):
+
+    """
+    a process pool that is kept alive between moves, called like minimax_ab (as the search of
+    iterative_deepening). every worker keeps its own transposition table and move ordering for the
+    tree below the root, the tt and ordering arguments are used at the root: the move of the root
+    entry of tt is searched first, the root value is stored in tt, and without a move_order the
+    root moves are in the order of ordering
+    """
+
+    def __init__(self, workers: int, tt: bool = True, ybw: bool = True, cols: int = 7):
+        self.workers = workers
+        self.ybw = ybw  # young brothers wait: search the first move before the others
+        self.shared_alpha = multiprocessing.Value('q', int(-1e10))
+        self.pool = ProcessPoolExecutor(workers, initializer=_init_worker,
+                                        initargs=(self.shared_alpha, tt, cols))
+        # multiprocessing runs the finalizers at the exit of worker processes as well, before
+        # the finalizers of its queues (priority 10) which the shutdown still needs
+        self._shutdown = multiprocessing.util.Finalize(self, self.pool.shutdown, exitpriority=20)
+
+    def __call__(
+        self, board: np.ndarray, alpha: int, beta: int, player: BoardPiece, depth: int, max_player: bool,
+        heuristic, batch: bool = True, tt: Optional[TranspositionTable] = None, deadline: Optional[float] = None,
+        move_order: Optional[Sequence[int]] = None, ordering: Optional[MoveOrdering] = None, ply: int = 0,
+    ) -> np.array:
+        if not max_player:
+            raise ValueError('the parallel search only splits the root of the maximizing player')
+        node_num = np.shape(board)[1]
+        node_value = np.full(node_num, int(-1e10))
+        if depth == 0:
+            return heuristic(board, player)
+        tt_move, key = None, None
+        if tt is not None:
+            key = tt.hash(board, player, True)
+            entry = tt.probe(key)
+            if entry is not None:
+                tt_move = entry.move
+        if move_order is None:
+            move_order = ordering.order(ply, player, tt_move) if ordering is not None else range(node_num)
+        moves = [int(move) for move in move_order if board[-1, move] == 0]
+        if not moves:
+            return node_value
+        if tt_move in moves:  # the best move of the last search is the first (young brothers wait) move
+            moves.remove(tt_move)
+            moves.insert(0, tt_move)
+
+        with self.shared_alpha.get_lock():
+            self.shared_alpha.value = int(alpha)
+        futures = {}
+        try:
+            for i, move in enumerate(moves):
+                futures[move] = self.pool.submit(_search_move, board, player, move, depth, heuristic, int(beta),
+                                                 batch, deadline, i == 0)
+                if i == 0 and self.ybw and len(moves) > 1:
+                    node_value[move] = futures[move].result()
+            for move, future in futures.items():
+                node_value[move] = future.result()
+        finally:
+            # a timed out search leaves the other moves running, they have to finish
+            # before the shared alpha can be used by the next search
+            for future in futures.values():
+                future.cancel()
+            wait(futures.values())
+        if tt is not None:
+            best = max(moves, key=lambda move: node_value[move])
+            tt.store(key, depth, node_value[best], bound_flag(node_value[best], alpha, beta), best)
+        return node_value
+
+    def close(self):
+        if _SEARCHES.get(self.workers) is self:  # the next parallel_search starts a new pool
+            del _SEARCHES[self.workers]
+        self._shutdown()
+
+
+_SEARCHES: Dict[int, ParallelRootSearch] = {}  # the pools kept alive, per number of workers
+
+
+def parallel_search(workers: int) -> ParallelRootSearch:
+    """the parallel search with the number of workers, the pool is started on the first call"""
+    if workers not in _SEARCHES:
+        _SEARCHES[workers] = ParallelRootSearch(workers)
+    return _SEARCHES[workers]
@@ -0,0 +1,32 @@
+import numpy as np
+
+
+def test_book_positions():
+    """every position up to the ply once (up to mirroring), not after the game has ended"""
+    from agents.agent_minimax_ab.build_book import book_positions
+    from agents.connectn.book import position_key
+
+    positions = book_positions(3)
+    keys = [position_key(board) for board in positions]
+    assert [np.count_nonzero(board) for board in positions[:6]] == [0, 1, 1, 1, 1, 2]
+    assert len(set(key for key, mirrored in keys)) == len(positions)
+    assert not any(mirrored for key, mirrored in keys)  # stored the way round of the key
+    assert len(positions) == 1 + 4 + 25 + 121
+
+
+def test_build_book(tmp_path):
+    """the book should have the search's move for every position"""
+    from agents.agent_minimax_ab.build_book import build_book, book_positions
+    from agents.agent_minimax_ab.minimax_ab import generate_move_minimax_ab
+    from agents.connectn.book import OpeningBook, _load_book
+    from agents.connectn.common import BoardPiece, SavedState
+
+    path = str(tmp_path / 'book.bin')
+    assert build_book(path, 2, 2) == 30
+    book = OpeningBook(path)
+    assert book.ply == 2
+    for board in book_positions(2):
+        player = BoardPiece(1) if np.count_nonzero(board) % 2 == 0 else BoardPiece(2)
+        action, _ = generate_move_minimax_ab(board, player, SavedState(), max_depth=2, search='pvs')
+        assert book.move(board) == action
+    _load_book.cache_clear()
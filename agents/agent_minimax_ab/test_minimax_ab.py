@@ -26,3 +26,105 @@ def test_generate_move_minimax_ab():
     ret = generate_move_minimax_ab(board=board, player=BoardPiece(1), saved_state=None)[0]
 
     assert type(ret) == PlayerAction
+
+
+def test_minimax_ab_batch():
+    """scoring the leaves in batches should give the same values, pruning included"""
+    from agents.agent_minimax_ab.minimax_ab import minimax_ab
+    from agents.connectn.common import random_board
+
+    rng = np.random.default_rng(0)
+    for _ in range(5):
+        board = random_board(rng, rng.integers(20))
+        for depth in (1, 2, 3):
+            for alpha, beta in ((int(-1e10), int(1e10)), (2000, 5000)):
+                args = (board, alpha, beta, BoardPiece(1), depth, True, heuristic_basic)
+
+                assert np.all(minimax_ab(*args, batch=True) == minimax_ab(*args, batch=False))
+
+
+def test_minimax_ab_best_move():
+    """the chosen move should be as good as the best one of a plain minimax search, whichever engine is used"""
+    from agents.agent_minimax_ab.minimax_ab import minimax_ab, generate_move_minimax_ab
+    from agents.agent_minimax.minimax import minimax, choose_action
+    from agents.connectn.common import random_board, PLAYER1, PLAYER2
+
+    rng = np.random.default_rng(8)
+    for _ in range(40):
+        board = random_board(rng, rng.integers(4, 30))
+        player = PLAYER1 if np.count_nonzero(board) % 2 == 0 else PLAYER2
+        values = minimax(board, player, 3, True, heuristic_basic)
+        best = np.max(values[board[-1] == 0])
+
+        action_set = minimax_ab(board, int(-1e10), int(1e10), player, 3, True, heuristic_basic)
+        assert values[choose_action(board, action_set)] == best
+        for search in ('minimax_ab', 'pvs'):
+            action, _ = generate_move_minimax_ab(board.copy(), player, None, time_budget=60, max_depth=3,
+                                                 search=search, endgame=0)
+            assert values[action] == best
+
+
+def test_iterative_deepening(monkeypatch):
+    """should stop at the time budget and return the values of a completed depth"""
+    from types import SimpleNamespace
+    from agents.agent_minimax_ab import minimax_ab as module
+    from agents.agent_minimax_ab.minimax_ab import iterative_deepening, minimax_ab
+
+    tick, now = 0.001, [0.]  # the clock moves on by a tick every time it is read (once per node)
+
+    def perf_counter():
+        now[0] += tick
+        return now[0]
+
+    monkeypatch.setattr(module, 'time', SimpleNamespace(perf_counter=perf_counter))
+    board = initialize_game_state()
+    ret, depth = iterative_deepening(board, BoardPiece(1), heuristic_basic, time_budget=0.2)
+    monkeypatch.undo()
+
+    assert 0.2 < now[0] <= 0.2 + 2 * tick  # the search that ran past the deadline stopped at once
+    assert 1 <= depth < 42  # the last depth did not complete
+    expected = minimax_ab(board, int(-1e10), int(1e10), BoardPiece(1), depth, True, heuristic_basic)
+    assert ret.shape == np.shape(board[0])
+    assert np.max(ret) == np.max(expected)
+
+    # with time to spare, it should stop at the maximum depth with the plain search result
+    ret, depth = iterative_deepening(board, BoardPiece(1), heuristic_basic, time_budget=60, max_depth=3)
+    expected = minimax_ab(board, int(-1e10), int(1e10), BoardPiece(1), 3, True, heuristic_basic)
+
+    assert depth == 3
+    assert np.max(ret) == np.max(expected)
+
+
+def test_minimax_ab_timeout():
+    """the search should raise SearchTimeout once the deadline has passed"""
+    import time
+    import pytest
+    from agents.agent_minimax_ab.minimax_ab import minimax_ab, SearchTimeout
+
+    board = initialize_game_state()
+    with pytest.raises(SearchTimeout):
+        minimax_ab(board, int(-1e10), int(1e10), BoardPiece(1), 4, True, heuristic_basic,
+                   deadline=time.perf_counter() - 1)
+
+
+def test_minimax_ab_terminal():
+    """should take a win, block a loss and never play a full column"""
+    from agents.agent_minimax_ab.minimax_ab import minimax_ab
+    from agents.agent_minimax.minimax import choose_action, WIN_VALUE
+    from agents.connectn.common import apply_player_action
+
+    board = initialize_game_state()
+    for action in (0, 1, 2):  # player 1 threatens to win in column 3
+        apply_player_action(board, PlayerAction(action), BoardPiece(1))
+        apply_player_action(board, PlayerAction(action), BoardPiece(2))
+    board[:, 6] = [1, 2, 1, 2, 1, 2]  # full column
+    alpha, beta = int(-1e10), int(1e10)
+
+    for depth in (1, 3, 4):
+        ret = minimax_ab(board, alpha, beta, BoardPiece(1), depth, True, heuristic_basic)
+        assert choose_action(board, ret) == 3
+        assert np.max(ret) == WIN_VALUE + depth
+
+        ret = minimax_ab(board, alpha, beta, BoardPiece(2), depth + 1, True, heuristic_basic)
+        assert choose_action(board, ret) == 3
+        assert ret[6] == alpha
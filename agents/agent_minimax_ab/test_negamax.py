@@ -0,0 +1,50 @@
+import numpy as np
+from agents.connectn.common import initialize_game_state, apply_player_action, random_board
+from agents.connectn.common import BoardPiece, PlayerAction
+from agents.agent_minimax.minimax import heuristic_basic, heuristic_better
+
+
+def test_pvs_matches_minimax_ab():
+    """the negamax search should find the same best value as minimax_ab, on both kinds of levels"""
+    from agents.agent_minimax_ab.minimax_ab import minimax_ab
+    from agents.agent_minimax_ab.negamax import pvs
+    from agents.agent_minimax_ab.ordering import MoveOrdering
+    from agents.agent_minimax_ab.transposition import TranspositionTable
+
+    rng = np.random.default_rng(11)
+    for board in (random_board(rng, rng.integers(2, 20)) for _ in range(4)):
+        for heuristic in (heuristic_basic, heuristic_better):
+            for max_player, best in ((True, np.max), (False, np.min)):
+                args = (board, int(-1e10), int(1e10), BoardPiece(1), 4, max_player, heuristic)
+                expected = best(minimax_ab(*args))
+                ret = pvs(*args)
+
+                assert ret.shape == np.shape(board[0])
+                assert best(ret) == expected
+                assert best(pvs(*args, batch=False)) == expected
+                assert best(pvs(*args, tt=TranspositionTable(), ordering=MoveOrdering())) == expected
+
+
+def test_pvs_board_unchanged():
+    """moves are made in place on a copy, the input board should not change"""
+    from agents.agent_minimax_ab.negamax import pvs
+
+    board = random_board(np.random.default_rng(12), 12)
+    before = board.copy()
+    pvs(board, int(-1e10), int(1e10), BoardPiece(1), 3, True, heuristic_basic)
+
+    assert np.all(board == before)
+
+
+def test_generate_move_pvs():
+    """both engines should take an immediate win"""
+    from agents.agent_minimax_ab.minimax_ab import generate_move_minimax_ab
+
+    board = initialize_game_state()
+    for action in (1, 2, 3):
+        apply_player_action(board, PlayerAction(action), BoardPiece(2))
+        apply_player_action(board, PlayerAction(action), BoardPiece(1))
+    for search in ('pvs', 'minimax_ab'):
+        action, _ = generate_move_minimax_ab(board, BoardPiece(2), None, 0.2, search=search)
+
+        assert action in (0, 4)
@@ -0,0 +1,47 @@
+import numpy as np
+from agents.connectn.common import BoardPiece, random_board
+
+
+def test_order_center_first():
+    """without any cutoffs recorded, the center columns should come first"""
+    from agents.agent_minimax_ab.ordering import MoveOrdering
+
+    ret = MoveOrdering().order(ply=0, player=1)
+
+    assert ret == [3, 2, 4, 1, 5, 0, 6]
+    assert MoveOrdering(center=False).order(ply=0, player=1) == list(range(7))
+
+
+def test_order_killers_history():
+    """the tt move goes first, then the killers of the ply, then by history"""
+    from agents.agent_minimax_ab.ordering import MoveOrdering
+
+    ordering = MoveOrdering()
+    ordering.cutoff(6, ply=2, player=1, depth=3)
+    ordering.cutoff(0, ply=2, player=1, depth=1)
+    ordering.cutoff(5, ply=1, player=1, depth=4)
+
+    assert ordering.order(ply=2, player=1)[:3] == [0, 6, 5]  # killers, latest first, then history
+    assert ordering.order(ply=2, player=1, tt_move=4)[:3] == [4, 0, 6]
+    assert ordering.order(ply=3, player=1)[:3] == [5, 6, 0]  # history only
+    assert ordering.order(ply=3, player=2) == [3, 2, 4, 1, 5, 0, 6]
+
+    ordering.clear()
+    assert ordering.order(ply=2, player=1) == [3, 2, 4, 1, 5, 0, 6]
+
+
+def test_minimax_ab_ordering():
+    """the order moves are searched in should not change the best value"""
+    from agents.agent_minimax_ab.minimax_ab import minimax_ab
+    from agents.agent_minimax_ab.ordering import MoveOrdering
+    from agents.agent_minimax_ab.transposition import TranspositionTable
+    from agents.agent_minimax.minimax import heuristic_better
+
+    rng = np.random.default_rng(7)
+    for _ in range(3):
+        board = random_board(rng, 2 * rng.integers(1, 8))
+        args = (board, int(-1e10), int(1e10), BoardPiece(1), 4, True, heuristic_better)
+        expected = np.max(minimax_ab(*args))
+
+        assert np.max(minimax_ab(*args, ordering=MoveOrdering())) == expected
+        assert np.max(minimax_ab(*args, tt=TranspositionTable(), ordering=MoveOrdering())) == expected
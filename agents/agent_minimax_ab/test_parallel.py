@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from agents.connectn.common import BoardPiece, PlayerAction, random_board
+from agents.agent_minimax.minimax import heuristic_basic
+
+
+def test_parallel_matches_serial():
+    """the parallel root search should choose the same move as the serial search at the same depth"""
+    from agents.agent_minimax.minimax import choose_action
+    from agents.agent_minimax_ab.negamax import pvs
+    from agents.agent_minimax_ab.parallel import ParallelRootSearch
+
+    search = ParallelRootSearch(2, tt=False)
+    try:
+        rng = np.random.default_rng(21)
+        for board in (random_board(rng, rng.integers(2, 20)) for _ in range(6)):
+            for ybw in (True, False):
+                search.ybw = ybw
+                args = (board, int(-1e10), int(1e10), BoardPiece(1), 4, True, heuristic_basic)
+                serial = pvs(*args, move_order=[3, 2, 4, 1, 5, 0, 6])
+                parallel = search(*args, move_order=[3, 2, 4, 1, 5, 0, 6])
+
+                assert np.max(parallel) == np.max(serial)
+                # every move as good as the best one is exact, in both searches
+                assert np.all((parallel == np.max(parallel)) == (serial == np.max(serial)))
+                assert choose_action(board, parallel) == choose_action(board, serial)
+    finally:
+        search.close()
+
+
+def test_parallel_root_tt():
+    """the root value should be stored in the table of the caller, and its move searched first"""
+    from agents.agent_minimax.minimax import choose_action
+    from agents.agent_minimax_ab.parallel import ParallelRootSearch
+    from agents.agent_minimax_ab.transposition import TranspositionTable, EXACT
+
+    board = random_board(np.random.default_rng(23), 10)
+    tt = TranspositionTable()
+    search = ParallelRootSearch(2)
+    try:
+        args = (board, int(-1e10), int(1e10), BoardPiece(1), 3, True, heuristic_basic)
+        values = search(*args, tt=tt)
+        entry = tt.probe(tt.hash(board, BoardPiece(1), True))
+        assert entry is not None and entry.depth == 3 and entry.flag == EXACT
+        assert entry.value == np.max(values)
+        assert values[entry.move] == np.max(values)
+        assert choose_action(board, search(*args, tt=tt)) == choose_action(board, values)
+    finally:
+        search.close()
+    with pytest.raises(RuntimeError):  # the pool is shut down
+        search.pool.submit(int)
+
+
+def test_parallel_generate_move():
+    """the pool should be kept between moves, and the move should be legal"""
+    from agents.agent_minimax_ab.minimax_ab import generate_move_minimax_ab
+    from agents.agent_minimax_ab.parallel import parallel_search
+
+    board = random_board(np.random.default_rng(22), 10)
+    action, saved_state = generate_move_minimax_ab(board, BoardPiece(1), None, time_budget=0.5, max_depth=3,
+                                                   workers=2)
+    assert isinstance(action, PlayerAction)
+    assert board[-1, action] == 0
+    assert parallel_search(2) is parallel_search(2)
+    parallel_search(2).close()
@@ -0,0 +1,82 @@
+import numpy as np
+from agents.connectn.common import initialize_game_state, apply_player_action
+from agents.connectn.common import BoardPiece, PlayerAction
+
+
+def test_hash():
+    """transposed move orders should hash the same, different positions differently"""
+    from agents.agent_minimax_ab.transposition import TranspositionTable
+
+    tt = TranspositionTable(size=64)
+    board1 = initialize_game_state()
+    board2 = initialize_game_state()
+    for board, actions in ((board1, (0, 1, 2)), (board2, (2, 1, 0))):
+        for i, action in enumerate(actions):
+            apply_player_action(board, PlayerAction(action), BoardPiece(1 if i != 1 else 2))
+
+    assert tt.hash(board1, BoardPiece(1), True) == tt.hash(board2, BoardPiece(1), True)
+    assert tt.hash(board1, BoardPiece(1), True) != tt.hash(board1, BoardPiece(1), False)
+    assert tt.hash(board1, BoardPiece(1), True) != tt.hash(initialize_game_state(), BoardPiece(1), True)
+
+
+def test_probe_store():
+    """stored entries should be found again, and counted as hits and misses"""
+    from agents.agent_minimax_ab.transposition import TranspositionTable, EXACT
+
+    tt = TranspositionTable(size=64)
+
+    assert tt.probe(5) is None
+    tt.store(5, depth=3, value=10, flag=EXACT, move=2)
+    entry = tt.probe(5)
+    assert (entry.depth, entry.value, entry.flag, entry.move) == (3, 10, EXACT, 2)
+    assert (tt.hits, tt.misses, tt.stores) == (1, 1, 1)
+
+
+def test_replacement_policy():
+    """the depth preferred slot should keep the deeper search, the other slot is replaced"""
+    from agents.agent_minimax_ab.transposition import TranspositionTable, EXACT
+
+    tt = TranspositionTable(size=8, policy='depth')
+    tt.store(1, depth=5, value=1, flag=EXACT, move=0)
+    tt.store(9, depth=2, value=2, flag=EXACT, move=0)  # same bucket, shallower
+    tt.store(17, depth=1, value=3, flag=EXACT, move=0)  # same bucket, replaces the second slot
+
+    assert tt.probe(1).value == 1
+    assert tt.probe(9) is None
+    assert tt.probe(17).value == 3
+
+    tt = TranspositionTable(size=8, policy='always')
+    tt.store(1, depth=5, value=1, flag=EXACT, move=0)
+    tt.store(9, depth=2, value=2, flag=EXACT, move=0)
+
+    assert tt.probe(1) is None
+    assert tt.probe(9).value == 2
+
+
+def test_cutoff_value():
+    """bounds should only be used when they settle the search window"""
+    from agents.agent_minimax_ab.transposition import Entry, cutoff_value, EXACT, LOWER, UPPER
+
+    assert cutoff_value(Entry(0, 4, 7, EXACT, 0), 3, 0, 10) == 7
+    assert cutoff_value(Entry(0, 2, 7, EXACT, 0), 3, 0, 10) is None  # too shallow
+    assert cutoff_value(Entry(0, 4, 12, LOWER, 0), 3, 0, 10) == 12
+    assert cutoff_value(Entry(0, 4, 7, LOWER, 0), 3, 0, 10) is None
+    assert cutoff_value(Entry(0, 4, -1, UPPER, 0), 3, 0, 10) == -1
+    assert cutoff_value(Entry(0, 4, 7, UPPER, 0), 3, 0, 10) is None
+
+
+def test_minimax_ab_transposition():
+    """searching with a transposition table should find the same best value"""
+    from agents.agent_minimax_ab.minimax_ab import minimax_ab
+    from agents.agent_minimax_ab.transposition import TranspositionTable
+    from agents.agent_minimax.minimax import heuristic_basic
+    from agents.connectn.common import random_board
+
+    rng = np.random.default_rng(3)
+    for _ in range(3):
+        board = random_board(rng, rng.integers(4, 16))
+        args = (board, int(-1e10), int(1e10), BoardPiece(1), 5, True, heuristic_basic)
+        tt = TranspositionTable()
+
+        assert np.max(minimax_ab(*args, tt=tt)) == np.max(minimax_ab(*args))
+        assert tt.hits > 0
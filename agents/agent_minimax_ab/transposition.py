@@ -0,0 +1,95 @@
+import numpy as np
+from typing import NamedTuple, Optional, Tuple
+
+
+"""
+a fixed size transposition table for the alpha-beta search, keyed by zobrist hashes
+in connect 4 the same position is reached by many move orders,
+the table lets the search reuse the value of a position it already searched
+"""
+
+EXACT, LOWER, UPPER = 0, 1, 2  # the stored value is exact, a lower bound or an upper bound
+
+
+class Entry(NamedTuple):
+    key: int
+    depth: int  # remaining depth the value was searched to
+    value: int
+    flag: int  # EXACT, LOWER or UPPER
+    move: int  # best move found in the position
+
+
+class TranspositionTable(object):
+
+    """
+    the table has size buckets of two slots, with the 'depth' policy the first
+    slot keeps the deepest search and the second is always replaced,
+    with the 'always' policy only the first slot is used and always replaced
+    """
+
+    def __init__(self, size: int = 2 ** 18, policy: str = 'depth', shape: Tuple[int, int] = (6, 7), seed: int = 0):
+        if policy not in ('depth', 'always'):
+            raise ValueError('unknown replacement policy: {}'.format(policy))
+        self.size = size
+        self.policy = policy
+        self.slots = [None] * (2 * size)  # bucket i is slots 2 * i and 2 * i + 1
+        # random numbers for each (cell, piece) and for the searching side
+        rng = np.random.default_rng(seed)
+        self.zobrist = rng.integers(1, 2 ** 63, size=(shape[0] * shape[1], 3), dtype=np.int64)
+        self.sides = rng.integers(1, 2 ** 63, size=(3, 2), dtype=np.int64)
+        self.cells = np.arange(shape[0] * shape[1])
+        # statistics
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def hash(self, board: np.ndarray, player: np.int8, max_player: bool) -> int:
+        """zobrist hash of the board, together with the player and level of the search node"""
+        pieces = self.zobrist[self.cells, board.ravel()]
+        return int(np.bitwise_xor.reduce(pieces) ^ self.sides[player, int(max_player)])
+
+    def probe(self, key: int) -> Optional[Entry]:
+        """the stored entry of the position, or None"""
+        bucket = 2 * (key % self.size)
+        for entry in self.slots[bucket:bucket + 2]:
+            if entry is not None and entry.key == key:
+                self.hits += 1
+                return entry
+        self.misses += 1
+        return None
+
+    def store(self, key: int, depth: int, value: int, flag: int, move: int):
+        bucket = 2 * (key % self.size)
+        entry = Entry(key, depth, int(value), flag, int(move))
+        first = self.slots[bucket]
+        if self.policy == 'always' or first is None or first.key == key or depth >= first.depth:
+            self.slots[bucket] = entry  # depth preferred slot
+        else:
+            self.slots[bucket + 1] = entry  # always replace slot
+        self.stores += 1
+
+    def clear(self):
+        self.slots = [None] * (2 * self.size)
+        self.hits = self.misses = self.stores = 0
+
+
+def cutoff_value(entry: Optional[Entry], depth: int, alpha: int, beta: int) -> Optional[int]:
+    """the stored value if it is deep enough and settles the node for the (alpha, beta) window"""
+    if entry is None or entry.depth < depth:
+        return None
+    if entry.flag == EXACT:
+        return entry.value
+    if entry.flag == LOWER and entry.value >= beta:
+        return entry.value
+    if entry.flag == UPPER and entry.value <= alpha:
+        return entry.value
+    return None
+
+
+def bound_flag(value: int, alpha: int, beta: int) -> int:
+    """the kind of value a node searched with the (alpha, beta) window returned"""
+    if value >= beta:
+        return LOWER
+    if value <= alpha:
+        return UPPER
+    return EXACT
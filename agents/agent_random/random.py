@@ -1,8 +1,10 @@
 import numpy as np
 from typing import Optional, Tuple
 from agents.connectn.common import PlayerAction, BoardPiece, SavedState
+from agents.connectn.instrument import instrumented
 
 
+@instrumented('random')
 def generate_move_random(
     board: np.ndarray, player: BoardPiece, saved_state: Optional[SavedState]
 ) -> Tuple[PlayerAction, Optional[SavedState]]:
@@ -0,0 +1,240 @@
+import contextlib
+import numpy as np
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from agents.connectn.common import PLAYER1, PLAYER2, NO_PLAYER, GameState, GenMove
+from agents.connectn.common import initialize_game_state, apply_player_action, check_end_state
+
+
+"""
+a headless arena: games between two GenMove agents without printing, for evaluating
+agents over many games. the agents swap colors every game and every game seeds the
+random number generators (random and np.random) with its own seed, so a game can be
+replayed. games are played in a process pool (agents have to be picklable, like
+functions defined at module level) and the results are streamed as they finish.
+
+an agent that returns a move outside the board or in a full column loses the game,
+what the agents print is discarded
+"""
+
+
+class _Discard(object):
+
+    """a stdout that drops everything written to it"""
+
+    def write(self, text: str) -> int:
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+class GameResult(NamedTuple):
+    game: int  # the number of the game, its seed is the seed of the arena plus game
+    first: int  # the agent playing PLAYER1 (0 or 1)
+    winner: Optional[int]  # the agent that won (0 or 1), None for a draw
+    plies: int  # the number of moves played
+    move_times: Tuple[List[float], List[float]]  # seconds per move, of agent 0 and agent 1
+    illegal: bool = False  # the game was lost with an illegal move
+
+
+def play_game(
+    generate_move_1: GenMove, generate_move_2: GenMove, first: int = 0, seed: Optional[int] = None,
+    args_1: tuple = (), args_2: tuple = (), game: int = 0, quiet: bool = True,
+) -> GameResult:
+    """
+    play one game, agent first (0 for generate_move_1, 1 for generate_move_2) plays PLAYER1,
+    with quiet what the agents print is discarded
+    """
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed % 2 ** 32)
+    agents = ((generate_move_1, args_1), (generate_move_2, args_2))
+    agent_of = {PLAYER1: first, PLAYER2: 1 - first}
+    saved_state = {PLAYER1: None, PLAYER2: None}
+    move_times = ([], [])
+    board = initialize_game_state()
+
+    player, plies = PLAYER1, 0
+    while True:
+        agent = agent_of[player]
+        generate_move, args = agents[agent]
+        with contextlib.redirect_stdout(_Discard()) if quiet else contextlib.nullcontext():
+            start = time.perf_counter()
+            action, saved_state[player] = generate_move(board.copy(), player, saved_state[player], *args)
+            move_times[agent].append(time.perf_counter() - start)
+        plies += 1
+
+        if action is None or not 0 <= action < board.shape[1] or board[-1, action] != NO_PLAYER:
+            return GameResult(game, first, 1 - agent, plies, move_times, illegal=True)
+        apply_player_action(board, action, player)
+        end_state = check_end_state(board, player, action)
+        if end_state == GameState.IS_WIN:
+            return GameResult(game, first, agent, plies, move_times)
+        elif end_state == GameState.IS_DRAW:
+            return GameResult(game, first, None, plies, move_times)
+
+        if player == PLAYER1:
+            player = PLAYER2
+        else:
+            player = PLAYER1
+
+
+def _play_games(generate_move_1: GenMove, generate_move_2: GenMove, games: Sequence[int], seed: int,
+                args_1: tuple, args_2: tuple) -> List[GameResult]:
+    """play a chunk of games in a worker, agent 0 plays first in the even games"""
+    return [play_game(generate_move_1, generate_move_2, game % 2, seed + game, args_1, args_2, game)
+            for game in games]
+
+
+def play_games(
+    generate_move_1: GenMove, generate_move_2: GenMove, games: int, workers: int = 1, seed: int = 0,
+    args_1: tuple = (), args_2: tuple = (), chunk: int = 8,
+) -> Iterator[GameResult]:
+    """
+    the results of the games, as they finish (not in the order of the games).
+    games are handed to the workers in chunks, with a few chunks waiting per worker,
+    so a long run does not queue all of its games at once
+    """
+    chunks = (range(start, min(start + chunk, games)) for start in range(0, games, chunk))
+    if workers <= 1:
+        for games_chunk in chunks:
+            yield from _play_games(generate_move_1, generate_move_2, games_chunk, seed, args_1, args_2)
+        return
+
+    with ProcessPoolExecutor(workers) as pool:
+        running = set()
+        try:
+            for games_chunk in chunks:
+                running.add(pool.submit(_play_games, generate_move_1, generate_move_2, games_chunk, seed,
+                                        args_1, args_2))
+                if len(running) >= 2 * workers:
+                    done, running = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from future.result()
+            for future in running:
+                yield from future.result()
+        finally:
+            for future in running:
+                future.cancel()
+
+
+class ArenaStats(object):
+
+    """the aggregate of the results, from the side of agent 0"""
+
+    def __init__(self, names: Tuple[str, str] = ('agent 1', 'agent 2')):
+        self.names = names
+        self.games = 0
+        self.wins = [0, 0]  # the games won by agent 0 and by agent 1
+        self.draws = 0
+        self.wins_first = [0, 0]  # the games won by the agent playing PLAYER1
+        self.illegal = [0, 0]  # the games lost with an illegal move
+        self.plies = 0
+        self.moves = [0, 0]
+        self.move_time = [0., 0.]
+        self.max_move_time = [0., 0.]
+
+    def add(self, result: GameResult):
+        self.games += 1
+        self.plies += result.plies
+        if result.winner is None:
+            self.draws += 1
+        else:
+            self.wins[result.winner] += 1
+            if result.winner == result.first:
+                self.wins_first[result.winner] += 1
+            if result.illegal:
+                self.illegal[1 - result.winner] += 1
+        for agent, times in enumerate(result.move_times):
+            if times:
+                self.moves[agent] += len(times)
+                self.move_time[agent] += sum(times)
+                self.max_move_time[agent] = max(self.max_move_time[agent], max(times))
+
+    def score(self) -> float:
+        """the score of agent 0: a win counts 1, a draw 1/2"""
+        return (self.wins[0] + self.draws / 2) / self.games if self.games else 0.5
+
+    def mean_move_time(self, agent: int) -> float:
+        return self.move_time[agent] / self.moves[agent] if self.moves[agent] else 0.
+
+    def summary(self) -> Dict:
+        return {
+            'games': self.games,
+            'wins': {name: wins for name, wins in zip(self.names, self.wins)},
+            'draws': self.draws,
+            'score': self.score(),
+            'mean plies': self.plies / self.games if self.games else 0.,
+            'mean move time': {name: self.mean_move_time(agent) for agent, name in enumerate(self.names)},
+            'max move time': {name: t for name, t in zip(self.names, self.max_move_time)},
+            'illegal moves': {name: n for name, n in zip(self.names, self.illegal)},
+        }
+
+    def __str__(self) -> str:
+        lines = ['{0} games, score of {1}: {2:.3f}, mean plies {3:.1f}'.format(
+            self.games, self.names[0], self.score(), self.plies / max(self.games, 1))]
+        for agent, name in enumerate(self.names):
+            lines.append('{0}: {1} wins ({2} playing first), {3} illegal, move time mean {4:.4f}s max {5:.4f}s'.format(
+                name, self.wins[agent], self.wins_first[agent], self.illegal[agent],
+                self.mean_move_time(agent), self.max_move_time[agent]))
+        lines.append('draws: {}'.format(self.draws))
+        return '\n'.join(lines)
+
+
+def run_arena(
+    generate_move_1: GenMove, generate_move_2: GenMove, games: int, workers: int = 1, seed: int = 0,
+    args_1: tuple = (), args_2: tuple = (), names: Tuple[str, str] = ('agent 1', 'agent 2'),
+    callback: Optional[Callable[[GameResult, ArenaStats], None]] = None,
+) -> ArenaStats:
+    """play the games and aggregate the results, callback is called after every game"""
+    stats = ArenaStats(names)
+    for result in play_games(generate_move_1, generate_move_2, games, workers, seed, args_1, args_2):
+        stats.add(result)
+        if callback is not None:
+            callback(result, stats)
+    return stats
+
+
+def load_agent(name: str) -> GenMove:
+    """the GenMove of an agent by name: random, minimax, minimax_ab or mcts (from myMCTS)"""
+    if name == 'random':
+        from agents.agent_random import generate_move_random
+        return generate_move_random
+    elif name == 'minimax':
+        from agents.agent_minimax import generate_move_minimax
+        return generate_move_minimax
+    elif name == 'minimax_ab':
+        from agents.agent_minimax_ab import generate_move_minimax_ab
+        return generate_move_minimax_ab
+    elif name == 'mcts':
+        import os
+        import sys
+        my_mcts = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'myMCTS')
+        if my_mcts not in sys.path:
+            sys.path.insert(0, my_mcts)
+        from agent_MCTS.MCTS import generate_move_mcts
+        return generate_move_mcts
+    raise ValueError('unknown agent {}'.format(name))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='play games between two agents without printing the boards')
+    parser.add_argument('agent_1', help='random, minimax, minimax_ab or mcts')
+    parser.add_argument('agent_2', help='random, minimax, minimax_ab or mcts')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--progress', type=int, default=0, help='print the results every this many games')
+    options = parser.parse_args()
+
+    def progress(result: GameResult, stats: ArenaStats):
+        if options.progress and stats.games % options.progress == 0:
+            print(stats, end='\n\n', flush=True)
+
+    print(run_arena(load_agent(options.agent_1), load_agent(options.agent_2), options.games, options.workers,
+                    options.seed, names=(options.agent_1, options.agent_2), callback=progress))
@@ -0,0 +1,132 @@
+import mmap
+import os
+import struct
+import numpy as np
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple
+from agents.connectn.bitboard import board_to_bitboard
+from agents.connectn.common import PlayerAction
+
+
+"""
+an opening book: a sorted binary file of (position key, best move, score) records,
+read through mmap with a binary search, so a lookup only touches the pages it needs
+and the book is never loaded into memory (the pages are shared by every process)
+
+file layout (little endian):
+    header: magic b'C4BK', version, rows, cols, max ply, number of records
+    records: key uint64, move int8, score int32 (13 bytes, sorted by key)
+
+the key of a position is the bitboard key (player 1 pieces + occupied cells),
+positions are stored once for a board and its mirror image (the smaller key),
+the score is the value of the position for the player to move
+"""
+
+MAGIC = b'C4BK'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBBQ')
+RECORD = struct.Struct('<Qbi')  # key, move, score (13 bytes)
+
+# the default book, shared by the agents (override with the CONNECT4_BOOK environment variable)
+DEFAULT_BOOK = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'opening_book.bin')
+
+
+def _key(board: np.ndarray) -> int:
+    pieces = board_to_bitboard(board, 1)
+    return pieces + (pieces | board_to_bitboard(board, 2))
+
+
+def position_key(board: np.ndarray) -> Tuple[int, bool]:
+    """the book key of the board, and if it is the key of the mirrored board"""
+    key, mirror_key = _key(board), _key(board[:, ::-1])
+    if mirror_key < key:
+        return mirror_key, True
+    return key, False
+
+
+def write_book(path: str, entries: Iterable[Tuple[int, int, int]], shape: Tuple[int, int] = (6, 7), ply: int = 0):
+    """write (key, move, score) entries (keys from position_key) as a sorted book file"""
+    entries = sorted(entries)
+    if any(a[0] == b[0] for a, b in zip(entries, entries[1:])):
+        raise ValueError('the book has duplicate positions')
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, shape[0], shape[1], ply, len(entries)))
+        for key, move, score in entries:
+            file.write(RECORD.pack(key, move, score))
+
+
+class OpeningBook(object):
+
+    """a book file opened with mmap, looked up with a binary search over the sorted records"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as file:
+            self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, rows, cols, ply, count = HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{} is not an opening book (version {})'.format(path, VERSION))
+        if len(self.mmap) != HEADER.size + count * RECORD.size:
+            raise ValueError('{} is truncated'.format(path))
+        self.shape = (rows, cols)
+        self.ply = ply  # the positions up to this ply are in the book
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def record(self, i: int) -> Tuple[int, int, int]:
+        """the (key, move, score) of the i-th record"""
+        return RECORD.unpack_from(self.mmap, HEADER.size + i * RECORD.size)
+
+    def lookup(self, board: np.ndarray) -> Optional[Tuple[int, int]]:
+        """the (best move, score) of the board, or None if it is not in the book"""
+        if np.shape(board) != self.shape:
+            return None
+        if np.count_nonzero(board) > self.ply:  # past the end of the book
+            return None
+        key, mirrored = position_key(board)
+        low, high = 0, self.count
+        while low < high:  # only the records on the way are read from the file
+            mid = (low + high) // 2
+            if self.record(mid)[0] < key:
+                low = mid + 1
+            else:
+                high = mid
+        if low == self.count:
+            return None
+        found, move, score = self.record(low)
+        if found != key:
+            return None
+        if mirrored:
+            move = self.shape[1] - 1 - move
+        return move, score
+
+    def move(self, board: np.ndarray) -> Optional[int]:
+        """the best move of the board, or None if it is not in the book"""
+        entry = self.lookup(board)
+        return entry[0] if entry is not None else None
+
+    def close(self):
+        self.mmap.close()
+
+
+@lru_cache(maxsize=None)
+def _load_book(path: str) -> Optional[OpeningBook]:
+    if not os.path.exists(path):
+        return None
+    return OpeningBook(path)
+
+
+def default_book() -> Optional[OpeningBook]:
+    """the book of the agents (opened once per process), or None if there is no book file"""
+    return _load_book(os.path.abspath(os.environ.get('CONNECT4_BOOK', DEFAULT_BOOK)))
+
+
+def book_move(board: np.ndarray) -> Optional[PlayerAction]:
+    """the move of the default book for the board, or None (no book, or not in the book)"""
+    book = default_book()
+    if book is None:
+        return None
+    move = book.move(board)
+    return PlayerAction(move) if move is not None else None
@@ -1,6 +1,7 @@
 import numpy as np
 from typing import Optional, Callable, Tuple
 from enum import Enum
+from agents.connectn.bitboard import board_to_bitboard, bitboard_has_won
 
 BoardPiece = np.int8
 NO_PLAYER = BoardPiece(0)  # Empty position
@@ -59,17 +60,13 @@ def pretty_print_board(board: np.ndarray) -> str:
 def apply_player_action(
         board: np.ndarray, action: PlayerAction, player: BoardPiece, copy: bool = False
 ) -> np.ndarray:
-    num_row = np.shape(board)[0]
     if copy:  # if copy is True
         board_copy = board.copy()  # make the action on a copy
     else:  # otherwise, use the input board
         board_copy = board
-    for row in range(num_row):  # looping over the number of rows
-        if board_copy[row, action] == 0:  # if empty, add a piece
-            board_copy[row, action] = player
-            break
-        else:  # otherwise continue until empty slot is found
-            pass
+    empty = np.flatnonzero(board_copy[:, action] == NO_PLAYER)  # empty slots of the column
+    if len(empty):  # add a piece to the lowest empty slot (a full column is left as is)
+        board_copy[empty[0], action] = player
     return board_copy
 
 
@@ -78,8 +75,48 @@ def string_to_board(pp_board: str) -> np.ndarray:
 
 
 def connected_four(
-    board: np.ndarray, player: BoardPiece, _last_action: Optional[PlayerAction] = None
+    board: np.ndarray, player: BoardPiece, last_action: Optional[PlayerAction] = None
 ) -> bool:
+    """
+    if the last action is given, only the lines through the piece
+    on top of that column are checked, which gives the same result
+    as long as the player had not already won before that move
+    """
+    if last_action is not None:
+        return _connected_four_at(board, player, last_action)
+    rows, cols = board.shape
+    if (rows + 1) * cols > 64:  # too large for a bitboard, check window by window
+        return _connected_four_scan(board, player)
+    # shift-and-AND over the bitboard of the player's pieces
+    return bitboard_has_won(board_to_bitboard(board, player), rows, CONNECT_N)
+
+
+def _connected_four_at(board: np.ndarray, player: BoardPiece, last_action: PlayerAction) -> bool:
+    """count the player's pieces in a row through the top piece of the last played column"""
+    rows, cols = board.shape
+    cells = board.tolist()  # python ints are much faster to index than the ndarray
+    player, col, empty = int(player), int(last_action), int(NO_PLAYER)
+    row = rows - 1
+    while row >= 0 and cells[row][col] == empty:  # find the piece that was just played
+        row -= 1
+    if row < 0 or cells[row][col] != player:
+        return False
+
+    for d_row, d_col in ((0, 1), (1, 0), (1, 1), (-1, 1)):  # horizontal, vertical, diagonals
+        count = 1
+        for sign in (1, -1):  # walk away from the piece in both directions
+            r, c = row + sign * d_row, col + sign * d_col
+            while 0 <= r < rows and 0 <= c < cols and cells[r][c] == player:
+                count += 1
+                r, c = r + sign * d_row, c + sign * d_col
+        if count >= CONNECT_N:
+            return True
+
+    return False  # else not a connected four
+
+
+def _connected_four_scan(board: np.ndarray, player: BoardPiece) -> bool:
+    """check every window of the board, used for boards too large for a bitboard"""
     rows, cols = board.shape
     rows_edge = rows - CONNECT_N + 1  # needed row check range
     cols_edge = cols - CONNECT_N + 1  # needed column check range
@@ -108,8 +145,12 @@ def connected_four(
 def check_end_state(
         board: np.ndarray, player: BoardPiece, last_action: Optional[PlayerAction] = None,
 ) -> GameState:
-    end_state = connected_four(board, player)
-    if np.all(board != NO_PLAYER):  # entire board is filled
+    end_state = connected_four(board, player, last_action)
+    if last_action is not None:  # pieces are stacked, so the board is full once the top row is
+        filled = np.all(board[-1] != NO_PLAYER)
+    else:
+        filled = np.all(board != NO_PLAYER)
+    if filled:  # entire board is filled
         return GameState.IS_DRAW
     elif end_state is True:  # player has connect_four
         return GameState.IS_WIN
@@ -117,6 +158,30 @@ def check_end_state(
         return GameState.STILL_PLAYING
 
 
+def random_board(rng: np.random.Generator, moves: int, still_playing: bool = True) -> np.ndarray:
+    """
+    the board after a number of random legal moves, PLAYER1 first (so PLAYER1 is to move after
+    an even number). with still_playing the game is not over: only moves that do not end it are
+    played (a game in which every move would end it is started again)
+    """
+    board = initialize_game_state()
+    if still_playing and moves >= board.size:
+        raise ValueError('a game is over after {} moves'.format(board.size))
+    while True:
+        board, player = initialize_game_state(), PLAYER1
+        for _ in range(moves):
+            for action in rng.permutation(np.flatnonzero(board[-1] == NO_PLAYER)).astype(PlayerAction):
+                child = apply_player_action(board, action, player, copy=True)
+                if not still_playing or check_end_state(child, player, action) == GameState.STILL_PLAYING:
+                    board = child
+                    break
+            else:  # every move ends the game
+                break
+            player = PLAYER2 if player == PLAYER1 else PLAYER1
+        else:
+            return board
+
+
 class SavedState:
     pass
 
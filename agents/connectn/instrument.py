@@ -0,0 +1,160 @@
+import json
+import time
+from functools import wraps
+from typing import Callable, Dict, Optional, TextIO
+
+
+"""
+instrumentation of the agents: every move of an agent (a GenMove decorated with instrumented)
+is one record, with its latency and what the search did during it:
+    nodes: nodes searched (tree nodes added for MCTS), leaves: leaf evaluations (rollouts for MCTS),
+    tt_probes / tt_hits: transposition table lookups, simulations: MCTS simulations,
+    depth: the depth reached (iterative deepening depth, deepest MCTS node),
+    movegen_ns / eval_ns / win_check_ns: time spent generating moves, evaluating positions
+    (heuristic or rollouts) and checking for wins
+the records are written as json lines to a sink, and summed per agent for the prometheus
+text format. times come from time.perf_counter_ns.
+
+instrumentation is off unless a Recorder is enabled: the hooks in the searches are a check
+of RECORDER (or an attribute set from it when the search starts) against None.
+only the main process is recorded, the searches of parallel workers are not
+"""
+
+RECORDER = None  # the enabled Recorder, None when the instrumentation is off
+
+TIMERS = ('movegen', 'eval', 'win_check')
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10.)  # of the move latency histogram [s]
+
+
+class Recorder(object):
+
+    """the counters of the current move, and the totals of every agent"""
+
+    def __init__(self, sink: Optional[TextIO] = None, **labels):
+        self.sink = sink  # a file the records are written to as json lines
+        self.labels = labels  # added to every record and metric (e.g. host='a', run='nightly')
+        self.totals: Dict[str, Dict] = {}
+        self.agent = None  # the agent of the move being recorded
+        self.reset()
+
+    def reset(self):
+        """start the counters of a move"""
+        self.nodes = self.leaves = self.tt_probes = self.tt_hits = self.simulations = 0
+        self.depth = 0
+        self.ns = dict.fromkeys(TIMERS, 0)
+
+    def reach(self, depth: int):
+        if depth > self.depth:
+            self.depth = depth
+
+    def add_time(self, timer: str, start: int):
+        """add the time since start (a perf_counter_ns value) to the timer"""
+        self.ns[timer] += time.perf_counter_ns() - start
+
+    def timed(self, timer: str, function: Callable) -> Callable:
+        """function, with the time of its calls added to the timer"""
+        @wraps(function)
+        def timed_function(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.ns[timer] += time.perf_counter_ns() - start
+        return timed_function
+
+    def begin(self, agent: str):
+        self.reset()
+        self.agent = agent
+        self.start = time.perf_counter_ns()
+
+    def end(self, **fields) -> Dict:
+        """finish the move, returns its record (with fields added)"""
+        latency = time.perf_counter_ns() - self.start
+        record = dict(self.labels, agent=self.agent, latency_ns=latency, nodes=self.nodes, leaves=self.leaves,
+                      tt_probes=self.tt_probes, tt_hits=self.tt_hits, simulations=self.simulations,
+                      depth=self.depth, **{timer + '_ns': self.ns[timer] for timer in TIMERS}, **fields)
+        self.agent = None
+
+        totals = self.totals.setdefault(record['agent'], {
+            'moves': 0, 'latency_ns': 0, 'buckets': [0] * len(BUCKETS), 'max_depth': 0,
+            'nodes': 0, 'leaves': 0, 'tt_probes': 0, 'tt_hits': 0, 'simulations': 0,
+            **{timer + '_ns': 0 for timer in TIMERS},
+        })
+        totals['moves'] += 1
+        for key in ('latency_ns', 'nodes', 'leaves', 'tt_probes', 'tt_hits', 'simulations') + \
+                tuple(timer + '_ns' for timer in TIMERS):
+            totals[key] += record[key]
+        totals['max_depth'] = max(totals['max_depth'], record['depth'])
+        for i, bound in enumerate(BUCKETS):
+            if latency <= bound * 1e9:
+                totals['buckets'][i] += 1
+
+        if self.sink is not None:
+            self.sink.write(json.dumps(record) + '\n')
+            self.sink.flush()
+        return record
+
+    def prometheus(self) -> str:
+        """the totals of every agent in the prometheus text format"""
+        def labels(agent: str, **extra) -> str:
+            pairs = dict(self.labels, agent=agent, **extra)
+            return '{' + ','.join('{}="{}"'.format(key, str(value).replace('"', '\\"'))
+                                  for key, value in pairs.items()) + '}'
+
+        lines = ['# HELP connect4_move_seconds the time an agent took for a move',
+                 '# TYPE connect4_move_seconds histogram']
+        for agent, totals in self.totals.items():
+            for bound, count in zip(BUCKETS, totals['buckets']):
+                lines.append('connect4_move_seconds_bucket{} {}'.format(labels(agent, le=bound), count))
+            lines.append('connect4_move_seconds_bucket{} {}'.format(labels(agent, le='+Inf'), totals['moves']))
+            lines.append('connect4_move_seconds_sum{} {}'.format(labels(agent), totals['latency_ns'] / 1e9))
+            lines.append('connect4_move_seconds_count{} {}'.format(labels(agent), totals['moves']))
+        for name, help in (('nodes', 'nodes searched'), ('leaves', 'leaf evaluations'),
+                           ('tt_probes', 'transposition table lookups'), ('tt_hits', 'transposition table hits'),
+                           ('simulations', 'MCTS simulations')):
+            lines += ['# HELP connect4_{}_total {}'.format(name, help), '# TYPE connect4_{}_total counter'.format(name)]
+            for agent, totals in self.totals.items():
+                lines.append('connect4_{}_total{} {}'.format(name, labels(agent), totals[name]))
+        lines += ['# HELP connect4_phase_seconds_total time spent per phase of the search',
+                  '# TYPE connect4_phase_seconds_total counter']
+        for agent, totals in self.totals.items():
+            for timer in TIMERS:
+                lines.append('connect4_phase_seconds_total{} {}'.format(
+                    labels(agent, phase=timer), totals[timer + '_ns'] / 1e9))
+        lines += ['# HELP connect4_search_depth_max the deepest search of a move',
+                  '# TYPE connect4_search_depth_max gauge']
+        for agent, totals in self.totals.items():
+            lines.append('connect4_search_depth_max{} {}'.format(labels(agent), totals['max_depth']))
+        return '\n'.join(lines) + '\n'
+
+
+def enable(sink: Optional[TextIO] = None, **labels) -> Recorder:
+    """turn the instrumentation on, with a new Recorder"""
+    global RECORDER
+    RECORDER = Recorder(sink, **labels)
+    return RECORDER
+
+
+def disable() -> Optional[Recorder]:
+    """turn the instrumentation off, returns the Recorder that was enabled"""
+    global RECORDER
+    recorder, RECORDER = RECORDER, None
+    return recorder
+
+
+def instrumented(agent: str) -> Callable:
+    """a decorator for a GenMove, every move is recorded (as agent) while a Recorder is enabled"""
+    def decorator(generate_move: Callable) -> Callable:
+        @wraps(generate_move)
+        def generate_move_instrumented(board, player, saved_state, *args, **kwargs):
+            recorder = RECORDER
+            if recorder is None or recorder.agent is not None:  # off, or inside another agent's move
+                return generate_move(board, player, saved_state, *args, **kwargs)
+            recorder.begin(agent)
+            try:
+                result = generate_move(board, player, saved_state, *args, **kwargs)
+            finally:
+                recorder.end(ply=int((board != 0).sum()))
+            return result
+        return generate_move_instrumented
+    return decorator
@@ -0,0 +1,229 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import numpy as np
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from agents.connectn.common import BoardPiece, GenMove, SavedState, PlayerAction, PLAYER1, PLAYER2, NO_PLAYER
+from agents.connectn.common import random_board
+
+
+"""
+profiling of single moves: a Profiler runs one generate_move call at a time under
+cProfile (exact per-function costs) or a sampling profiler (a thread that records the
+stack of the searching thread every interval), and adds it to the costs of the moves
+profiled before. the samples are written as collapsed stacks ('frame;frame;frame count'
+lines, for flamegraph.pl, speedscope or inferno), the cProfile costs as a pstats file.
+
+every move is a capture tagged with the agent, its parameters and the position, the
+collapsed stacks start with a frame of the tags (the agent and its parameters, and the
+position with by_position) so the profiles of several runs can be put in one flame graph
+
+run from the repository root with, e.g.:
+    python -m agents.connectn.profiling 'minimax_ab:time_budget=0.5' --moves 20 --out minimax_ab.collapsed
+"""
+
+
+class _Sampler(threading.Thread):
+
+    """a thread that counts the stacks of another thread, every interval [s]"""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.running = threading.Event()
+        self.running.set()
+
+    def run(self):
+        while self.running.is_set():
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    def stop(self) -> Counter:
+        self.running.clear()
+        self.join()
+        return self.stacks
+
+
+def frame_name(frame) -> str:
+    """the name of a frame in a collapsed stack: function (file:line of the function)"""
+    code = frame.f_code
+    return '{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+def position_tags(board: np.ndarray) -> Dict:
+    """the tags of a position: its ply, and the moves of each column from the bottom"""
+    columns = [''.join(str(int(piece)) for piece in board[:, col] if piece != NO_PLAYER)
+               for col in range(board.shape[1])]
+    return {'ply': int(np.count_nonzero(board)), 'columns': '/'.join(columns)}
+
+
+class Profiler(object):
+
+    """
+    profiles generate_move calls with mode 'cprofile' or 'sample' (every interval [s]),
+    the costs of all the calls are added up
+    """
+
+    def __init__(self, mode: str = 'sample', interval: float = 0.001, by_position: bool = False):
+        if mode not in ('cprofile', 'sample'):
+            raise ValueError('unknown profiling mode: {}'.format(mode))
+        self.mode = mode
+        self.interval = interval
+        self.by_position = by_position  # a frame per position under the frame of the agent
+        self.stacks = Counter()  # collapsed stack -> samples
+        self.stats: Optional[pstats.Stats] = None
+        self.captures: List[Dict] = []
+
+    def profile(
+        self, generate_move: GenMove, board: np.ndarray, player: BoardPiece, saved_state: Optional[SavedState],
+        *args, agent: Optional[str] = None, params: Optional[Dict] = None, **kwargs,
+    ) -> Tuple[PlayerAction, Optional[SavedState]]:
+        """
+        one move of generate_move (called with args and kwargs), profiled, tagged with
+        the agent (the name of generate_move by default), its params (kwargs by default) and the position
+        """
+        agent = agent or getattr(generate_move, '__name__', 'agent')
+        params = dict(kwargs) if params is None else params
+        tags = dict(agent=agent, params=params, player=int(player), **position_tags(board))
+
+        start = time.perf_counter()
+        if self.mode == 'cprofile':
+            profile = cProfile.Profile()
+            result = profile.runcall(generate_move, board, player, saved_state, *args, **kwargs)
+            stats = pstats.Stats(profile)
+            if self.stats is None:
+                self.stats = stats
+            else:
+                self.stats.add(stats)
+            tags['calls'] = stats.total_calls
+        else:
+            # the sampler only runs when the searching thread lets go of the gil,
+            # which it does at least every switch interval
+            switch_interval = sys.getswitchinterval()
+            sys.setswitchinterval(min(switch_interval, self.interval))
+            sampler = _Sampler(threading.get_ident(), self.interval)
+            sampler.start()
+            try:
+                result = generate_move(board, player, saved_state, *args, **kwargs)
+            finally:
+                stacks = sampler.stop()
+                sys.setswitchinterval(switch_interval)
+            root = [self.tag(tags)]
+            if self.by_position:
+                root.append('ply {ply} {columns}'.format(**tags))
+            for stack, count in stacks.items():
+                stack = self._trim(stack)
+                if stack:  # not in the profiler itself
+                    self.stacks[tuple(root) + stack] += count
+            tags['samples'] = sum(stacks.values())
+        tags['seconds'] = time.perf_counter() - start
+        self.captures.append(tags)
+        return result
+
+    @staticmethod
+    def tag(tags: Dict) -> str:
+        """the root frame of a capture: the agent and its parameters"""
+        params = ','.join('{}={}'.format(key, value) for key, value in sorted(tags['params'].items()))
+        return '{}[{}]'.format(tags['agent'], params) if params else tags['agent']
+
+    @staticmethod
+    def _trim(stack: Tuple[str, ...]) -> Tuple[str, ...]:
+        """the stack below the call of profile, without the frames of the caller and the profiler"""
+        for i, name in enumerate(stack):
+            if name.startswith('profile (profiling.py'):
+                return stack[i + 1:]
+        return ()
+
+    def collapsed(self) -> str:
+        """the samples as collapsed stacks"""
+        return ''.join('{} {}\n'.format(';'.join(name.replace(';', ':') for name in stack), count)
+                       for stack, count in sorted(self.stacks.items()))
+
+    def top(self, n: int = 20, sort: str = 'cumulative') -> str:
+        """the n most expensive functions of the cProfile costs"""
+        if self.stats is None:
+            return ''
+        out = io.StringIO()
+        self.stats.stream = out
+        self.stats.sort_stats(sort).print_stats(n)
+        return out.getvalue()
+
+    def write(self, path: str):
+        """
+        write the collapsed stacks (sample) or the pstats file (cprofile) to path,
+        and the tags of the captures as json lines to path + '.captures.jsonl'
+        """
+        if self.mode == 'cprofile':
+            if self.stats is not None:
+                self.stats.dump_stats(path)
+        else:
+            with open(path, 'w') as file:
+                file.write(self.collapsed())
+        with open(path + '.captures.jsonl', 'w') as file:
+            for capture in self.captures:
+                file.write(json.dumps(capture) + '\n')
+
+
+def profiled(generate_move: GenMove, profiler: Profiler, agent: Optional[str] = None) -> GenMove:
+    """a GenMove that profiles every move of generate_move (e.g. for the games of main.py)"""
+    def generate_move_profiled(board, player, saved_state, *args, **kwargs):
+        return profiler.profile(generate_move, board, player, saved_state, *args, agent=agent, **kwargs)
+    return generate_move_profiled
+
+
+def profile_positions(
+    profiler: Profiler, generate_move: GenMove, boards: List[np.ndarray], agent: Optional[str] = None,
+    params: Optional[Dict] = None, **kwargs,
+) -> Profiler:
+    """profile one move of the player to move on every board"""
+    for board in boards:
+        player = PLAYER1 if np.count_nonzero(board) % 2 == 0 else PLAYER2
+        profiler.profile(generate_move, board.copy(), player, None, agent=agent, params=params, **kwargs)
+    return profiler
+
+
+def random_positions(n: int, seed: int = 0, max_ply: int = 30) -> List[np.ndarray]:
+    """n boards after a random number of random moves (with the game still going)"""
+    rng = np.random.default_rng(seed)
+    return [random_board(rng, rng.integers(0, max_ply + 1)) for _ in range(n)]
+
+
+if __name__ == '__main__':
+    import argparse
+    from agents.connectn.tournament import tournament_agents
+
+    parser = argparse.ArgumentParser(description='profile the moves of an agent on random positions')
+    parser.add_argument('agent', help="an agent like 'minimax_ab' or 'mcts:calc_time=0.5'")
+    parser.add_argument('--moves', type=int, default=10, help='the number of positions (one move each)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-ply', type=int, default=30, help='the most random moves of a position')
+    parser.add_argument('--mode', choices=('sample', 'cprofile'), default='sample')
+    parser.add_argument('--interval', type=float, default=0.001, help='seconds between samples')
+    parser.add_argument('--by-position', action='store_true', help='a flame graph frame per position')
+    parser.add_argument('--out', default='profile.collapsed', help='the collapsed stacks (or pstats) file')
+    options = parser.parse_args()
+
+    name, _, _ = options.agent.partition(':')
+    generate_move = tournament_agents([options.agent])[options.agent]
+    params = dict(getattr(generate_move, 'keywords', {}))  # of a partial
+    profiler = Profiler(options.mode, options.interval, options.by_position)
+    boards = random_positions(options.moves, options.seed, options.max_ply)
+    profile_positions(profiler, generate_move, boards, agent=name, params=params)
+    profiler.write(options.out)
+    if options.mode == 'cprofile':
+        print(profiler.top())
+    print('{} moves profiled, written to {}'.format(len(profiler.captures), options.out))
@@ -0,0 +1,179 @@
+import numpy as np
+from typing import Optional, Tuple
+from agents.connectn import instrument
+from agents.connectn.bitboard import board_to_bitboard, bottom_mask, board_mask
+from agents.connectn.common import BoardPiece, PlayerAction, SavedState, GenMove, NO_PLAYER
+
+
+"""
+an exact solver for connect 4 endgames, on bitboards (see the bitboard module for the layout)
+
+negamax with alpha-beta over the position of the player to move and the mask of all pieces,
+with a transposition table of upper bounds and moves tried center first, ordered by the
+number of threats they create. moves that let the opponent win right away are never
+searched ('anticipate losing moves'): if the opponent threatens two cells the position
+is lost, if it threatens one that is the only move, and no move is played below a threat.
+
+scores are for the player to move: 0 for a draw, positive for a win (the sooner the
+higher: the number of own moves left after the winning move, plus one), negative for a loss
+"""
+
+ENDGAME_EMPTY = 20  # the agents switch to the solver with at most this many empty cells
+
+
+def _popcount(bits: int) -> int:
+    return bin(bits).count('1')
+
+
+class Solver(object):
+
+    """solves positions of one board shape, the transposition table is kept between calls"""
+
+    def __init__(self, rows: int = 6, cols: int = 7, tt_size: int = 2 ** 20):
+        self.rows, self.cols = rows, cols
+        self.cells = rows * cols
+        self.bottom = bottom_mask(rows, cols)
+        self.full = board_mask(rows, cols)
+        self.column = [((1 << rows) - 1) << (col * (rows + 1)) for col in range(cols)]
+        self.order = sorted(range(cols), key=lambda col: abs(2 * col - (cols - 1)))  # center first
+        self.min_score = -(self.cells // 2) + 3
+        self.tt = {}  # key -> upper bound of the score (shifted to be positive)
+        self.tt_size = tt_size
+        self.nodes = 0
+
+    def winning_cells(self, position: int, mask: int) -> int:
+        """the empty cells that would complete four in a row for the pieces of position"""
+        h = self.rows
+        r = (position << 1) & (position << 2) & (position << 3)  # vertical
+        for shift in (h + 1, h, h + 2):  # horizontal and the two diagonals
+            p = (position << shift) & (position << 2 * shift)
+            r |= p & (position << 3 * shift)
+            r |= p & (position >> shift)
+            p = (position >> shift) & (position >> 2 * shift)
+            r |= p & (position << shift)
+            r |= p & (position >> 3 * shift)
+        return r & (self.full ^ mask)
+
+    def non_losing_moves(self, position: int, mask: int) -> int:
+        """the playable cells that do not let the opponent win with the next move"""
+        possible = (mask + self.bottom) & self.full
+        threats = self.winning_cells(position ^ mask, mask)
+        forced = possible & threats
+        if forced:
+            if forced & (forced - 1):  # two threats, one of them can not be blocked
+                return 0
+            possible = forced
+        return possible & ~(threats >> 1)  # do not play right below a threat
+
+    def negamax(self, position: int, mask: int, moves: int, alpha: int, beta: int) -> int:
+        """
+        the score of the position for the player to move (who can not win with the next move),
+        exact if it is inside the (alpha, beta) window, otherwise a bound on the side of the window
+        """
+        self.nodes += 1
+        possible = self.non_losing_moves(position, mask)
+        if possible == 0:  # the opponent wins with the next move
+            return -((self.cells - moves) // 2)
+        if moves >= self.cells - 2:  # no winning move left for anyone
+            return 0
+
+        lowest = -((self.cells - 2 - moves) // 2)  # the opponent can not win with the next move
+        if alpha < lowest:
+            alpha = lowest
+            if alpha >= beta:
+                return alpha
+        highest = (self.cells - 1 - moves) // 2  # we can not win with the next move
+        key = position + mask
+        bound = self.tt.get(key)
+        if bound is not None:
+            highest = bound + self.min_score - 1
+        if beta > highest:
+            beta = highest
+            if alpha >= beta:
+                return beta
+
+        # the moves that create the most threats first (center first on ties)
+        children = []
+        for col in self.order:
+            move = possible & self.column[col]
+            if move:
+                children.append((-_popcount(self.winning_cells(position | move, mask)), len(children), move))
+        children.sort()
+        for _, _, move in children:
+            score = -self.negamax(position ^ mask, mask | move, moves + 1, -beta, -alpha)
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+
+        if len(self.tt) >= self.tt_size:
+            self.tt.clear()
+        self.tt[key] = alpha - self.min_score + 1
+        return alpha
+
+    def solve(self, board: np.ndarray, player: BoardPiece) -> Tuple[PlayerAction, int]:
+        """the best move (the most central of the best) and the exact score for player, who is to move"""
+        position = board_to_bitboard(board, player)
+        mask = board_to_bitboard(board != NO_PLAYER, True)
+        moves = _popcount(mask)
+        possible = (mask + self.bottom) & self.full
+        playable = [col for col in self.order if possible & self.column[col]]
+        if not playable:
+            raise ValueError('there is no move left to play')
+
+        wins = self.winning_cells(position, mask) & possible
+        for col in playable:  # a win with the next move
+            if wins & self.column[col]:
+                return PlayerAction(col), (self.cells + 1 - moves) // 2
+
+        non_losing = self.non_losing_moves(position, mask)
+        if non_losing == 0:  # every move loses, block one of the threats
+            threats = self.winning_cells(position ^ mask, mask) & possible
+            blocks = [col for col in playable if threats & self.column[col]]
+            return PlayerAction((blocks or playable)[0]), -((self.cells - moves) // 2)
+
+        best, best_score = None, None
+        alpha, beta = -self.cells, self.cells
+        for col in playable:
+            move = non_losing & self.column[col]
+            if not move:
+                continue
+            score = -self.negamax(position ^ mask, mask | move, moves + 1, -beta, -alpha)
+            if best_score is None or score > best_score:
+                best, best_score = col, score
+                alpha = max(alpha, score)
+        return PlayerAction(best), best_score
+
+
+_SOLVERS = {}  # a solver per board shape (and process), so the table is kept between moves
+
+
+def endgame_move(
+    board: np.ndarray, player: BoardPiece, threshold: int = ENDGAME_EMPTY,
+) -> Optional[PlayerAction]:
+    """the solver's move if the board has at most threshold empty cells, otherwise None"""
+    if np.count_nonzero(board == NO_PLAYER) > threshold:
+        return None
+    shape = np.shape(board)
+    if shape not in _SOLVERS:
+        _SOLVERS[shape] = Solver(*shape)
+    solver = _SOLVERS[shape]
+    nodes = solver.nodes
+    action = solver.solve(board, player)[0]
+    recorder = instrument.RECORDER
+    if recorder is not None:  # the solver searches to the end of the game
+        recorder.nodes += solver.nodes - nodes
+        recorder.reach(int(np.count_nonzero(board == NO_PLAYER)))
+    return action
+
+
+def with_endgame_solver(generate_move: GenMove, threshold: int = ENDGAME_EMPTY) -> GenMove:
+    """a GenMove that plays the solver's move in the endgame, and asks generate_move otherwise"""
+    def generate_move_endgame(
+        board: np.ndarray, player: BoardPiece, saved_state: Optional[SavedState], *args, **kwargs
+    ) -> Tuple[PlayerAction, Optional[SavedState]]:
+        action = endgame_move(board, player, threshold)
+        if action is not None:
+            return action, saved_state
+        return generate_move(board, player, saved_state, *args, **kwargs)
+    return generate_move_endgame
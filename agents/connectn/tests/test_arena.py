@@ -0,0 +1,60 @@
+import numpy as np
+from agents.connectn.common import PlayerAction
+
+
+def first_column(board: np.ndarray, player, saved_state):
+    """an agent that plays column 0 with player 1 and column 1 with player 2 (while there is room)"""
+    if board[-1, player - 1] == 0:
+        return PlayerAction(player - 1), saved_state
+    return PlayerAction(np.flatnonzero(board[-1] == 0)[0]), saved_state
+
+
+def full_column(board: np.ndarray, player, saved_state):
+    """an agent that plays into column 0 even when it is full"""
+    return PlayerAction(0), saved_state
+
+
+def test_play_game():
+    """the player of the first move should win a game between two first_column agents"""
+    from agents.connectn.arena import play_game
+
+    for first in (0, 1):
+        result = play_game(first_column, first_column, first=first)
+        assert result.winner == first
+        assert result.plies == 7  # four in a row in column 0 with the seventh move
+        assert len(result.move_times[first]) == 4 and len(result.move_times[1 - first]) == 3
+
+
+def test_play_game_illegal():
+    """an illegal move should lose the game"""
+    from agents.connectn.arena import play_game
+
+    result = play_game(full_column, first_column, first=1)
+    assert result.illegal
+    assert result.winner == 1 and result.plies == 8  # column 0 is full after six moves
+
+
+def test_play_game_seed():
+    """games with the same seed should be the same"""
+    from agents.connectn.arena import play_game
+    from agents.agent_random import generate_move_random
+
+    a = play_game(generate_move_random, generate_move_random, seed=3)
+    b = play_game(generate_move_random, generate_move_random, seed=3)
+    assert (a.winner, a.plies) == (b.winner, b.plies)
+
+
+def test_run_arena():
+    """the agents should swap colors, and the workers should play the same games as one process"""
+    from agents.connectn.arena import run_arena, play_games
+    from agents.agent_random import generate_move_random
+
+    stats = run_arena(first_column, first_column, 10)
+    assert stats.games == 10 and stats.wins == [5, 5] and stats.wins_first == [5, 5]
+    assert stats.score() == 0.5
+
+    serial = sorted((r.game, r.winner, r.plies) for r in play_games(generate_move_random, first_column, 12))
+    parallel = sorted((r.game, r.winner, r.plies) for r in play_games(generate_move_random, first_column, 12,
+                                                                       workers=2, chunk=3))
+    assert serial == parallel
+    assert [game for game, _, _ in serial] == list(range(12))
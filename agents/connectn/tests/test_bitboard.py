@@ -0,0 +1,83 @@
+import numpy as np
+from agents.connectn.common import random_board
+
+
+def test_board_to_bitboard():
+    """a piece at board[row, col] should be the bit col * 7 + row"""
+    from agents.connectn.bitboard import board_to_bitboard
+    from agents.connectn.common import initialize_game_state, PLAYER1, PLAYER2
+
+    board = initialize_game_state()
+    board[0, 0] = PLAYER1
+    board[2, 3] = PLAYER1
+    board[5, 6] = PLAYER2
+
+    assert board_to_bitboard(board, PLAYER1) == (1 << 0) | (1 << 23)
+    assert board_to_bitboard(board, PLAYER2) == 1 << 47
+
+
+def test_bitboard_round_trip():
+    """converting to a bitboard and back should give the same board"""
+    from agents.connectn.bitboard import BitBoard
+
+    rng = np.random.default_rng(0)
+    for moves in range(0, 42, 3):
+        board = random_board(rng, moves, still_playing=False)
+        bitboard = BitBoard.from_array(board)
+
+        assert np.all(bitboard.to_array() == board)
+        assert bitboard.moves == moves
+        assert bitboard.mask == bitboard.boards[0] | bitboard.boards[1]
+
+
+def test_bitboard_play_undo():
+    """playing moves should match apply_player_action, undo should restore the position"""
+    from agents.connectn.bitboard import BitBoard
+    from agents.connectn.common import initialize_game_state, apply_player_action, PLAYER1, PLAYER2
+
+    rng = np.random.default_rng(1)
+    board = initialize_game_state()
+    bitboard = BitBoard()
+    history = []
+    for move in range(20):
+        action = rng.choice(bitboard.legal_moves())
+        player = (PLAYER1, PLAYER2)[move % 2]
+        apply_player_action(board, action, player)
+        bitboard.play(action, player)
+        history.append((action, player, board.copy()))
+
+        assert np.all(bitboard.to_array() == board)
+
+    for action, player, before in reversed(history):
+        assert np.all(bitboard.to_array() == before)
+        bitboard.undo(action, player)
+
+    assert bitboard.mask == 0 and bitboard.moves == 0
+
+
+def test_bitboard_legal_moves():
+    """a full column should not be playable and should not be in the legal mask"""
+    from agents.connectn.bitboard import BitBoard, BOTTOM_MASK
+    from agents.connectn.common import PLAYER1, PLAYER2
+
+    bitboard = BitBoard()
+    assert bitboard.legal_mask() == BOTTOM_MASK
+    for move in range(6):
+        bitboard.play(2, (PLAYER1, PLAYER2)[move % 2])
+
+    assert not bitboard.can_play(2)
+    assert bitboard.legal_moves() == [0, 1, 3, 4, 5, 6]
+    assert bitboard.legal_mask() == BOTTOM_MASK & ~(1 << 14)
+
+
+def test_bitboard_has_won():
+    """the shift-and-AND check should agree with checking every window"""
+    from agents.connectn.bitboard import BitBoard
+    from agents.connectn.common import _connected_four_scan, PLAYER1, PLAYER2
+
+    rng = np.random.default_rng(2)
+    for _ in range(200):
+        board = random_board(rng, rng.integers(42), still_playing=False)  # won positions as well
+        bitboard = BitBoard.from_array(board)
+        for player in (PLAYER1, PLAYER2):
+            assert bitboard.has_won(player) == _connected_four_scan(board, player)
@@ -0,0 +1,86 @@
+import numpy as np
+
+
+def test_position_key_mirror():
+    """a board and its mirror image should have the same key"""
+    from agents.connectn.book import position_key
+    from agents.connectn.common import initialize_game_state, apply_player_action, PLAYER1, PLAYER2
+
+    board = initialize_game_state()
+    apply_player_action(board, 0, PLAYER1)
+    apply_player_action(board, 2, PLAYER2)
+
+    key, mirrored = position_key(board)
+    mirror_key, mirror_mirrored = position_key(board[:, ::-1])
+    assert key == mirror_key
+    assert mirrored != mirror_mirrored
+    assert position_key(initialize_game_state()) == (0, False)
+
+
+def test_book_lookup(tmp_path):
+    """the book should find every position it was written with (and their mirror images)"""
+    from agents.connectn.book import OpeningBook, position_key, write_book
+    from agents.connectn.common import initialize_game_state, apply_player_action, random_board, PLAYER1
+
+    rng = np.random.default_rng(6)
+    boards, entries = [], {}
+    for _ in range(200):
+        board = random_board(rng, rng.integers(0, 5))
+        key, mirrored = position_key(board)
+        if key not in entries:
+            move = int(rng.integers(7))
+            entries[key] = (key, 6 - move if mirrored else move, int(rng.integers(-1e8, 1e8)))
+            boards.append((board, move, entries[key][2]))
+    path = str(tmp_path / 'book.bin')
+    write_book(path, entries.values(), ply=4)
+
+    book = OpeningBook(path)
+    assert len(book) == len(entries)
+    for board, move, score in boards:
+        assert book.lookup(board) == (move, score)
+        if not np.array_equal(board, board[:, ::-1]):  # a symmetric board is its own mirror image
+            assert book.lookup(board[:, ::-1]) == (6 - move, score)
+
+    board = initialize_game_state()
+    for col in (0, 0, 0, 0, 0):  # past the last ply of the book
+        apply_player_action(board, col, PLAYER1)
+    assert book.lookup(board) is None
+    book.close()
+
+
+def test_book_errors(tmp_path):
+    """files that are not books should not be opened"""
+    import pytest
+    from agents.connectn.book import OpeningBook, write_book
+
+    path = tmp_path / 'book.bin'
+    path.write_bytes(b'not a book at all')
+    with pytest.raises(ValueError):
+        OpeningBook(str(path))
+
+    write_book(str(path), [(1, 3, 0), (2, 3, 0)])
+    path.write_bytes(path.read_bytes()[:-1])
+    with pytest.raises(ValueError):
+        OpeningBook(str(path))
+    with pytest.raises(ValueError):
+        write_book(str(path), [(1, 3, 0), (1, 2, 0)])
+
+
+def test_book_move(tmp_path, monkeypatch):
+    """the agents should play the book move"""
+    from agents.connectn.book import book_move, position_key, write_book, _load_book
+    from agents.connectn.common import initialize_game_state, PLAYER1
+    from agents.agent_minimax import generate_move_minimax
+
+    board = initialize_game_state()
+    path = str(tmp_path / 'book.bin')
+    write_book(path, [(position_key(board)[0], 1, 0)])
+    monkeypatch.setenv('CONNECT4_BOOK', path)
+    try:
+        assert book_move(board) == 1
+        assert generate_move_minimax(board, PLAYER1, None)[0] == 1
+    finally:
+        _load_book.cache_clear()
+
+    monkeypatch.setenv('CONNECT4_BOOK', str(tmp_path / 'missing.bin'))
+    assert book_move(board) is None
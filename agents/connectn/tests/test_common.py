@@ -120,3 +120,30 @@ def test_check_end_state():
     board3 = initialize_game_state()  # initial board, thus still playing
     # pretty_print_board(board3)
     assert check_end_state(board=board3, player=BoardPiece(1)) == GameState.STILL_PLAYING
+
+
+def test_connected_four_last_action():
+    """
+    property check: over many random games, the last action fast path
+    should agree with scanning the whole board after every single move
+    """
+    from agents.connectn.common import apply_player_action, initialize_game_state, connected_four
+    from agents.connectn.common import check_end_state, _connected_four_scan, GameState
+    from agents.connectn.common import PLAYER1, PLAYER2
+
+    rng = np.random.default_rng(42)
+    for _ in range(300):  # random games
+        board = initialize_game_state()
+        end_state = GameState.STILL_PLAYING
+        move = 0
+        while end_state == GameState.STILL_PLAYING:
+            player = (PLAYER1, PLAYER2)[move % 2]
+            action = rng.choice(np.flatnonzero(board[-1] == 0))
+            apply_player_action(board, action, player)
+
+            full_scan = _connected_four_scan(board, player)
+            assert connected_four(board, player, action) == full_scan
+            assert connected_four(board, player) == full_scan
+            end_state = check_end_state(board, player, action)
+            assert end_state == check_end_state(board, player)
+            move += 1
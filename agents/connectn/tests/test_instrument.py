@@ -0,0 +1,75 @@
+import io
+import json
+import pytest
+from agents.connectn.common import initialize_game_state, apply_player_action, PLAYER1, PLAYER2
+
+
+@pytest.mark.parametrize('search', ['pvs', 'minimax_ab'])
+def test_instrument_minimax_ab(search):
+    """a move of either search should be recorded with its nodes, table lookups, depth and phases"""
+    from agents.connectn import instrument
+    from agents.agent_minimax_ab import generate_move_minimax_ab
+
+    board = initialize_game_state()
+    apply_player_action(board, 3, PLAYER1)
+    sink = io.StringIO()
+    recorder = instrument.enable(sink, run='test')
+    try:
+        generate_move_minimax_ab(board, PLAYER2, None, max_depth=3, search=search)
+    finally:
+        assert instrument.disable() is recorder
+    record = json.loads(sink.getvalue())
+    assert record['agent'] == 'minimax_ab' and record['run'] == 'test' and record['ply'] == 1
+    assert record['nodes'] > 0 and record['leaves'] > 0 and record['tt_probes'] >= record['tt_hits'] > 0
+    assert record['depth'] == 3
+    assert all(record[timer + '_ns'] > 0 for timer in instrument.TIMERS)
+    assert record['latency_ns'] > sum(record[timer + '_ns'] for timer in instrument.TIMERS)
+
+
+def test_instrument_mcts():
+    """the moves of MCTS (from myMCTS) should go into the same recorder as those of the other agents"""
+    from agents.connectn import instrument
+    from agents.connectn.arena import load_agent
+
+    generate_move_mcts = load_agent('mcts')
+    recorder = instrument.enable()
+    try:
+        generate_move_mcts(initialize_game_state(), PLAYER1, None, calc_time=0.05)
+        load_agent('minimax')(initialize_game_state(), PLAYER1, None)
+    finally:
+        instrument.disable()
+    assert sorted(recorder.totals) == ['mcts', 'minimax']
+    assert recorder.totals['mcts']['simulations'] > 0 and recorder.totals['minimax']['nodes'] > 0
+
+
+def test_instrument_disabled():
+    """nothing should be recorded while the instrumentation is off"""
+    from agents.connectn import instrument
+    from agents.agent_random import generate_move_random
+
+    recorder = instrument.Recorder()
+    generate_move_random(initialize_game_state(), PLAYER1, None)
+    assert instrument.RECORDER is None and recorder.totals == {}
+
+
+def test_instrument_prometheus():
+    """the totals should be exported per agent in the prometheus text format"""
+    from agents.connectn import instrument
+    from agents.agent_random import generate_move_random
+    from agents.agent_minimax import generate_move_minimax
+
+    recorder = instrument.enable(host='a')
+    try:
+        for _ in range(3):
+            generate_move_random(initialize_game_state(), PLAYER1, None)
+        generate_move_minimax(initialize_game_state(), PLAYER1, None)
+    finally:
+        instrument.disable()
+    text = recorder.prometheus()
+    assert 'connect4_move_seconds_count{host="a",agent="random"} 3' in text
+    assert 'connect4_move_seconds_bucket{host="a",agent="minimax",le="+Inf"} 1' in text
+    assert 'connect4_search_depth_max{host="a",agent="minimax"} 4' in text
+    assert recorder.totals['minimax']['nodes'] > 0
+    assert all(recorder.totals['minimax'][timer + '_ns'] > 0 for timer in instrument.TIMERS)
+    for line in text.splitlines():
+        assert line.startswith('#') or len(line.split(' ')) == 2
@@ -0,0 +1,51 @@
+import json
+from agents.connectn.common import PLAYER1
+
+
+def test_profiler_sample(tmp_path):
+    """the samples should be collapsed stacks of the search, under a frame of the tags"""
+    from agents.connectn.profiling import Profiler, profile_positions, random_positions
+    from agents.agent_minimax_ab import generate_move_minimax_ab
+
+    profiler = Profiler('sample', by_position=True)
+    boards = random_positions(2, seed=1, max_ply=6)
+    profile_positions(profiler, generate_move_minimax_ab, boards, agent='minimax_ab', time_budget=0.1)
+    assert [capture['ply'] for capture in profiler.captures] == [int((board != 0).sum()) for board in boards]
+    assert all(capture['params'] == {'time_budget': 0.1} for capture in profiler.captures)
+
+    # how many samples there are depends on the machine, not how they are collapsed
+    positions = {'ply {ply} {columns}'.format(**capture) for capture in profiler.captures}
+    lines = profiler.collapsed().splitlines()
+    searches = 0
+    for line in lines:
+        stack, count = line.rsplit(' ', 1)
+        frames = stack.split(';')
+        assert frames[0] == 'minimax_ab[time_budget=0.1]' and frames[1] in positions and int(count) > 0
+        if frames[2].startswith('generate_move_instrumented (instrument.py'):  # not starting the sampler
+            assert frames[3].startswith('generate_move_minimax_ab (minimax_ab.py')
+            searches += 1
+    assert searches > 0
+    assert sum(int(line.rsplit(' ', 1)[1]) for line in lines) <= sum(c['samples'] for c in profiler.captures)
+
+    path = str(tmp_path / 'profile.collapsed')
+    profiler.write(path)
+    with open(path) as file:
+        assert file.read() == profiler.collapsed()
+    with open(path + '.captures.jsonl') as file:
+        assert len([json.loads(line) for line in file]) == 2
+
+
+def test_profiler_cprofile():
+    """the costs of the moves should be added up"""
+    from agents.connectn.profiling import Profiler, profiled
+    from agents.connectn.common import initialize_game_state
+    from agents.agent_minimax import generate_move_minimax
+
+    profiler = Profiler('cprofile')
+    generate_move = profiled(generate_move_minimax, profiler, agent='minimax')
+    for _ in range(2):
+        action, _ = generate_move(initialize_game_state(), PLAYER1, None)
+        assert action == 3
+    assert len(profiler.captures) == 2
+    assert profiler.stats.total_calls == sum(capture['calls'] for capture in profiler.captures)
+    assert 'heuristic_basic' in profiler.top(50)
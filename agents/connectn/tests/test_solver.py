@@ -0,0 +1,74 @@
+import numpy as np
+from agents.connectn.common import initialize_game_state, apply_player_action, connected_four, random_board
+from agents.connectn.common import BoardPiece, PLAYER1, PLAYER2, NO_PLAYER
+
+
+def reference_score(board: np.ndarray, player: BoardPiece) -> int:
+    """the score of the solver, from a plain negamax over every move"""
+    other = PLAYER2 if player == PLAYER1 else PLAYER1
+    moves = int(np.count_nonzero(board))
+    best = None
+    for col in np.flatnonzero(board[-1] == NO_PLAYER):
+        child = apply_player_action(board, col, player, copy=True)
+        if connected_four(child, player, col):
+            score = (board.size + 1 - moves) // 2
+        elif moves + 1 == board.size:
+            score = 0
+        else:
+            score = -reference_score(child, other)
+        best = score if best is None else max(best, score)
+    return best
+
+
+def endgame(rng: np.random.Generator, empty: int):
+    """a board after random moves that did not end the game, and the player to move"""
+    board = random_board(rng, initialize_game_state().size - empty)
+    return board, (PLAYER1 if empty % 2 == 0 else PLAYER2)
+
+
+def test_solver_exact():
+    """the solver's score should be the exact score, and its move should reach it"""
+    from agents.connectn.solver import Solver
+
+    rng = np.random.default_rng(7)
+    solver = Solver()
+    for _ in range(30):
+        board, player = endgame(rng, int(rng.integers(1, 7)))
+        other = PLAYER2 if player == PLAYER1 else PLAYER1
+        move, score = solver.solve(board, player)
+        assert score == reference_score(board, player)
+
+        child = apply_player_action(board, move, player, copy=True)
+        if not connected_four(child, player, move) and np.count_nonzero(child) < child.size:
+            assert -reference_score(child, other) == score
+
+
+def test_solver_threats():
+    """the solver should win right away, and block a threat of a lost position"""
+    from agents.connectn.solver import Solver
+
+    board = initialize_game_state()
+    for col in (1, 2, 3):
+        apply_player_action(board, col, PLAYER1)
+        apply_player_action(board, col, PLAYER2)
+    assert Solver().solve(board, PLAYER1) == (4, 18)
+    board[1, 1:4] = NO_PLAYER
+    board[0, 5] = PLAYER2  # player 2 can only block one end of the three
+    move, score = Solver().solve(board, PLAYER2)
+    assert move in (0, 4)
+    assert score == -((board.size - 4) // 2)
+
+
+def test_endgame_move():
+    """the agents should only use the solver below the threshold"""
+    from agents.connectn.solver import endgame_move, with_endgame_solver
+    from agents.agent_random import generate_move_random
+
+    rng = np.random.default_rng(8)
+    board, player = endgame(rng, 10)
+    assert endgame_move(board, player, threshold=9) is None
+    assert endgame_move(board, player, threshold=10) is not None
+
+    generate_move = with_endgame_solver(generate_move_random, threshold=10)
+    for _ in range(5):
+        assert generate_move(board, player, None)[0] == endgame_move(board, player)
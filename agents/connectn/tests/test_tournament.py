@@ -0,0 +1,81 @@
+import json
+import numpy as np
+from agents.connectn.tests.test_arena import first_column
+
+
+def test_bayes_elo():
+    """a 75% score should be about 190 elo, without the prior"""
+    from agents.connectn.tournament import bayes_elo, ELO
+
+    scores = np.array([[0, 75], [25, 0]], dtype=float)
+    games = np.array([[0, 100], [100, 0]])
+    elo, covariance, _ = bayes_elo(scores, games, prior=1e-9)
+    assert abs(elo[0] - elo[1] - ELO * np.log(3)) < 1e-3
+    assert abs(elo.sum()) < 1e-6
+    assert covariance[0, 0] > 0
+
+    # an agent that won every game still has a finite rating with the prior
+    elo, _, _ = bayes_elo(np.array([[0, 10], [0, 0]], dtype=float), np.array([[0, 10], [10, 0]]))
+    assert np.isfinite(elo).all() and elo[0] > elo[1]
+
+
+def test_sprt_llr():
+    from agents.connectn.tournament import sprt_llr
+
+    assert sprt_llr(0, 0, 0, 50) == 0
+    assert sprt_llr(60, 10, 30, 50) > 0 > sprt_llr(30, 10, 60, 50)
+    assert sprt_llr(120, 20, 60, 50) > sprt_llr(60, 10, 30, 50)
+
+
+def test_tournament_adaptive():
+    """a pairing that is decided should not get more games"""
+    from agents.connectn.tournament import Tournament
+    from agents.agent_random import generate_move_random
+
+    tournament = Tournament({'first column': first_column, 'random': generate_move_random},
+                            min_games=4, max_games=40)
+    tournament.run()
+    assert 4 <= tournament.games((0, 1)) < 40
+    assert tournament.decided((0, 1)) and tournament.next_pair() is None
+
+
+def test_tournament_next_pair_running():
+    """the tasks running should count towards min_games, and spread the workers over the pairings"""
+    from agents.connectn.tournament import Tournament
+    from agents.agent_random import generate_move_random
+
+    agents = {'a': generate_move_random, 'b': generate_move_random, 'c': first_column}
+    tournament = Tournament(agents, min_games=4, max_games=20)
+    assert tournament.next_pair() == (0, 1)
+    assert tournament.next_pair({(0, 1): 1}) == (0, 2)
+    assert tournament.next_pair({(0, 1): 2, (0, 2): 1, (1, 2): 1}) == (0, 2)  # (0, 1) has its min_games
+
+    tournament.run(workers=2, max_tasks=2)  # both tasks are handed out before any finishes
+    assert sorted(tournament.tasks.values()) == [0, 1, 1]
+    assert sum(tournament.games(pair) for pair in tournament.pairs) == 4
+
+
+def test_tournament_resume(tmp_path):
+    """a tournament started with the checkpoint of an interrupted one should go on from it"""
+    from agents.connectn.tournament import Tournament
+    from agents.agent_random import generate_move_random
+
+    agents = {'a': generate_move_random, 'b': generate_move_random, 'c': first_column}
+    path = str(tmp_path / 'tournament.jsonl')
+    tournament = Tournament(agents, path, min_games=20, max_games=20)
+    tournament.run(max_tasks=4)
+    assert sum(tournament.games(pair) for pair in tournament.pairs) == 8
+    with open(path, 'a') as file:
+        file.write('{"agents": ["a", "b"], "ga')  # killed while writing
+
+    resumed = Tournament(agents, path, min_games=20, max_games=20)
+    assert np.array_equal(resumed.wins, tournament.wins) and np.allclose(resumed.elo, tournament.elo)
+    resumed.run(workers=2)
+    assert all(resumed.games(pair) == 20 for pair in resumed.pairs)
+    with open(path) as file:
+        records = [json.loads(line) for line in file if line.startswith('{"agents": ["a", "b"], "game"')]
+    assert len(records) == len({record['game'] for record in records}) == 20
+
+    uninterrupted = Tournament(agents, None, min_games=20, max_games=20)
+    uninterrupted.run()
+    assert np.array_equal(resumed.wins, uninterrupted.wins)  # the games are seeded
@@ -0,0 +1,309 @@
+import itertools
+import json
+import math
+import numpy as np
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from agents.connectn.common import GenMove
+from agents.connectn.arena import GameResult, _play_games
+
+
+"""
+a round robin tournament between several agents, with ratings on the elo scale.
+
+every pairing of two agents plays pairs of games (the agents swap colors), a pair of games
+is one task. tasks go to a process pool one at a time, as soon as a worker is free, so a fast
+pairing never waits for a slow one (the pool's queue is shared by all the workers).
+
+every game is appended to a checkpoint file (json lines) as soon as it finishes, a tournament
+started with the same checkpoint skips the games that are in it.
+
+ratings are the maximum likelihood bradley-terry ratings (a draw is half a win), with a
+bayeselo-like prior: every agent has drawn a few games against a virtual agent rated 0,
+so an agent that won or lost every game still gets a finite rating. they are updated with
+a few newton steps after every game, starting from the last ratings, the covariance is
+the inverse of the (negative) hessian of the log likelihood.
+
+scheduling: a pairing stops when a sequential probability ratio test decides which of the
+two is stronger (elo difference -margin against +margin), or after max_games. the next task
+goes to the undecided pairing with the fewest tasks running and the most uncertain rating
+difference, so the workers are spread over the pairings while their results are not known
+"""
+
+ELO = 400 / math.log(10)  # elo points per natural unit of the bradley-terry ratings
+
+
+def bayes_elo(
+    scores: np.ndarray, games: np.ndarray, prior: float = 2., ratings: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    input ->
+    scores: scores[i, j] the points of agent i against agent j (a draw counts 1/2)
+    games: games[i, j] the number of games between agent i and agent j (symmetric)
+    prior: the number of virtual draws of every agent against an agent rated 0
+    ratings: the ratings (natural units) to start the newton steps from
+    output ->
+    the ratings in elo (mean 0), their covariance (elo squared) and the ratings in natural units
+    """
+    n = len(games)
+    r = np.zeros(n) if ratings is None else np.array(ratings, dtype=float)
+    for _ in range(50):
+        p = 1 / (1 + np.exp(r[None, :] - r[:, None]))  # expected score of i against j
+        p0 = 1 / (1 + np.exp(-r))  # against the virtual agent
+        gradient = (scores - games * p).sum(axis=1) + prior * (0.5 - p0)
+        curvature = games * p * (1 - p)
+        hessian = curvature - np.diag(curvature.sum(axis=1) + prior * p0 * (1 - p0))
+        step = np.linalg.solve(hessian, -gradient)
+        r += step
+        if np.max(np.abs(step)) < 1e-9:
+            break
+    covariance = np.linalg.inv(-hessian)
+    center = np.eye(n) - 1 / n  # the ratings relative to their mean
+    return (r - r.mean()) * ELO, center @ covariance @ center * ELO ** 2, r
+
+
+def sprt_llr(wins: int, draws: int, losses: int, margin: float) -> float:
+    """
+    the log likelihood ratio of an elo difference of +margin against -margin,
+    with the normal approximation of the score of a game (as in the gsprt)
+    """
+    n = wins + draws + losses
+    if n == 0:
+        return 0.
+    score = (wins + draws / 2) / n
+    variance = max((wins + draws / 4) / n - score ** 2, 0.01)  # no variance yet after a few games
+    s0, s1 = 1 / (1 + 10 ** (margin / 400)), 1 / (1 + 10 ** (-margin / 400))
+    return n * (s1 - s0) * (2 * score - s0 - s1) / (2 * variance)
+
+
+class Tournament(object):
+
+    """
+    a round robin tournament between the agents (name -> GenMove, picklable), with
+    the results checkpointed to a json lines file (None for no checkpoint)
+    """
+
+    def __init__(
+        self, agents: Dict[str, GenMove], checkpoint: Optional[str] = None, seed: int = 0,
+        min_games: int = 10, max_games: int = 200, margin: float = 50., alpha: float = 0.05,
+        beta: float = 0.05, prior: float = 2.,
+    ):
+        self.names = sorted(agents)
+        self.agents = agents
+        self.checkpoint = checkpoint
+        self.seed = seed
+        self.min_games = min_games  # the games of every pairing before it can be decided
+        self.max_games = max_games  # the games of a pairing that is never decided
+        self.margin = margin
+        self.bounds = (math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha))
+        self.prior = prior
+
+        n = len(self.names)
+        self.pairs = list(itertools.combinations(range(n), 2))  # the pairing matrix
+        self.wins = np.zeros((n, n), dtype=int)  # wins[i, j] the games i won against j
+        self.draws = np.zeros((n, n), dtype=int)
+        self.tasks = {pair: 0 for pair in self.pairs}  # the tasks handed out, per pairing
+        self.retry = {pair: [] for pair in self.pairs}  # the tasks of a resumed run that were not finished
+        self.done = set()  # the (pair, game) played
+        self.elo, self.covariance, self._ratings = np.zeros(n), np.zeros((n, n)), None
+        if checkpoint is not None and os.path.exists(checkpoint):
+            self._resume()
+        self._rate()
+
+    def _resume(self):
+        index = {name: i for i, name in enumerate(self.names)}
+        line = '\n'
+        with open(self.checkpoint) as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:  # the last line of an interrupted run
+                    continue
+                if record['agents'][0] not in index or record['agents'][1] not in index:
+                    continue
+                pair = (index[record['agents'][0]], index[record['agents'][1]])
+                if (pair, record['game']) not in self.done:
+                    self._add(pair, record['game'], record['winner'])
+            if not line.endswith('\n'):  # start the next run on a new line
+                with open(self.checkpoint, 'a') as out:
+                    out.write('\n')
+        # task k of a pairing plays the games 2k and 2k + 1, the unfinished tasks are played
+        # again (the games already in the checkpoint are not recorded twice)
+        for pair, game in self.done:
+            self.tasks[pair] = max(self.tasks[pair], game // 2 + 1)
+        for pair in self.pairs:
+            self.retry[pair] = [task for task in range(self.tasks[pair])
+                                if (pair, 2 * task) not in self.done or (pair, 2 * task + 1) not in self.done]
+
+    def _add(self, pair: Tuple[int, int], game: int, winner: Optional[int]):
+        """add the result of a game, winner 0 for the first agent of the pair, 1 for the second, None for a draw"""
+        a, b = pair
+        self.done.add((pair, game))
+        if winner is None:
+            self.draws[a, b] += 1
+            self.draws[b, a] += 1
+        elif winner == 0:
+            self.wins[a, b] += 1
+        else:
+            self.wins[b, a] += 1
+
+    def _rate(self):
+        games = self.wins + self.wins.T + self.draws
+        scores = self.wins + self.draws / 2
+        self.elo, self.covariance, self._ratings = bayes_elo(scores, games, self.prior, self._ratings)
+
+    def record(self, pair: Tuple[int, int], result: GameResult):
+        """add a game of the pairing, write it to the checkpoint and update the ratings"""
+        if (pair, result.game) in self.done:
+            return
+        self._add(pair, result.game, result.winner)
+        if self.checkpoint is not None:
+            with open(self.checkpoint, 'a') as file:
+                file.write(json.dumps({
+                    'agents': [self.names[pair[0]], self.names[pair[1]]], 'game': result.game,
+                    'winner': result.winner, 'first': result.first, 'plies': result.plies,
+                }) + '\n')
+        self._rate()
+
+    def games(self, pair: Tuple[int, int]) -> int:
+        a, b = pair
+        return int(self.wins[a, b] + self.wins[b, a] + self.draws[a, b])
+
+    def llr(self, pair: Tuple[int, int]) -> float:
+        a, b = pair
+        return sprt_llr(self.wins[a, b], self.draws[a, b], self.wins[b, a], self.margin)
+
+    def decided(self, pair: Tuple[int, int]) -> bool:
+        """the pairing has all its games, or the test decided which agent is stronger"""
+        if 2 * self.tasks[pair] >= self.max_games and not self.retry[pair]:
+            return True
+        if self.games(pair) < self.min_games:
+            return False
+        return not self.bounds[0] < self.llr(pair) < self.bounds[1]
+
+    def next_pair(self, running: Optional[Dict[Tuple[int, int], int]] = None) -> Optional[Tuple[int, int]]:
+        """
+        the next pairing to play: the pairings short of min_games (counting the games of the tasks
+        running, running[pair] the tasks of the pairing), then the ones with the fewest tasks running,
+        then the most uncertain rating difference
+        """
+        running = running or {}
+        undecided = [pair for pair in self.pairs if not self.decided(pair)]
+        if not undecided:
+            return None
+        c = self.covariance
+        return max(undecided, key=lambda pair: (self.games(pair) + 2 * running.get(pair, 0) < self.min_games,
+                                                -running.get(pair, 0),
+                                                c[pair[0], pair[0]] + c[pair[1], pair[1]] - 2 * c[pair]))
+
+    def _task(self, pair: Tuple[int, int]) -> Tuple:
+        """the arguments of _play_games for the next pair of games of the pairing"""
+        if self.retry[pair]:
+            task = self.retry[pair].pop()
+        else:
+            task = self.tasks[pair]
+            self.tasks[pair] += 1
+        a, b = pair
+        seed = self.seed + 1000003 * self.pairs.index(pair)
+        return self.agents[self.names[a]], self.agents[self.names[b]], (2 * task, 2 * task + 1), seed, (), ()
+
+    def run(
+        self, workers: int = 1, max_tasks: Optional[int] = None,
+        callback: Optional[Callable[['Tournament'], None]] = None,
+    ) -> List[Tuple[str, float, float]]:
+        """
+        play until every pairing is decided (or max_tasks pairs of games were played),
+        callback is called after every pair of games, returns the table of ratings
+        """
+        played = 0
+        if workers <= 1:
+            while max_tasks is None or played < max_tasks:
+                pair = self.next_pair()
+                if pair is None:
+                    break
+                for result in _play_games(*self._task(pair)):
+                    self.record(pair, result)
+                played += 1
+                if callback is not None:
+                    callback(self)
+            return self.table()
+
+        with ProcessPoolExecutor(workers) as pool:
+            running = {}
+            try:
+                while True:
+                    # keep every worker busy with the most uncertain pairings
+                    while len(running) < workers and (max_tasks is None or played + len(running) < max_tasks):
+                        pair = self.next_pair(Counter(running.values()))
+                        if pair is None:
+                            break
+                        running[pool.submit(_play_games, *self._task(pair))] = pair
+                    if not running:
+                        break
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        pair = running.pop(future)
+                        for result in future.result():
+                            self.record(pair, result)
+                        played += 1
+                        if callback is not None:
+                            callback(self)
+            finally:
+                for future in running:
+                    future.cancel()
+        return self.table()
+
+    def table(self) -> List[Tuple[str, float, float]]:
+        """(name, elo, half width of the 95% confidence interval), the strongest first"""
+        error = 1.96 * np.sqrt(np.maximum(np.diag(self.covariance), 0))
+        return sorted(((name, float(self.elo[i]), float(error[i])) for i, name in enumerate(self.names)),
+                      key=lambda row: -row[1])
+
+    def __str__(self) -> str:
+        games = self.wins + self.wins.T + self.draws
+        width = max(len(name) for name in self.names + ['agent'])
+        lines = ['{0:<{w}} {1:>7} {2:>7} {3:>6}'.format('agent', 'elo', '+/-', 'games', w=width)]
+        for name, elo, error in self.table():
+            lines.append('{0:<{w}} {1:>7.1f} {2:>7.1f} {3:>6}'.format(
+                name, elo, error, int(games[self.names.index(name)].sum()), w=width))
+        return '\n'.join(lines)
+
+
+def tournament_agents(specs: Sequence[str]) -> Dict[str, GenMove]:
+    """
+    agents from specs like 'minimax_ab' or 'mcts:calc_time=0.5,c=1.4' (keyword arguments
+    of the GenMove, named by the spec)
+    """
+    from functools import partial
+    from agents.connectn.arena import load_agent
+
+    agents = {}
+    for spec in specs:
+        name, _, options = spec.partition(':')
+        kwargs = {}
+        for option in filter(None, options.split(',')):
+            key, value = option.split('=')
+            kwargs[key] = json.loads(value)
+        agents[spec] = partial(load_agent(name), **kwargs) if kwargs else load_agent(name)
+    return agents
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='a round robin tournament with elo ratings')
+    parser.add_argument('agents', nargs='+', help="agents like 'random', 'minimax_ab' or 'mcts:calc_time=0.5'")
+    parser.add_argument('--checkpoint', help='the json lines file of the results (resumed if it exists)')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--min-games', type=int, default=10)
+    parser.add_argument('--max-games', type=int, default=200)
+    parser.add_argument('--margin', type=float, default=50., help='the elo difference of the test of a pairing')
+    options = parser.parse_args()
+
+    tournament = Tournament(tournament_agents(options.agents), options.checkpoint, options.seed,
+                            options.min_games, options.max_games, options.margin)
+    tournament.run(options.workers, callback=lambda t: print(t, end='\n\n', flush=True))
+    print(tournament)
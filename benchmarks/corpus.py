@@ -0,0 +1,102 @@
+import json
+import os
+import numpy as np
+from typing import Dict, List, NamedTuple
+from agents.connectn.common import BoardPiece, PlayerAction, PLAYER1, PLAYER2, NO_PLAYER, GameState
+from agents.connectn.common import initialize_game_state, apply_player_action, check_end_state
+
+
+"""
+the position corpus of the benchmarks: opening, midgame and endgame positions stored
+as the moves (columns) that lead to them, in a versioned json file. a new version is
+a new file (corpus_v2.json ...), so the baselines of a version stay comparable
+
+make a new version with: python -m benchmarks.corpus --version 2 --seed 2
+"""
+
+CORPUS_DIR = os.path.dirname(os.path.abspath(__file__))
+VERSION = 1  # the corpus of the baselines
+PHASES = {'opening': (4, 8), 'midgame': (16, 24), 'endgame': (30, 36)}  # plies of the positions
+
+
+class Position(NamedTuple):
+    name: str
+    phase: str
+    moves: str  # the columns played, from the first move
+    board: np.ndarray
+    player: BoardPiece  # the player to move
+    last_action: PlayerAction  # the last move played
+    last_player: BoardPiece
+
+
+def corpus_path(version: int = VERSION) -> str:
+    return os.path.join(CORPUS_DIR, 'corpus_v{}.json'.format(version))
+
+
+def play(moves: str) -> np.ndarray:
+    board = initialize_game_state()
+    for i, move in enumerate(moves):
+        apply_player_action(board, PlayerAction(int(move)), PLAYER1 if i % 2 == 0 else PLAYER2)
+    return board
+
+
+def load_corpus(version: int = VERSION) -> List[Position]:
+    with open(corpus_path(version)) as file:
+        corpus = json.load(file)
+    if corpus['version'] != version:
+        raise ValueError('{} is version {}'.format(corpus_path(version), corpus['version']))
+    positions = []
+    for entry in corpus['positions']:
+        moves = entry['moves']
+        last_player = PLAYER1 if len(moves) % 2 == 1 else PLAYER2
+        player = PLAYER2 if last_player == PLAYER1 else PLAYER1
+        positions.append(Position(entry['name'], entry['phase'], moves, play(moves), player,
+                                  PlayerAction(int(moves[-1])), last_player))
+    return positions
+
+
+def make_corpus(per_phase: int = 10, seed: int = 0) -> List[Dict]:
+    """
+    random games that avoid winning moves (so they last into the endgame),
+    stopped at a random ply of the phase, with the game still going
+    """
+    rng = np.random.default_rng(seed)
+    entries = []
+    for phase, (low, high) in PHASES.items():
+        while sum(entry['phase'] == phase for entry in entries) < per_phase:
+            plies = int(rng.integers(low, high + 1))
+            board, moves = initialize_game_state(), ''
+            for i in range(plies):
+                player = PLAYER1 if i % 2 == 0 else PLAYER2
+                legal = list(np.flatnonzero(board[-1] == NO_PLAYER))
+                rng.shuffle(legal)
+                for action in legal:
+                    child = apply_player_action(board, PlayerAction(action), player, copy=True)
+                    if check_end_state(child, player, PlayerAction(action)) == GameState.STILL_PLAYING:
+                        board, moves = child, moves + str(action)
+                        break
+                else:
+                    break
+            if len(moves) == plies:
+                count = sum(entry['phase'] == phase for entry in entries)
+                entries.append({'name': '{}-{:02}'.format(phase, count + 1), 'phase': phase, 'moves': moves})
+    return entries
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='write a new version of the position corpus')
+    parser.add_argument('--version', type=int, required=True)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--per-phase', type=int, default=10)
+    options = parser.parse_args()
+
+    path = corpus_path(options.version)
+    if os.path.exists(path):
+        raise SystemExit('{} exists, a corpus version is never changed'.format(path))
+    with open(path, 'w') as file:
+        json.dump({'version': options.version, 'positions': make_corpus(options.per_phase, options.seed)},
+                  file, indent=1)
+        file.write('\n')
+    print('written to {}'.format(path))
@@ -0,0 +1,45 @@
+import numpy as np
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'myMCTS'))
+
+from game_CONNECTN.connectn.common import initialize_game_state, random_board  # noqa: E402
+from agent_MCTS.MCTS import MCTSnet  # noqa: E402
+
+
+"""
+simulations per second of the MCTS agent (myMCTS), on the empty board
+and on a few positions after random moves, with a fixed number of simulations
+
+run from the repository root with: python -m benchmarks.mcts_simulations
+"""
+
+
+def positions(n: int, seed: int = 0):
+    """the empty board, and boards after an even number of random moves"""
+    rng = np.random.default_rng(seed)
+    return [initialize_game_state()] + [random_board(rng, 2 * rng.integers(1, 8)) for _ in range(n - 1)]
+
+
+def simulations_per_second(board: np.ndarray, sims: int, **kwargs) -> float:
+    mcts = MCTSnet(board, state=None, calc_time=0, move_max=100, c=np.sqrt(2), debug=None, **kwargs)
+    t0 = time.perf_counter()
+    for _ in range(sims):
+        mcts.run_sim()
+    return sims / (time.perf_counter() - t0)
+
+
+def main(n: int = 5, sims: int = 2000):
+    boards = positions(n)
+    print('{} positions, {} simulations each'.format(n, sims))
+    rates = []
+    for i, board in enumerate(boards):
+        rates.append(simulations_per_second(board, sims))
+        print('position {} ({:>2} pieces): {:8.0f} simulations/s'.format(i, np.count_nonzero(board), rates[-1]))
+    print('mean: {:8.0f} simulations/s'.format(np.mean(rates)))
+
+
+if __name__ == '__main__':
+    main()
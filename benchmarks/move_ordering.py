@@ -0,0 +1,80 @@
+import numpy as np
+import time
+from agents.connectn.common import BoardPiece, random_board
+from agents.agent_minimax.minimax import heuristic_basic, heuristic_better
+from agents.agent_minimax_ab.minimax_ab import minimax_ab
+from agents.agent_minimax_ab.ordering import MoveOrdering
+from agents.agent_minimax_ab.transposition import TranspositionTable
+
+
+"""
+node-count benchmark for the move ordering of minimax_ab
+the same positions are searched to the same depth with every ordering,
+and the leaves that had to be evaluated are counted
+
+run from the repository root with: python -m benchmarks.move_ordering
+"""
+
+ORDERINGS = {
+    'columns 0..6': lambda: None,
+    'center first': lambda: MoveOrdering(killers=False, history=False, tt_move=False),
+    '+ killers': lambda: MoveOrdering(history=False, tt_move=False),
+    '+ history': lambda: MoveOrdering(tt_move=False),
+    '+ tt move': lambda: MoveOrdering(),
+}
+
+
+class CountingHeuristic(object):
+
+    """wraps a heuristic and counts the boards it evaluates"""
+
+    def __init__(self, heuristic):
+        self.heuristic = heuristic
+        self.count = 0
+
+    def __call__(self, board, player):
+        self.count += 1
+        return self.heuristic(board, player)
+
+
+def positions(n: int, seed: int = 0):
+    """boards after a random number of random moves, player 1 to move"""
+    rng = np.random.default_rng(seed)
+    return [random_board(rng, 2 * rng.integers(1, 8)) for _ in range(n)]
+
+
+def count_nodes(board: np.ndarray, depth: int, heuristic, ordering_factory, deepening: bool = False) -> int:
+    """
+    leaves evaluated by one search (with a fresh table and ordering),
+    with deepening the searches to depth 1 .. depth - 1 are run first (and counted)
+    """
+    counter = CountingHeuristic(heuristic)
+    ordering = ordering_factory()
+    tt = TranspositionTable() if ordering is not None and ordering.use_tt_move else None
+    for d in range(1 if deepening else depth, depth + 1):
+        minimax_ab(board, int(-1e10), int(1e10), BoardPiece(1), d, True, counter,
+                   batch=False, tt=tt, ordering=ordering)
+    return counter.count
+
+
+def main(depth: int = 6, n: int = 10, heuristic=heuristic_better):
+    boards = positions(n)
+    print('depth {}, {} positions, heuristic {}'.format(depth, n, heuristic.__name__))
+    baseline = None
+    for name, factory in ORDERINGS.items():
+        t0 = time.perf_counter()
+        nodes = sum(count_nodes(board, depth, heuristic, factory) for board in boards)
+        elapsed = time.perf_counter() - t0
+        baseline = baseline or nodes
+        print('{:<24} leaves: {:>9}  ({:5.1f}% of unordered)  time: {:.2f}s'.format(
+            name, nodes, 100 * nodes / baseline, elapsed))
+
+    # the table only knows the best moves once shallower searches have filled it
+    t0 = time.perf_counter()
+    nodes = sum(count_nodes(board, depth, heuristic, ORDERINGS['+ tt move'], deepening=True) for board in boards)
+    print('{:<24} leaves: {:>9}  ({:5.1f}% of unordered)  time: {:.2f}s'.format(
+        '+ iterative deepening', nodes, 100 * nodes / baseline, time.perf_counter() - t0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+import json
+import os
+import platform
+import random
+import sys
+import time
+import numpy as np
+from typing import Callable, Dict, List, Optional
+from agents.connectn import instrument
+from agents.connectn.common import connected_four, check_end_state, apply_player_action
+from agents.agent_minimax.minimax import heuristic_basic
+from agents.agent_minimax_ab.minimax_ab import minimax_ab
+from benchmarks.corpus import Position, load_corpus, VERSION
+
+
+"""
+the benchmark suite: the hot paths of the agents measured on the position corpus, compared
+with a json baseline. the nodes and leaves of the fixed depth minimax_ab searches do not
+depend on the machine, any increase is a regression and the suite exits with an error.
+
+the timings are only reported by default. they are the cpu time of the process, the best
+of many samples spread over the whole run, but they still moved by 20-40% between processes
+on a shared machine. with --gate-timings every metric is the median of several runs (each
+a new process) and a timing that is worse than its baseline by more than the timing
+threshold (well above that noise) is a regression as well. a baseline is the median of
+several runs, it is only comparable on the machine (and corpus version) it was recorded
+on, it records both
+
+run from the repository root with:
+    python -m benchmarks.suite                 compare with benchmarks/baseline.json
+    python -m benchmarks.suite --gate-timings  gate the timings as well
+    python -m benchmarks.suite --update        record the baseline
+    python -m benchmarks.suite --only heuristic_basic --only mcts_simulations
+"""
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+TIMING_THRESHOLD = 0.5  # the regression threshold of the timings, with --gate-timings
+RUNS = 5  # the runs of a baseline, and of a comparison with --gate-timings
+MINIMAX_DEPTH = 4
+MCTS_SIMULATIONS = 200  # per position
+ROUNDS = 12  # the samples of every search
+
+
+def micro_benchmarks(corpus: List[Position]) -> Dict[str, Callable[[], None]]:
+    """one call of the function for every position of the corpus"""
+    moves = [(p.board, int(np.flatnonzero(p.board[-1] == 0)[0]), p.player) for p in corpus]
+
+    def bench_connected_four():
+        for p in corpus:
+            connected_four(p.board, p.last_player, p.last_action)
+
+    def bench_check_end_state():
+        for p in corpus:
+            check_end_state(p.board, p.last_player, p.last_action)
+
+    def bench_apply_player_action():
+        for board, action, player in moves:
+            apply_player_action(board, action, player, copy=True)
+
+    def bench_heuristic_basic():
+        for p in corpus:
+            heuristic_basic(p.board, p.player)
+
+    return {'connected_four': bench_connected_four, 'check_end_state': bench_check_end_state,
+            'apply_player_action': bench_apply_player_action, 'heuristic_basic': bench_heuristic_basic}
+
+
+def minimax_ab_search(p: Position, depth: int = MINIMAX_DEPTH) -> Callable[[], None]:
+    """a search of the position to depth"""
+    def search():
+        minimax_ab(p.board, int(-1e10), int(1e10), p.player, depth, True, heuristic_basic)
+    return search
+
+
+def minimax_ab_counts(corpus: List[Position], depth: int = MINIMAX_DEPTH) -> Dict[str, float]:
+    """the nodes and leaves of a search of a position to depth, on average"""
+    recorder = instrument.enable()
+    try:
+        for p in corpus:
+            minimax_ab_search(p, depth)()
+    finally:
+        instrument.disable()
+    return {'minimax_ab_nodes': recorder.nodes / len(corpus), 'minimax_ab_leaves': recorder.leaves / len(corpus)}
+
+
+def mcts_simulations(p: Position, seed: int, simulations: int = MCTS_SIMULATIONS) -> Callable[[], None]:
+    """simulations of MCTSnet from the position (the same simulations every time)"""
+    from benchmarks.mcts_simulations import MCTSnet  # puts myMCTS on the path
+
+    def simulate():
+        random.seed(seed)
+        mcts = MCTSnet(p.board, state=None, calc_time=0, move_max=100, c=np.sqrt(2), debug=None)
+        for _ in range(simulations):
+            mcts.run_sim()
+    return simulate
+
+
+# name -> (unit, which way is better, regression threshold), the threshold of a timing is None
+METRICS = {
+    'connected_four': ('ns/call', 'lower', None),
+    'check_end_state': ('ns/call', 'lower', None),
+    'apply_player_action': ('ns/call', 'lower', None),
+    'heuristic_basic': ('ns/call', 'lower', None),
+    'minimax_ab_ms': ('ms/position at depth {}'.format(MINIMAX_DEPTH), 'lower', None),
+    'minimax_ab_nodes': ('nodes/position at depth {}'.format(MINIMAX_DEPTH), 'lower', 0.),
+    'minimax_ab_leaves': ('leaves/position at depth {}'.format(MINIMAX_DEPTH), 'lower', 0.),
+    'mcts_simulations': ('simulations/s', 'higher', None),
+}
+
+
+def run_suite(corpus: List[Position], only: Optional[List[str]] = None, rounds: int = ROUNDS) -> Dict[str, float]:
+    """
+    the value of every metric (or of the ones in only). every round searches every position
+    once and runs the micro benchmarks between the searches, a time (of the cpu) is the best
+    of all its samples, so the samples of a metric are spread over the whole run
+    """
+    def wanted(name):
+        return only is None or name in only
+
+    micro = {name: call for name, call in micro_benchmarks(corpus).items() if wanted(name)}
+    searches = []  # (metric, position, the search)
+    for i, p in enumerate(corpus):
+        if wanted('minimax_ab_ms'):
+            searches.append(('minimax_ab_ms', i, minimax_ab_search(p)))
+        if wanted('mcts_simulations'):
+            searches.append(('mcts_simulations', i, mcts_simulations(p, seed=i)))
+
+    times = {}
+    def sample(key, call):
+        start = time.process_time_ns()
+        call()
+        elapsed = time.process_time_ns() - start
+        times[key] = min(times.get(key, elapsed), elapsed)
+
+    for _ in range(rounds):
+        for key in (searches or [None] * len(corpus)):
+            if key is not None:
+                sample(key[:2], key[2])
+            for name, call in micro.items():
+                sample(name, call)
+
+    results = {name: times[name] / len(corpus) for name in micro}  # ns per call
+    if wanted('minimax_ab_ms'):
+        results['minimax_ab_ms'] = sum(times['minimax_ab_ms', i] for i in range(len(corpus))) / len(corpus) / 1e6
+    if wanted('minimax_ab_nodes') or wanted('minimax_ab_leaves'):
+        results.update(minimax_ab_counts(corpus))
+    if wanted('mcts_simulations'):
+        elapsed = sum(times['mcts_simulations', i] for i in range(len(corpus))) / 1e9
+        results['mcts_simulations'] = MCTS_SIMULATIONS * len(corpus) / elapsed
+    return {name: results[name] for name in METRICS if name in results and wanted(name)}
+
+
+def median(*runs: Dict[str, float]) -> Dict[str, float]:
+    """the median value of every metric over the runs"""
+    names = [name for name in METRICS if any(name in run for run in runs)]
+    return {name: float(np.median([run[name] for run in runs if name in run])) for name in names}
+
+
+def machine() -> Dict[str, str]:
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(), 'node': platform.node()}
+
+
+def make_baseline(results: Dict[str, float]) -> Dict:
+    """the baseline of the results, with the thresholds of the metrics"""
+    return {
+        'corpus': VERSION,
+        'machine': machine(),
+        'metrics': {name: {'value': value, 'unit': METRICS[name][0], 'better': METRICS[name][1],
+                           'threshold': METRICS[name][2]}
+                    for name, value in results.items()},
+    }
+
+
+def gated(name: str, timing_threshold: Optional[float] = None) -> bool:
+    """whether a metric can fail: the counts always, the timings only with a timing threshold"""
+    return METRICS[name][2] is not None or timing_threshold is not None
+
+
+def regressions(results: Dict[str, float], baseline: Dict, timing_threshold: Optional[float] = None) -> List[str]:
+    """
+    the metrics worse than the baseline by more than their threshold (timing_threshold for
+    the timings, which are skipped without it), metrics missing on either side are skipped
+    """
+    failed = []
+    for name, value in results.items():
+        base = baseline['metrics'].get(name)
+        if base is None or not gated(name, timing_threshold):
+            continue
+        limit = timing_threshold if METRICS[name][2] is None else base['threshold']
+        if base['better'] == 'lower':
+            worse = value > base['value'] * (1 + limit)
+        else:
+            worse = value < base['value'] * (1 - limit)
+        if worse:
+            failed.append(name)
+    return failed
+
+
+def report(results: Dict[str, float], baseline: Optional[Dict], timing_threshold: Optional[float] = None) -> str:
+    lines = []
+    for name, value in results.items():
+        base = baseline['metrics'].get(name) if baseline is not None else None
+        change = ''
+        if base is not None and base['value']:
+            change = '{:+7.1%}'.format(value / base['value'] - 1)
+            if not gated(name, timing_threshold):
+                change += ' (not gated)'
+        lines.append('{:<20} {:>12.1f} {:<28} {}'.format(name, value, METRICS[name][0], change))
+    return '\n'.join(lines)
+
+
+def _run_corpus(only: Optional[List[str]], version: int) -> Dict[str, float]:
+    return run_suite(load_corpus(version), only)
+
+
+def run_process(only: Optional[List[str]] = None, version: int = VERSION) -> Dict[str, float]:
+    """run_suite in a new process (the speed of a run changes from process to process)"""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(_run_corpus, only, version).result()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='benchmark the hot paths and compare with a baseline')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--update', action='store_true', help='write the results as the baseline')
+    parser.add_argument('--gate-timings', action='store_true', help='the timings can fail as well, not only the counts')
+    parser.add_argument('--threshold', type=float, default=TIMING_THRESHOLD,
+                        help='the regression threshold of the timings with --gate-timings (a fraction)')
+    parser.add_argument('--runs', type=int, default=RUNS, help='the runs of a baseline, or with --gate-timings')
+    parser.add_argument('--only', action='append', choices=list(METRICS), help='the metrics to run')
+    parser.add_argument('--out', help='write the results to this json file as well')
+    options = parser.parse_args()
+
+    corpus = load_corpus()
+    baseline = None
+    if os.path.exists(options.baseline):
+        with open(options.baseline) as file:
+            baseline = json.load(file)
+        if baseline['corpus'] != VERSION and not options.update:
+            raise SystemExit('the baseline is for corpus version {}, not {}'.format(baseline['corpus'], VERSION))
+
+    timing_threshold = options.threshold if options.gate_timings else None
+    if options.update or options.gate_timings:
+        results = median(*(run_process(options.only) for _ in range(options.runs)))
+    else:
+        results = run_process(options.only)
+    print('corpus version {}, {} positions'.format(VERSION, len(corpus)))
+    print(report(results, None if options.update else baseline, timing_threshold))
+    if options.out:
+        with open(options.out, 'w') as file:
+            json.dump(make_baseline(results), file, indent=1)
+
+    if options.update:
+        new = make_baseline(results)
+        if options.only and baseline is not None and baseline['corpus'] == VERSION:  # only these metrics change
+            new['metrics'] = dict(baseline['metrics'], **new['metrics'])
+        with open(options.baseline, 'w') as file:
+            json.dump(new, file, indent=1)
+            file.write('\n')
+        print('baseline written to {}'.format(options.baseline))
+    elif baseline is not None:
+        failed = regressions(results, baseline, timing_threshold)
+        if failed:
+            print('regressions: {}'.format(', '.join(failed)))
+            sys.exit(1)
+        print('no regressions')
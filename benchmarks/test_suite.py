@@ -0,0 +1,50 @@
+import json
+from agents.connectn.common import GameState, check_end_state, connected_four
+
+
+def test_corpus():
+    """the positions of the corpus should be in their phase, with the game still going"""
+    from benchmarks.corpus import load_corpus, PHASES
+
+    corpus = load_corpus()
+    assert len({p.name for p in corpus}) == len(corpus)
+    for phase, (low, high) in PHASES.items():
+        positions = [p for p in corpus if p.phase == phase]
+        assert len(positions) == 10
+        assert all(low <= len(p.moves) <= high for p in positions)
+    for p in corpus:
+        assert check_end_state(p.board, p.last_player, p.last_action) == GameState.STILL_PLAYING
+        assert not connected_four(p.board, p.player)
+
+
+def test_regressions():
+    """the counts should always be gated, the timings only with a timing threshold"""
+    from benchmarks.suite import make_baseline, regressions, median
+
+    baseline = make_baseline({'heuristic_basic': 100., 'mcts_simulations': 1000., 'minimax_ab_leaves': 50.,
+                              'minimax_ab_nodes': 20.})
+    worse = {'heuristic_basic': 300., 'mcts_simulations': 100., 'minimax_ab_leaves': 50., 'minimax_ab_nodes': 20.}
+    assert regressions(worse, baseline) == []  # the timings are only reported
+    assert regressions(dict(worse, minimax_ab_leaves=51., minimax_ab_nodes=21.),
+                       baseline) == ['minimax_ab_leaves', 'minimax_ab_nodes']
+    assert regressions({'heuristic_basic': 140., 'mcts_simulations': 700.}, baseline, timing_threshold=0.5) == []
+    assert regressions({'heuristic_basic': 160., 'mcts_simulations': 400.},
+                       baseline, timing_threshold=0.5) == ['heuristic_basic', 'mcts_simulations']
+    assert regressions({'connected_four': 1e9}, baseline, timing_threshold=0.5) == []  # not in the baseline
+    assert median({'heuristic_basic': 120., 'mcts_simulations': 800.}, {'heuristic_basic': 400.},
+                  {'heuristic_basic': 110., 'mcts_simulations': 700.}) == {'heuristic_basic': 120.,
+                                                                           'mcts_simulations': 750.}
+
+
+def test_minimax_ab_counts():
+    """the counts of the fixed depth searches do not depend on the machine, they should match the baseline"""
+    from benchmarks.suite import run_suite, regressions, BASELINE
+    from benchmarks.corpus import load_corpus
+
+    with open(BASELINE) as file:
+        baseline = json.load(file)
+    results = run_suite(load_corpus(), only=['minimax_ab_nodes', 'minimax_ab_leaves', 'connected_four'], rounds=1)
+    assert results['connected_four'] > 0
+    for name in ('minimax_ab_nodes', 'minimax_ab_leaves'):
+        assert results[name] == baseline['metrics'][name]['value']
+    assert regressions(results, baseline) == []
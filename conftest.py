@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def no_opening_book(tmp_path, monkeypatch):
+    """
+    the agents search every position in the tests, whether the book (data/opening_book.bin)
+    was built or not, a test of the book points CONNECT4_BOOK at a book of its own
+    """
+    monkeypatch.setenv('CONNECT4_BOOK', str(tmp_path / 'no_book.bin'))
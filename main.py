@@ -56,7 +56,7 @@ def human_vs_agent(
                 )
                 print(f"Move time: {time.time() - t0:.3f}s")
                 apply_player_action(board, action, player)
-                end_state = check_end_state(board, player)
+                end_state = check_end_state(board, player, action)
                 if end_state != GameState.STILL_PLAYING:
                     print(pretty_print_board(board))
                     if end_state == GameState.IS_DRAW:
@@ -4,7 +4,10 @@ import time
 from math import log, sqrt
 from typing import Optional, Tuple
 from game_CONNECTN.connectn.common import PlayerAction, BoardPiece, SavedState, NO_PLAYER, PLAYER1, PLAYER2, \
-    apply_player_action, check_end_state, GameState
+    GameState
+from game_CONNECTN.connectn import instrument
+from game_CONNECTN.connectn.bitboard import BitBoard, bitboard_has_won
+from game_CONNECTN.connectn.solver import ENDGAME_EMPTY
 
 
 # functions to be used within the MCTS Class:
@@ -40,6 +43,20 @@ def grab_player(board: np.ndarray or Tuple):
         print('broken grab_player inequality')
 
 
+def end_state(state: BitBoard, player: BoardPiece) -> GameState:
+    """
+    input ->
+    state: the position after player moved
+    output ->
+    the state of the game, from the bitboard of player and the number of moves played
+    """
+    if state.has_won(player):
+        return GameState.IS_WIN
+    if state.is_full():
+        return GameState.IS_DRAW
+    return GameState.STILL_PLAYING
+
+
 def totuple(array: np.ndarray):
     """
     input ->
@@ -50,6 +67,98 @@ def totuple(array: np.ndarray):
     return tuple(map(tuple, array))
 
 
+# the nodes of the search tree:
+
+WIN, DRAW, LOSS = 1, 0, -1  # the proven values of a node, for the player who made the move
+
+class Node(object):
+
+    """
+    a node of the search tree, the state reached when player played move in the parent state.
+    children are pointers to the child nodes, untried the moves that have no child node yet.
+    proven is the game theoretic value (WIN, DRAW or LOSS for player) once it is known
+    """
+
+    __slots__ = ('move', 'parent', 'children', 'untried', 'visits', 'wins', 'player', 'proven')
+
+    def __init__(self, move, parent, player, untried):
+        self.move = move  # the column played to reach this node (None for the root)
+        self.parent = parent
+        self.children = []
+        self.untried = untried  # the legal moves not expanded yet (empty for a finished game)
+        self.visits = 0  # the number of simulations through this node
+        self.wins = 0  # the wins of player in those simulations (draws count half)
+        self.player = player  # the player who made the move
+        self.proven = None  # not proven yet
+
+    def select_child(self, c):
+        """the child with the best UCB1 value, the win ratio plus the exploration term (proven losses are skipped)"""
+        log_visits = log(self.visits)  # the parent visits, once for all the children
+        children = [child for child in self.children if child.proven != LOSS] or self.children
+        return max(children, key=lambda child: child.wins / child.visits + c * sqrt(log_visits / child.visits))
+
+    def add_child(self, move, player, untried):
+        child = Node(move, self, player, untried)
+        self.children.append(child)
+        return child
+
+    def prove(self):
+        """
+        propagate the proven value of the node up the tree (MCTS-Solver):
+        a parent is lost if one of its children is won, and otherwise
+        proven once every move has a proven child (the best one for the player to move)
+        """
+        node = self
+        while node.parent is not None and node.proven is not None:
+            parent = node.parent
+            if node.proven == WIN:
+                parent.proven = LOSS
+            elif parent.untried or any(child.proven is None for child in parent.children):
+                break
+            else:
+                parent.proven = -max(child.proven for child in parent.children)
+            node = parent
+
+
+def move_budget(clock: float, board: np.ndarray, extension: float = 0.) -> float:
+    """
+    input ->
+    clock: the time [s] left for the rest of the game, board: the current board
+    extension: the extra time the search may take (as a fraction of the budget)
+    output ->
+    the calculation time for this move, the clock split evenly over the moves
+    the player can still have to make (so the clock can not run out)
+    """
+    moves_left = max((int(np.count_nonzero(board == NO_PLAYER)) + 1) // 2, 1)
+    return clock / (moves_left * (1 + extension))
+
+
+def find_subtree(node: Node, board: np.ndarray, new_board: np.ndarray) -> Optional[Node]:
+    """
+    input ->
+    node: the root of a tree searched for board
+    board, new_board: the board of the tree and the board some moves later
+    output ->
+    the node of new_board, cut off from the rest of the tree (which can be freed),
+    or None if the moves played were not expanded in the tree
+    """
+    board = board.copy()
+    while np.count_nonzero(board) < np.count_nonzero(new_board):
+        # follow the child whose move was played
+        for child in node.children:
+            row = np.count_nonzero(board[:, child.move])
+            if row < np.shape(board)[0] and new_board[row, child.move] == child.player:
+                break
+        else:
+            return None
+        board[row, child.move] = child.player
+        node = child
+    if not np.array_equal(board, new_board):
+        return None
+    node.parent = None
+    return node
+
+
 # the MCTS network Class:
 
 class MCTSnet(object):
@@ -58,36 +167,57 @@ class MCTSnet(object):
 
     def __init__(self, board, state=None, debug=None, **kwargs):
         """
+        state: the root node of a tree already searched for the board (see find_subtree)
         kwargs ->
         calc_time: calculation length [s]
         move_max: maximum number of moves
         C: exploration/exploitation parameter
+        early_stop: stop once the best move is decided
+        extension, close: extra time (fraction of calc_time) given once if the second
+        best move has at least close times the visits of the best one
+        pool, workers, leaf_rollouts: process pool and its size, and the rollouts
+        each worker plays for a new leaf (leaf parallelism, off without a pool)
+        rollouts: random games played from every new leaf (batched if more than one)
         """
         super().__init__()
-        # initialize the game board, player, and states
-        self.board = totuple(board)  # the current board state
+        # initialize the game board, player, and the root of the tree
+        self.board = np.array(board)  # the current board state
+        self.state = BitBoard.from_array(self.board)  # the simulations start from copies of its bitboard
         self.player = grab_player(self.board)  # the player to play
-        self.states = []
-        self.new_states = set()
-        # # the following add SaveState ability
-        # if state is not None:
-        #     for s in state:
-        #         self.states.append(s)
+        if self.player == PLAYER1:  # the root is the state after the other player's move
+            other_player = PLAYER2
+        else:
+            other_player = PLAYER1
+        if state is not None:  # continue with the tree of an earlier search (of this board)
+            self.root = state
+        else:
+            self.root = Node(None, None, other_player, allowed_moves(self.board))
         # set for how long to run a calculation
         self.calc_time = kwargs.get('calc_time')
+        # stop once the most visited move can not be caught up in the time left
+        self.early_stop = kwargs.get('early_stop', True)
+        # extra time (as a fraction of calc_time) when the two best moves are close
+        self.extension = kwargs.get('extension', 0.)
+        self.close = kwargs.get('close', 0.9)
         # set a maximum number of moves and track depth
         self.move_max = kwargs.get('move_max')
         self.depth_max = 0
-        # statistics to keep track of the game states
-        self.wins = {}
-        self.plays = {}
         # define the exploration parameter
         self.c = kwargs.get('c')
+        # leaf parallelism: the rollouts of every new leaf are played by a process pool
+        self.pool = kwargs.get('pool')
+        self.workers = kwargs.get('workers', 1)
+        self.leaf_rollouts = kwargs.get('leaf_rollouts', 8)  # rollouts per worker and leaf
+        # random games played (in lockstep) from every new leaf
+        self.rollouts = kwargs.get('rollouts', 1)
         # debugging and recording random stuff
         self.debug = debug
-        self.random_count = 0
+        self.playout_count = 0
         self.not_random_count = 0
-        self.new_state_count = 0
+        self.node_count = 1  # the nodes added by this search (and the root)
+        # with the instrumentation on, the phases of the simulations are timed
+        self.recorder = instrument.RECORDER
+        self.end_state = end_state if self.recorder is None else self.recorder.timed('win_check', end_state)
 
     def best_move(self):
         """
@@ -95,43 +225,37 @@ class MCTSnet(object):
         generate move function outside of the class
         determine the best move and return it
         """
-        self.states.append(self.board)  # start with the current board
-        state = self.states[-1]
-        player = grab_player(state)
-        allowed = allowed_moves(np.array(state))
+        allowed = allowed_moves(self.board)
         # ensure a choice is to be made
         if len(allowed) == 1:
-            return allowed[0]
+            return PlayerAction(allowed[0])
         elif len(allowed) == 0:
             return None
 
         # run the simulation
-        sim_num = 0
         start = time.time()
-        while time.time() - start < self.calc_time:
-            self.run_sim()
-            sim_num += 1
+        sim_num = self.search()
         time_elap = time.time() - start
 
-        # determine possible moves and the win ratio
-        poss_moves = [(n, totuple(apply_player_action(np.array(self.board), n, player, copy=True))) for n in allowed]
-        # win_ratio = ((self.wins.get((player, s), 0) / self.plays.get((player, s), 1), p) for p, s in poss_moves)
-        # to_maximize = np.transpose(np.array(list(play_num)))
-        # move = np.argmax(to_maximize[0])
-        # choose the best move by maximizing the number of visits
-        play_num = list(self.plays.get((player, s), 0) for p, s in poss_moves)
-        move = np.argmax(play_num)
+        # choose a proven win, or the best move by maximizing the number of visits (avoiding proven losses)
+        won = [child for child in self.root.children if child.proven == WIN]
+        if won:
+            best = won[0]
+        else:
+            children = [child for child in self.root.children if child.proven != LOSS] or self.root.children
+            best = max(children, key=lambda child: child.visits)
+        move = PlayerAction(best.move)
         # could implement something here that randomizes equal play number results
 
         # debugging statistics ---
         if self.debug == 'short' or self.debug == 'long':
             print('simulation number: {0}, time elapsed: {1}'.format(sim_num, time_elap))
             for data in sorted(
-                (((self.wins.get((player, s), 0) * 100) / self.plays.get((player, s), 1),  # 0. win percentage
-                 self.wins.get((player, s), 0),  # 1. win number
-                  self.plays.get((player, s), 0),  # 2. play number
-                  p + 1)  # 3. play
-                    for p, s in poss_moves), reverse=True):
+                (((child.wins * 100) / max(child.visits, 1),  # 0. win percentage
+                 child.wins,  # 1. win number
+                  child.visits,  # 2. play number
+                  child.move + 1)  # 3. play
+                    for child in self.root.children), reverse=True):
                 if move == data[3]-1:  # point to the chosen value
                     print("{3}: ({1} / {2}) = {0:.2f}% <--".format(*data))
                 else:
@@ -141,10 +265,9 @@ class MCTSnet(object):
             elif self.debug == 'long':
                 print('Depth maximum     : {}'.format(self.depth_max))
                 print('Possible moves  : {}'.format(allowed))
-                print('Random choice #   : {}'.format(self.random_count))
+                print('Playout #         : {}'.format(self.playout_count))
                 print('Educated choice # : {}'.format(self.not_random_count))
-                print('Visited state #   : {}'.format(self.new_state_count))
-                print('State array shape : {}'.format(np.shape(self.states)))
+                print('Tree node #       : {}'.format(self.node_count))
         elif not self.debug:
             pass
         else:
@@ -153,115 +276,243 @@ class MCTSnet(object):
 
         return move
 
+    def search(self):
+        """
+        run simulations for calc_time [s] (or until the best move is decided or proven,
+        or longer if the best moves are close), returns the number of simulations
+        """
+        sim_num = 0
+        node_count = self.node_count
+        start = time.time()
+        start_visits = self.root.visits  # a reused tree starts with visits
+        budget = self.calc_time
+        extended = False
+        while self.root.proven is None:  # a proven root is decided
+            elapsed = time.time() - start
+            if elapsed >= budget:
+                if not extended and self.extension > 0 and self.top_two_close():
+                    budget += self.extension * self.calc_time
+                    extended = True
+                    continue
+                break
+            self.run_sim()
+            sim_num += 1
+            if self.early_stop and sim_num % 64 == 0 and elapsed > 0:
+                # the visits the root children can still get, at the rate so far
+                rate = (self.root.visits - start_visits) / elapsed
+                time_left = budget - elapsed + (0 if extended else self.extension * self.calc_time)
+                if self.decided(rate * time_left):
+                    break
+        if self.recorder is not None:
+            self.recorder.simulations += sim_num
+            self.recorder.nodes += self.node_count - node_count
+            self.recorder.reach(self.depth_max)
+        return sim_num
+
+    def ranked_visits(self):
+        """the visits of the root moves, most visited first (unexpanded moves have none)"""
+        visits = [child.visits for child in self.root.children] + [0] * len(self.root.untried)
+        return sorted(visits, reverse=True) + [0, 0]
+
+    def decided(self, visits_left: float) -> bool:
+        """the most visited move stays the most visited, even if every visit left goes to the second"""
+        first, second = self.ranked_visits()[:2]
+        return first - second > visits_left
+
+    def top_two_close(self) -> bool:
+        first, second = self.ranked_visits()[:2]
+        return second >= self.close * first
+
     def run_sim(self):
         """
         this function runs until the maximum moves have
         been reached or the board state is a win or draw.
-        in the process, depending upon if a player/state combo is new,
-        the agent will go between exploration and exploitation.
-        UCB1 is used to determine the ratio between them.
+        the tree is descended with UCB1 while every move of a node has been tried,
+        then one new node is added and a random game is played from it.
         """
-        # play a 'random' game from current position
-        # that increasingly gains more information over simulations
-        # and update the statistic tables with each result
-        states_copy = self.states  # create copy to be used for this simulation
-        state = self.states[-1]  # the node state that expansion has stopped at
-
-        # clear the set to record the states
-        # that have been visited this simulation
-        self.new_state_count += len(self.new_states)
-        self.new_states.clear()
-
-        # grab the player
-        player = grab_player(state)
-
-        # run a simulation
-        count = 0
-        expansion = True
-        has_won = False
-        has_drawn = False
-        # --- SIMULATION PHASE is contained here
-        while count < self.move_max and not (has_won or has_drawn):
-            count += 1
-            # --- SELECTION PHASE
-            # define the legal moves for current position
-            allowed = allowed_moves(np.array(state))
-
-            # create all the possible next moves -> (play, board)
-            poss_moves = [(n, totuple(apply_player_action(np.array(state), n, player, copy=True))) for n in allowed]
-            # print(poss_moves)
-            # print(check_end_state(np.array(state), player))
-            # check if we know the statistics for the possible moves
-            # here we use the UCB1 algorithm
-            # if check_end_state(np.array(state), player) == GameState.IS_DRAW:
-            #     has_drawn = True
-            # if len(poss_moves) == 0:
-            #     has_drawn = True
-
-            # if we have statistics for each play, make an educated decision
-            if all(self.plays.get((player, s)) for p, s in poss_moves):
-                self.not_random_count += 1
-                for p, s in poss_moves:
-                    win_ratio = self.wins[(player, s)] / self.plays[(player, s)]
-                    log_sum = log(sum(self.plays[(player, s)]))
-                    exploration_term = self.c * sqrt(log_sum / self.plays[(player, s)])
-                    out, move, state = max(win_ratio + exploration_term, p, np.array(s))
-
-            # otherwise just make a random decision
+        recorder = self.recorder
+        if recorder is not None:
+            start, checks = time.perf_counter_ns(), recorder.ns['win_check']
+        node = self.root
+        state = self.state.copy()  # the moves are made on a copy of the current position
+        depth = 0
+
+        # --- SELECTION PHASE
+        # proven nodes are not searched any further
+        while node.proven is None and not node.untried and node.children:
+            self.not_random_count += 1
+            node = node.select_child(self.c)
+            state.play(node.move, node.player)
+            depth += 1
+
+        # --- EXPANSION PHASE
+        if node.proven is None and node.untried:
+            move = node.untried.pop(random.randrange(len(node.untried)))
+            if node.player == PLAYER1:
+                player = PLAYER2
             else:
-                self.random_count += 1
-                move, state = random.choice(poss_moves)
-
-            # update the copied states array
-            states_copy.append(state)
-
-            # if a new node and expanding, stop expanding
-            # and add a starting dictionary entry for the move
-            if (player, state) not in self.plays and expansion:
-                # --- EXPANSION PHASE (or end of)
-                # initialize the new node dictionary values
-                expansion = False
-                self.plays[(player, state)] = 0
-                self.wins[(player, state)] = 0
-                if count > self.depth_max:
-                    self.depth_max = count
-
-            # add only the new player state combos
-            self.new_states.add((player, state))
-
-            # update the player
-            player = grab_player(np.array(state))
-
-            # check if the state is winning or drawn
-            # if so, it breaks out of the while loop
-            if check_end_state(np.array(state), player) == GameState.IS_WIN:
-                has_won = True
-            elif check_end_state(np.array(state), player) == GameState.IS_DRAW:
-                has_drawn = True
-
-        # update plays and wins from our set
+                player = PLAYER1
+            state.play(move, player)
+            game_state = self.end_state(state, player)
+            untried = state.legal_moves() if game_state == GameState.STILL_PLAYING else []
+            node = node.add_child(move, player, untried)
+            if game_state == GameState.IS_WIN:
+                node.proven = WIN
+            elif game_state == GameState.IS_DRAW:
+                node.proven = DRAW
+            node.prove()
+            self.node_count += 1
+            depth += 1
+            if depth > self.depth_max:
+                self.depth_max = depth
+        elif node.proven is None:  # no move left (only on boards with holes)
+            game_state = self.end_state(state, node.player)
+
+        if recorder is not None:  # selection and expansion are the move generation of MCTS
+            simulation_start = time.perf_counter_ns()
+            recorder.ns['movegen'] += simulation_start - start - (recorder.ns['win_check'] - checks)
+
+        # --- SIMULATION PHASE
+        # play random games from the new node
+        if node.proven is not None:  # the result of a proven node is known
+            plays, score = 1, (node.proven + 1) / 2
+        elif self.pool is not None and game_state == GameState.STILL_PLAYING:
+            futures = [self.pool.submit(playouts, state, node.player, game_state, self.move_max, self.leaf_rollouts)
+                       for _ in range(self.workers)]
+            plays, score = self.workers * self.leaf_rollouts, sum(future.result() for future in futures)
+        else:
+            plays = self.rollouts if game_state == GameState.STILL_PLAYING else 1
+            score = playouts(state, node.player, game_state, self.move_max, plays)
+        self.playout_count += plays
+        if recorder is not None:  # the random games are the evaluation
+            recorder.add_time('eval', simulation_start)
+            recorder.leaves += plays
+
         # --- BACKPROPAGATION PHASE
-        for player, state in self.new_states:
-            # print((player, state))
-            if (player, state) not in self.plays:
-                # skip the given play if state has not been tried
-                continue
-            self.plays[(player, state)] += 1
-            if has_won:
-                self.wins[(player, state)] += 1
+        self.backpropagate(node, plays, score)
+
+    @staticmethod
+    def backpropagate(node, plays, score):
+        """
+        add the result of plays games to the node and its ancestors,
+        score is the number of wins of the node's player (draws count half)
+        """
+        player = node.player
+        while node is not None:
+            node.visits += plays
+            if node.player == player:
+                node.wins += score
+            else:
+                node.wins += plays - score
+            node = node.parent
 
 
-def generate_move_mcts(board: np.ndarray, player: BoardPiece, saved_state: Optional[SavedState]
+def rollout(state: BitBoard, player: BoardPiece, game_state: GameState, move_max: int) -> float:
+    """
+    input ->
+    state: the position after player moved, game_state: the state of that game
+    output ->
+    the result of a random game from the position for player:
+    1 for a win, 0 for a loss, 0.5 for a draw (or a game stopped after move_max moves)
+    """
+    if game_state == GameState.IS_WIN:
+        return 1
+    if game_state == GameState.IS_DRAW:
+        return 0.5
+    # the bitboards and column heights are kept in locals, the legal moves are
+    # only updated when a column fills up
+    rows = state.rows
+    boards = state.boards[:]
+    heights = state.heights[:]
+    tops = [col * (rows + 1) + rows for col in range(state.cols)]
+    moves = [col for col in range(state.cols) if heights[col] < tops[col]]
+    mover = player
+    count = 0
+    while moves and count < move_max:
+        count += 1
+        if mover == PLAYER1:
+            mover = PLAYER2
+        else:
+            mover = PLAYER1
+        col = random.choice(moves)
+        bit = 1 << heights[col]
+        heights[col] += 1
+        if heights[col] == tops[col]:
+            moves.remove(col)
+        boards[mover - 1] |= bit
+        if bitboard_has_won(boards[mover - 1], rows):
+            return 1 if mover == player else 0
+    return 0.5  # a full board (or a game stopped at move_max)
+
+
+def playouts(state: BitBoard, player: BoardPiece, game_state: GameState, move_max: int, n: int) -> float:
+    """the summed result of n random games from the position for player (see rollout)"""
+    from agent_MCTS.batch_rollout import batch_rollouts
+
+    if n > 1 and game_state == GameState.STILL_PLAYING:  # played in lockstep
+        return (np.sum(batch_rollouts(state, player, n, move_max)) + n) / 2
+    return sum(rollout(state, player, game_state, move_max) for _ in range(n))
+
+
+@instrument.instrumented('mcts')
+def generate_move_mcts(board: np.ndarray, player: BoardPiece, saved_state: Optional[SavedState],
+                       parallel: Optional[str] = None, workers: int = 1, rollouts: int = 1,
+                       game_time: Optional[float] = None, endgame: int = ENDGAME_EMPTY,
+                       calc_time: float = 0.3, c: float = np.sqrt(2),
 ) -> Tuple[PlayerAction, Optional[SavedState]]:
 
-    """generate the move for the agent using the MCTS network"""
+    """
+    generate the move for the agent using the MCTS network
+    the search tree is kept in saved_state, the next move continues
+    with the subtree of the moves played since.
+    parallel chooses how the workers are used: 'root' (a tree per worker,
+    the trees are not kept) or 'leaf' (the rollouts of each new leaf).
+    rollouts is the number of random games (played in lockstep) for each new leaf.
+    with a game_time [s] the time of each move comes from a clock for the whole game
+    (kept in saved_state), and close moves get extra time, otherwise each move
+    searches for calc_time [s]. c is the exploration constant of UCB1.
+    positions in the opening book are not searched, and with at most endgame
+    empty cells the move is solved exactly
+    """
+    from agent_MCTS.parallel import process_pool, root_parallel_move
+    from game_CONNECTN.connectn.book import book_move
+    from game_CONNECTN.connectn.solver import endgame_move
+
+    action = book_move(board)
+    if action is None:
+        action = endgame_move(board, player, endgame)
+    if action is not None:
+        return action, saved_state
 
-    calc_time = 0.3
     move_max = 100
-    c = np.sqrt(2)
+    extension = 0.
+
+    if saved_state is None:
+        saved_state = SavedState(board)
+    if game_time is not None:
+        if getattr(saved_state, 'clock', None) is None:
+            saved_state.clock = game_time
+        extension = 0.5
+        calc_time = move_budget(saved_state.clock, board, extension)
+    start = time.time()
+
+    if parallel == 'root':
+        saved_state.tree = None
+        action = root_parallel_move(board, workers, calc_time, move_max, c, rollouts=rollouts)
+    elif parallel in (None, 'leaf'):
+        root = None
+        if getattr(saved_state, 'tree', None) is not None:
+            root = find_subtree(saved_state.tree, saved_state.tree_board, board)
+
+        pool = process_pool(workers) if parallel == 'leaf' else None
+        mcts = MCTSnet(board, state=root, calc_time=calc_time, move_max=move_max, c=c, debug=None,
+                       pool=pool, workers=workers, rollouts=rollouts, extension=extension)
+        action = mcts.best_move()
+        saved_state.tree, saved_state.tree_board = mcts.root, mcts.board
+    else:
+        raise ValueError('unknown parallel mode: {}'.format(parallel))
 
-    mcts = MCTSnet(board, state=None, calc_time=calc_time, move_max=move_max, c=c, debug=None)
-    action = mcts.best_move()
+    if game_time is not None:
+        saved_state.clock -= time.time() - start
 
     return action, saved_state
-
@@ -1,7 +1,26 @@
+import pytest
+from types import SimpleNamespace
 from game_CONNECTN.connectn.common import *
 from agent_MCTS.MCTS import *
 
 
+TICK = 0.001  # the time [s] the clock of the clock fixture moves on every time it is read
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    a clock for the search that moves on by TICK every time it is read,
+    so a search of calc_time runs calc_time / TICK simulations at most
+    """
+    now = [0.]
+
+    def tick():
+        now[0] += TICK
+        return now[0]
+    monkeypatch.setattr('agent_MCTS.MCTS.time', SimpleNamespace(time=tick, perf_counter_ns=time.perf_counter_ns))
+
+
 def test_allowed_moves():
     """should return an array the size of the possible move number"""
 
@@ -42,6 +61,7 @@ def test_mcts_best_move():
 
     board_shape = np.shape(initialize_game_state())
     board = np.random.randint(0, 3, board_shape)
+    board[-1, np.random.randint(board_shape[1])] = 0  # at least one legal move
 
     calc_time, move_max, c = 0.1, 100, np.sqrt(2)
     mcts = MCTSnet(board, state=None, calc_time=calc_time, move_max=move_max, c=c, debug=None)
@@ -50,3 +70,354 @@ def test_mcts_best_move():
     assert isinstance(ret, np.integer)
 
 
+
+
+def test_mcts_ucb1_selection():
+    """the tree policy should make most of the choices"""
+
+    board = initialize_game_state()
+    for col in (3, 3, 2, 4):
+        apply_player_action(board, col, grab_player(board))
+
+    calc_time, move_max, c = 0.3, 100, np.sqrt(2)
+    mcts = MCTSnet(board, state=None, calc_time=calc_time, move_max=move_max, c=c, debug=None, early_stop=False)
+    ret = mcts.best_move()
+
+    assert ret in allowed_moves(board)
+    assert mcts.not_random_count > 0
+    # the parent visits are the sum of the visits of the children
+    assert sorted(child.move for child in mcts.root.children) == allowed_moves(board)
+    assert mcts.root.visits == sum(child.visits for child in mcts.root.children)
+
+
+def test_mcts_node_tree():
+    """every node should have been visited once more than its children (the simulation that added it)"""
+
+    board = initialize_game_state()
+    calc_time, move_max, c = 0.1, 100, np.sqrt(2)
+    mcts = MCTSnet(board, state=None, calc_time=calc_time, move_max=move_max, c=c, debug=None)
+    for _ in range(200):
+        mcts.run_sim()
+
+    nodes = [mcts.root]
+    while nodes:
+        node = nodes.pop()
+        for child in node.children:
+            assert child.parent is node
+            assert child.player != node.player
+            assert 0 <= child.wins <= child.visits
+        if node is not mcts.root:
+            assert node.visits == sum(child.visits for child in node.children) + 1
+        nodes.extend(node.children)
+    assert mcts.root.visits == 200
+    assert not hasattr(mcts.root, '__dict__')
+
+
+def test_find_subtree():
+    """should descend to the node of the two moves played, and cut it off from the tree"""
+
+    board = initialize_game_state()
+    calc_time, move_max, c = 0.1, 100, np.sqrt(2)
+    mcts = MCTSnet(board, state=None, calc_time=calc_time, move_max=move_max, c=c, debug=None)
+    for _ in range(300):
+        mcts.run_sim()
+
+    child = max(mcts.root.children, key=lambda node: node.visits)
+    grandchild = max(child.children, key=lambda node: node.visits)
+    new_board = apply_player_action(board, child.move, PLAYER1, copy=True)
+    apply_player_action(new_board, grandchild.move, PLAYER2)
+
+    ret = find_subtree(mcts.root, board, new_board)
+    assert ret is grandchild
+    assert ret.parent is None
+    assert ret.visits > 0
+
+    # a move that was never searched
+    other_board = apply_player_action(board, child.move, PLAYER1, copy=True)
+    apply_player_action(other_board, child.move, PLAYER1)
+    assert find_subtree(mcts.root, board, other_board) is None
+
+
+def test_generate_move_mcts_saved_state():
+    """the tree should be returned in the saved state, and reused for the next move"""
+
+    board = initialize_game_state()
+    action, saved_state = generate_move_mcts(board, PLAYER1, None)
+    assert np.array_equal(saved_state.tree_board, board)
+    child = [node for node in saved_state.tree.children if node.move == action][0]
+    grandchild = max(child.children, key=lambda node: node.visits)
+    visits = grandchild.visits
+
+    apply_player_action(board, action, PLAYER1)
+    apply_player_action(board, grandchild.move, PLAYER2)
+    action, saved_state = generate_move_mcts(board, PLAYER1, saved_state)
+
+    assert board[-1, action] == NO_PLAYER
+    assert np.array_equal(saved_state.tree_board, board)
+    assert saved_state.tree is grandchild  # the subtree was kept
+    assert saved_state.tree.parent is None
+    assert saved_state.tree.visits > visits
+
+
+def test_mcts_root_parallel():
+    """the merged trees of the workers should choose a legal move, and find a winning move"""
+
+    board = initialize_game_state()
+    for col in (0, 1, 2):
+        apply_player_action(board, col, PLAYER1)
+        apply_player_action(board, col, PLAYER2)
+
+    action, saved_state = generate_move_mcts(board, PLAYER1, None, parallel='root', workers=2)
+    assert action == 3
+    assert saved_state.tree is None
+
+
+def test_mcts_leaf_parallel():
+    """every new leaf should get the rollouts of all the workers"""
+    from agent_MCTS.parallel import process_pool
+
+    board = initialize_game_state()
+    calc_time, move_max, c = 0.1, 100, np.sqrt(2)
+    mcts = MCTSnet(board, state=None, calc_time=calc_time, move_max=move_max, c=c, debug=None,
+                   pool=process_pool(2), workers=2, leaf_rollouts=4)
+    for _ in range(20):
+        mcts.run_sim()
+
+    assert mcts.playout_count == 20 * 2 * 4
+    assert mcts.root.visits == mcts.playout_count
+    assert sum(child.visits for child in mcts.root.children) == mcts.root.visits
+
+    action, saved_state = generate_move_mcts(board, PLAYER1, None, parallel='leaf', workers=2)
+    assert board[-1, action] == NO_PLAYER
+    assert saved_state.tree.visits > 0
+
+
+def test_batch_has_won():
+    """the vectorized win check should agree with connected_four"""
+    from agent_MCTS.batch_rollout import _has_won
+    from game_CONNECTN.connectn.bitboard import board_to_bitboard
+
+    rng = np.random.default_rng(3)
+    boards = [rng.integers(0, 3, (6, 7)).astype(BoardPiece) for _ in range(200)]
+    bits = np.array([board_to_bitboard(board, PLAYER1) for board in boards], dtype=np.uint64)
+
+    ret = _has_won(bits, 6)
+    assert list(ret) == [connected_four(board, PLAYER1) for board in boards]
+
+
+def test_batch_rollouts():
+    """should return a win/draw/loss result for every game, with the statistics of single rollouts"""
+    from agent_MCTS.batch_rollout import batch_rollouts
+
+    board = initialize_game_state()
+    for col in (0, 0, 1, 1, 2, 2):  # player 1 can win in column 3 with the next move
+        apply_player_action(board, col, grab_player(board))
+    ret = batch_rollouts(board, PLAYER2, 2000, rng=np.random.default_rng(4))
+
+    assert ret.shape == (2000,)
+    assert set(np.unique(ret)) <= {-1, 0, 1}
+    random.seed(4)
+    state = BitBoard.from_array(board)
+    single = np.mean([rollout(state, PLAYER2, GameState.STILL_PLAYING, 100) for _ in range(2000)])
+    assert abs((np.mean(ret) + 1) / 2 - single) < 0.05
+
+    assert np.all(batch_rollouts(board, PLAYER2, 10, move_max=0) == 0)
+
+
+def test_mcts_batch_rollouts():
+    """every new leaf should get the number of rollouts"""
+
+    board = initialize_game_state()
+    calc_time, move_max, c = 0.1, 100, np.sqrt(2)
+    mcts = MCTSnet(board, state=None, calc_time=calc_time, move_max=move_max, c=c, debug=None, rollouts=16)
+    for _ in range(20):
+        mcts.run_sim()
+
+    assert mcts.playout_count == 20 * 16
+    assert mcts.root.visits == mcts.playout_count
+
+
+def test_end_state():
+    """should agree with check_end_state for the player who moved"""
+
+    rng = np.random.default_rng(5)
+    for _ in range(100):
+        board = initialize_game_state()
+        player, game_state = PLAYER1, GameState.STILL_PLAYING
+        while game_state == GameState.STILL_PLAYING:
+            move = rng.choice(allowed_moves(board))
+            apply_player_action(board, move, player)
+            game_state = check_end_state(board, player, move)
+            assert end_state(BitBoard.from_array(board), player) == game_state
+            player = PLAYER2 if player == PLAYER1 else PLAYER1
+
+
+def test_mcts_early_stop(clock):
+    """the search should stop early once the blocking move can not be caught up"""
+
+    board = initialize_game_state()
+    for col in (6, 0, 6, 1, 5, 2):  # player 2 wins in column 3 unless it is blocked
+        apply_player_action(board, col, grab_player(board))
+
+    calc_time, move_max, c = 1.0, 100, np.sqrt(2)
+    mcts = MCTSnet(board, state=None, calc_time=calc_time, move_max=move_max, c=c, debug=None)
+    ret = mcts.best_move()
+
+    assert ret == 3
+    assert mcts.root.proven is None  # stopped as decided, not proven
+    assert mcts.root.visits < 0.8 * calc_time / TICK  # a visit per simulation
+    first, second = mcts.ranked_visits()[:2]
+    assert first > second
+    assert mcts.decided(0)
+
+
+def test_mcts_decided():
+    """a move is decided if the visits left can not close the gap to the second best"""
+
+    board = initialize_game_state()
+    mcts = MCTSnet(board, state=None, calc_time=0.1, move_max=100, c=np.sqrt(2), debug=None, close=0.9)
+    for child_visits in (50, 10, 46):
+        child = mcts.root.add_child(mcts.root.untried.pop(), PLAYER1, [])
+        child.visits = child_visits
+
+    assert mcts.ranked_visits()[:3] == [50, 46, 10]
+    assert mcts.decided(3)
+    assert not mcts.decided(4)
+    assert mcts.top_two_close()
+
+
+def test_move_budget():
+    """the clock should be split over the moves left, and never run out"""
+
+    board = initialize_game_state()
+    assert move_budget(21., board) == 1.
+    assert move_budget(21., board, extension=0.5) * 1.5 == 1.
+
+    clock = 10.
+    board = initialize_game_state()
+    for move in range(21):  # our move, then the opponent's
+        clock -= 1.5 * move_budget(clock, board, extension=0.5)  # the longest the search can take
+        apply_player_action(board, move % 7, PLAYER1)
+        apply_player_action(board, move % 7, PLAYER2)
+    assert clock >= -1e-9
+
+
+def test_generate_move_mcts_game_time():
+    """the game clock should be kept in the saved state and go down with every move"""
+
+    board = initialize_game_state()
+    action, saved_state = generate_move_mcts(board, PLAYER1, None, game_time=5.)
+    assert 0 < saved_state.clock < 5.
+
+
+def test_mcts_solver_win(clock):
+    """a winning move should be proven and played without using the calculation time"""
+
+    board = initialize_game_state()
+    for col in (0, 1, 2):
+        apply_player_action(board, col, PLAYER1)
+        apply_player_action(board, col, PLAYER2)
+
+    calc_time, move_max, c = 1.0, 100, np.sqrt(2)
+    mcts = MCTSnet(board, state=None, calc_time=calc_time, move_max=move_max, c=c, debug=None)
+    ret = mcts.best_move()
+
+    assert ret == 3
+    assert mcts.root.visits < 0.5 * calc_time / TICK  # a visit per simulation
+    assert [child.proven for child in mcts.root.children if child.move == 3] == [WIN]
+    assert mcts.root.proven == LOSS
+
+
+def test_mcts_solver_loss():
+    """the moves that do not block a win of the opponent should be proven losses"""
+
+    board = initialize_game_state()
+    for col in (6, 0, 6, 1, 5, 2):  # player 2 wins in column 3 unless it is blocked
+        apply_player_action(board, col, grab_player(board))
+
+    calc_time, move_max, c = 0.5, 100, np.sqrt(2)
+    mcts = MCTSnet(board, state=None, calc_time=calc_time, move_max=move_max, c=c, debug=None)
+    ret = mcts.best_move()
+
+    assert ret == 3
+    assert sorted(child.move for child in mcts.root.children if child.proven == LOSS) == [0, 1, 2, 4, 5, 6]
+
+
+def test_node_prove():
+    """proven values should propagate up the tree"""
+
+    root = Node(None, None, PLAYER2, [1, 0])
+    a = root.add_child(root.untried.pop(), PLAYER1, [])
+    a.proven = LOSS
+    a.prove()
+    assert root.proven is None  # move 1 is not tried yet
+
+    b = root.add_child(root.untried.pop(), PLAYER1, [0])
+    b.proven = DRAW
+    b.prove()
+    assert root.proven == DRAW  # the best for player 1 is the draw
+
+    root.proven = None
+    c = b.add_child(b.untried.pop(), PLAYER2, [])
+    b.proven = None
+    c.proven = WIN
+    c.prove()
+    assert b.proven == LOSS
+    assert root.proven == WIN  # every move of player 1 loses
+
+
+def test_generate_move_mcts_book(tmp_path, monkeypatch):
+    """a position in the opening book should not be searched"""
+    from game_CONNECTN.connectn.book import position_key, write_book, _load_book
+
+    board = initialize_game_state()
+    path = str(tmp_path / 'book.bin')
+    write_book(path, [(position_key(board)[0], 2, 0)])
+    monkeypatch.setenv('CONNECT4_BOOK', path)
+    try:
+        action, saved_state = generate_move_mcts(board, PLAYER1, None)
+        assert action == 2
+        assert saved_state is None  # no search, so no tree
+    finally:
+        _load_book.cache_clear()
+
+
+def test_generate_move_mcts_endgame():
+    """with few empty cells the move of the solver should be played without a search"""
+    from game_CONNECTN.connectn.solver import endgame_move
+
+    board = initialize_game_state()
+    board[:4] = np.array([[1, 1, 2, 1, 2, 2, 1],
+                          [2, 2, 1, 2, 1, 1, 2],
+                          [1, 1, 2, 1, 2, 2, 1],
+                          [2, 2, 1, 2, 1, 1, 2]], dtype=BoardPiece)
+    action, saved_state = generate_move_mcts(board, PLAYER1, None)
+    assert action == endgame_move(board, PLAYER1)
+    assert saved_state is None  # no search, so no tree
+
+
+def test_generate_move_mcts_calc_time(clock):
+    """the search time of a move should follow calc_time"""
+    board = initialize_game_state()
+    action, saved_state = generate_move_mcts(board, PLAYER1, None, calc_time=0.05, c=1.)
+    assert 0 <= action < board.shape[1]
+    assert 0 < saved_state.tree.visits <= 0.05 / TICK  # a visit per simulation
+
+    action, saved_state = generate_move_mcts(board, PLAYER1, None, calc_time=0.2, c=1.)
+    assert 0.05 / TICK < saved_state.tree.visits <= 0.2 / TICK
+
+
+def test_generate_move_mcts_instrument():
+    """a move should be recorded with its simulations and the time of its phases"""
+    from game_CONNECTN.connectn import instrument
+
+    recorder = instrument.enable()
+    try:
+        generate_move_mcts(initialize_game_state(), PLAYER1, None, calc_time=0.05)
+    finally:
+        instrument.disable()
+    totals = recorder.totals['mcts']
+    assert totals['moves'] == 1
+    assert totals['simulations'] > 0 and totals['nodes'] > 0 and totals['leaves'] >= totals['simulations']
+    assert totals['max_depth'] > 0
+    assert all(totals[timer + '_ns'] > 0 for timer in instrument.TIMERS)
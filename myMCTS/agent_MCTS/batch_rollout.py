@@ -0,0 +1,80 @@
+import numpy as np
+from typing import Optional, Union
+from game_CONNECTN.connectn.common import BoardPiece, PLAYER1, PLAYER2
+from game_CONNECTN.connectn.bitboard import BitBoard, board_mask
+
+
+"""
+random games played in lockstep: K games from the same board are kept as
+K bitboards per player in numpy uint64 arrays (see the bitboard module for the
+layout), every ply picks a random legal column for all the games at once,
+drops the pieces with one add and checks the wins with shifts and ANDs.
+finished games are dropped from the arrays, so every ply only works on the
+games still playing
+"""
+
+
+def _has_won(bits: np.ndarray, rows: int) -> np.ndarray:
+    """four in a row for every bitboard of the array, two shifts per direction"""
+    won = np.zeros(len(bits), dtype=bool)
+    for shift in (1, rows + 1, rows, rows + 2):  # vertical, horizontal and the diagonals
+        pairs = bits & (bits >> np.uint64(shift))
+        won |= (pairs & (pairs >> np.uint64(2 * shift))) != 0
+    return won
+
+
+def batch_rollouts(
+    board: Union[np.ndarray, BitBoard], player: BoardPiece, k: int, move_max: int = 100,
+    rng: Optional[np.random.Generator] = None,
+) -> np.ndarray:
+    """
+    input ->
+    board: the board (or bitboard position) after player moved (still playing), k: the number of games
+    move_max: the maximum number of moves of a game
+    output ->
+    the result of every game for player: 1 for a win, 0 for a draw
+    (or a game stopped after move_max moves), -1 for a loss
+    """
+    if rng is None:  # a new generator, so forked workers do not play the same games
+        rng = np.random.default_rng()
+    if not isinstance(board, BitBoard):
+        board = BitBoard.from_array(board)
+    rows, cols = board.rows, board.cols
+    h1 = rows + 1
+    full = np.uint64(board_mask(rows, cols))
+    col_mask = np.array([((1 << rows) - 1) << (col * h1) for col in range(cols)], dtype=np.uint64)
+    col_bottom = np.array([1 << (col * h1) for col in range(cols)], dtype=np.uint64)
+    col_top = col_bottom << np.uint64(rows - 1)
+
+    # the bitboards of the games still playing, and their index in the results
+    pieces = {
+        PLAYER1: np.full(k, board.boards[0], dtype=np.uint64),
+        PLAYER2: np.full(k, board.boards[1], dtype=np.uint64),
+    }
+    mask = pieces[PLAYER1] | pieces[PLAYER2]
+    games = np.arange(k)
+    results = np.zeros(k, dtype=np.int8)
+
+    mover = player
+    for _ in range(move_max):
+        if len(games) == 0:
+            break
+        if mover == PLAYER1:
+            mover = PLAYER2
+        else:
+            mover = PLAYER1
+        # a random playable column for every game
+        playable = (mask[:, None] & col_top[None, :]) == 0
+        choice = np.where(playable, rng.random((len(games), cols)), -1.)
+        col = np.argmax(choice, axis=1)
+        # the lowest empty cell of the column: adding its bottom bit carries past the filled cells
+        bit = ((mask & col_mask[col]) + col_bottom[col]) & col_mask[col]
+        pieces[mover] |= bit
+        mask |= bit
+
+        won = _has_won(pieces[mover], rows)
+        results[games[won]] = 1 if mover == player else -1
+        playing = ~won & (mask != full)  # a full board is a draw
+        games, mask = games[playing], mask[playing]
+        pieces[PLAYER1], pieces[PLAYER2] = pieces[PLAYER1][playing], pieces[PLAYER2][playing]
+    return results
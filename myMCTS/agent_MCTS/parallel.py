@@ -0,0 +1,84 @@
+import numpy as np
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Tuple
+from game_CONNECTN.connectn import instrument
+from game_CONNECTN.connectn.common import PlayerAction
+from agent_MCTS.MCTS import MCTSnet, allowed_moves, WIN, LOSS
+
+
+"""
+parallel MCTS on a process pool that is kept alive between moves:
+root parallelism: every worker searches its own tree of the board for the whole
+    calculation time, the visits and wins of the root children are summed
+leaf parallelism: one tree in the main process, the random games of every new
+    leaf are played by all the workers (see MCTSnet leaf_rollouts)
+"""
+
+_POOLS: Dict[int, ProcessPoolExecutor] = {}  # the pools kept alive, per number of workers
+
+
+def _init_worker():
+    # forked workers start with the random state of the parent, they need their own
+    random.seed()
+    np.random.seed()
+
+
+def process_pool(workers: int) -> ProcessPoolExecutor:
+    """the pool with the number of workers, started on the first call"""
+    if workers not in _POOLS:
+        _POOLS[workers] = ProcessPoolExecutor(workers, initializer=_init_worker)
+    return _POOLS[workers]
+
+
+def _root_search(
+    board: np.ndarray, calc_time: float, move_max: int, c: float, rollouts: int = 1,
+) -> Tuple[Dict, int, int]:
+    """
+    search a tree of the board in a worker, returns the (visits, wins, proven) of
+    every root child, the number of simulations and the number of playouts
+    """
+    mcts = MCTSnet(board, state=None, calc_time=calc_time, move_max=move_max, c=c, debug=None, rollouts=rollouts)
+    sim_num = mcts.search()
+    stats = {child.move: (child.visits, child.wins, child.proven) for child in mcts.root.children}
+    return stats, sim_num, mcts.playout_count
+
+
+def root_parallel_move(
+    board: np.ndarray, workers: int, calc_time: float, move_max: int, c: float, debug=None, rollouts: int = 1,
+) -> PlayerAction:
+    """
+    the move with the most visits, summed over the trees of all the workers,
+    a move proven to win in one of the trees is played, proven losses are avoided
+    """
+    allowed = allowed_moves(board)
+    if len(allowed) == 1:
+        return PlayerAction(allowed[0])
+    elif len(allowed) == 0:
+        return None
+
+    pool = process_pool(workers)
+    futures = [pool.submit(_root_search, board, calc_time, move_max, c, rollouts) for _ in range(workers)]
+    visits, wins, proven = {}, {}, {}
+    sim_num = playout_num = 0
+    for future in futures:
+        stats, sims, plays = future.result()
+        for move, (child_visits, child_wins, child_proven) in stats.items():
+            visits[move] = visits.get(move, 0) + child_visits
+            wins[move] = wins.get(move, 0) + child_wins
+            if child_proven is not None:
+                proven[move] = child_proven
+        sim_num += sims
+        playout_num += plays
+    if instrument.RECORDER is not None:  # the work of the workers, as they are not recorded
+        instrument.RECORDER.simulations += sim_num
+        instrument.RECORDER.leaves += playout_num
+    won = [n for n in visits if proven.get(n) == WIN]
+    candidates = [n for n in visits if proven.get(n) != LOSS] or list(visits)
+    move = won[0] if won else max(candidates, key=visits.get)
+
+    if debug:
+        print('workers: {0}, simulation number: {1}, playouts: {2}'.format(workers, sim_num, playout_num))
+        for n in sorted(visits, key=visits.get, reverse=True):
+            print("{0}: ({1} / {2}) = {3:.2f}%".format(n + 1, wins[n], visits[n], wins[n] * 100 / visits[n]))
+    return PlayerAction(move)
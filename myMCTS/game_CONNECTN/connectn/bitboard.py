@@ -0,0 +1,183 @@
+import numpy as np
+from functools import lru_cache
+from typing import List, Tuple
+
+
+"""
+a bitboard representation of the connect-n game state
+
+each column is stored in (rows + 1) bits, the extra bit on top of every
+column is a sentinel which stops a line of pieces from wrapping around
+into the next column. for the standard 6x7 board the layout is:
+
+    .  .  .  .  .  .  .
+    5 12 19 26 33 40 47
+    4 11 18 25 32 39 46
+    3 10 17 24 31 38 45
+    2  9 16 23 30 37 44
+    1  8 15 22 29 36 43
+    0  7 14 21 28 35 42
+
+so a piece at board[row, col] is the bit (col * (rows + 1) + row),
+which matches the ndarray convention of row 0 being the bottom row
+
+this module sits below game_CONNECTN.connectn.common (which uses it for the
+win check) so it only relies on the piece values: 0 empty, 1 and 2 players
+"""
+
+ROWS, COLS = 6, 7  # standard board shape
+N = 4  # pieces in a row needed to win
+H1 = ROWS + 1  # bits per column (including the sentinel)
+
+
+@lru_cache(maxsize=None)
+def bottom_mask(rows: int = ROWS, cols: int = COLS) -> int:
+    """a mask with the lowest cell of every column set"""
+    return sum(1 << (col * (rows + 1)) for col in range(cols))
+
+
+@lru_cache(maxsize=None)
+def board_mask(rows: int = ROWS, cols: int = COLS) -> int:
+    """a mask with every playable cell set (the sentinel row excluded)"""
+    return bottom_mask(rows, cols) * ((1 << rows) - 1)
+
+
+BOTTOM_MASK = bottom_mask()
+BOARD_MASK = board_mask()
+
+_WEIGHTS = {}  # cached bit weights for the ndarray -> bitboard conversion
+
+
+def bitboard_weights(shape: Tuple[int, int]) -> np.ndarray:
+    """
+    the value of every board cell in the bitboard, in the
+    (row major) order of board.ravel(), cached per board shape
+    """
+    if shape not in _WEIGHTS:
+        rows, cols = shape
+        if (rows + 1) * cols > 64:  # would not fit in a single uint64
+            raise ValueError('board shape {} is too large for a bitboard'.format(shape))
+        row, col = np.indices(shape)
+        _WEIGHTS[shape] = (np.uint64(1) << (col * (rows + 1) + row).astype(np.uint64)).ravel()
+    return _WEIGHTS[shape]
+
+
+def board_to_bitboard(board: np.ndarray, player: np.int8) -> int:
+    """the bitboard of every cell of the board occupied by player"""
+    return int(np.dot((board == player).ravel(), bitboard_weights(board.shape)))
+
+
+def bitboard_to_board(
+        boards: Tuple[int, int], rows: int = ROWS, cols: int = COLS
+) -> np.ndarray:
+    """convert the (player 1, player 2) bitboards back into an ndarray board"""
+    board = np.zeros((rows, cols), dtype=np.int8)
+    weights = bitboard_weights((rows, cols)).reshape(rows, cols)
+    for player, bits in enumerate(boards, start=1):
+        board[(np.uint64(bits) & weights) != 0] = player
+    return board
+
+
+def bitboard_has_won(bits: int, rows: int = ROWS, n: int = N) -> bool:
+    """
+    shift-and-AND check for n in a row, one pass for each direction:
+    1 is vertical, rows + 1 horizontal, rows and rows + 2 the diagonals
+    """
+    if n == 4:  # pairs of pairs: two shifts per direction instead of three
+        for shift in (1, rows + 1, rows, rows + 2):
+            pairs = bits & (bits >> shift)
+            if pairs & (pairs >> (2 * shift)):
+                return True
+        return False
+    for shift in (1, rows + 1, rows, rows + 2):
+        line = bits
+        for k in range(1, n):  # keep the cells with k pieces in a row behind them
+            line &= bits >> (k * shift)
+        if line:
+            return True
+    return False
+
+
+class BitBoard(object):
+
+    """
+    a connect-n position stored as one bitboard per player, their union,
+    and the next free bit of every column (the height array)
+    """
+
+    __slots__ = ('rows', 'cols', 'boards', 'mask', 'heights', 'moves')
+
+    def __init__(self, rows: int = ROWS, cols: int = COLS):
+        self.rows = rows
+        self.cols = cols
+        self.boards = [0, 0]  # bitboards of player 1 and player 2
+        self.mask = 0  # every occupied cell
+        self.heights = [col * (rows + 1) for col in range(cols)]  # next free bit per column
+        self.moves = 0  # number of pieces played
+
+    @classmethod
+    def from_array(cls, board: np.ndarray) -> 'BitBoard':
+        """build the bitboard position of an ndarray board"""
+        rows, cols = board.shape
+        bitboard = cls(rows, cols)
+        bitboard.boards = [board_to_bitboard(board, 1), board_to_bitboard(board, 2)]
+        bitboard.mask = bitboard.boards[0] | bitboard.boards[1]
+        filled = board != 0
+        for col in range(cols):  # the next piece goes in the lowest empty cell
+            empty = np.flatnonzero(~filled[:, col])
+            row = empty[0] if len(empty) else rows
+            bitboard.heights[col] = col * (rows + 1) + int(row)
+        bitboard.moves = int(np.count_nonzero(filled))
+        return bitboard
+
+    def to_array(self) -> np.ndarray:
+        """convert the position back into an ndarray board"""
+        return bitboard_to_board(tuple(self.boards), self.rows, self.cols)
+
+    def copy(self) -> 'BitBoard':
+        new = BitBoard.__new__(BitBoard)
+        new.rows, new.cols = self.rows, self.cols
+        new.boards = self.boards[:]
+        new.mask = self.mask
+        new.heights = self.heights[:]
+        new.moves = self.moves
+        return new
+
+    def can_play(self, action: int) -> bool:
+        """a column can be played if its next free bit is still on the board"""
+        return self.heights[action] < action * (self.rows + 1) + self.rows
+
+    def legal_mask(self) -> int:
+        """a mask of the cell that would be filled in every playable column"""
+        return (self.mask + bottom_mask(self.rows, self.cols)) & board_mask(self.rows, self.cols)
+
+    def legal_moves(self) -> List[int]:
+        return [col for col in range(self.cols) if self.can_play(col)]
+
+    def play(self, action: int, player: np.int8) -> int:
+        """drop a piece for player in the column, returns the bit that was set"""
+        bit = 1 << self.heights[action]
+        self.heights[action] += 1
+        self.boards[player - 1] |= bit
+        self.mask |= bit
+        self.moves += 1
+        return bit
+
+    def undo(self, action: int, player: np.int8):
+        """take the last piece back out of the column"""
+        self.heights[action] -= 1
+        bit = ~(1 << self.heights[action])
+        self.boards[player - 1] &= bit
+        self.mask &= bit
+        self.moves -= 1
+
+    def has_won(self, player: np.int8) -> bool:
+        return bitboard_has_won(self.boards[player - 1], self.rows)
+
+    def is_full(self) -> bool:
+        return self.moves == self.rows * self.cols
+
+    def key(self) -> int:
+        """a unique key of the position (player 1 pieces + occupied cells)"""
+        return self.boards[0] + self.mask
+